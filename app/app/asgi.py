@@ -9,8 +9,13 @@ https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
+# what django.core.asgi.get_asgi_application does, but with our
+# handler, which streams responses without blocking the event loop
+django.setup(set_prefix=False)
 
-application = get_asgi_application()
+from core.asgi import ASGIHandler  # noqa: E402
+
+application = ASGIHandler()
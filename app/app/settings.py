@@ -43,6 +43,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     # Apps
     'core',
     'user',
@@ -54,6 +55,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -61,6 +64,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.ReplicaRoutingMiddleware',
 ]
 
 ROOT_URLCONF = 'app.urls'
@@ -89,14 +93,88 @@ WSGI_APPLICATION = 'app.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        # postgresql plus health checks and pooling, see core.db
+        'ENGINE': 'core.db.backends.postgresql',
         'HOST': os.environ.get('DB_HOST'),
         'NAME': os.environ.get('DB_NAME'),
         'USER': os.environ.get('DB_USER'),
         'PASSWORD': os.environ.get('DB_PASS'),
+        # seconds each thread keeps its connection open between
+        # requests, 0 closes it after every request
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+        # check a kept connection still works before reusing it
+        'CONN_HEALTH_CHECKS': bool(
+            int(os.environ.get('DB_CONN_HEALTH_CHECKS', 1))),
+        # connections shared by the threads of each process,
+        # MAX_SIZE 0 turns pooling off
+        'POOL': {
+            'MAX_SIZE': int(os.environ.get('DB_POOL_MAX_SIZE', 0)),
+            'MIN_SIZE': int(os.environ.get('DB_POOL_MIN_SIZE', 0)),
+            # seconds to wait for a free connection
+            'TIMEOUT': float(os.environ.get('DB_POOL_TIMEOUT', 30)),
+        },
+    }
+}
+
+# read replicas, comma separated hosts with the same database name
+# and credentials as the primary, see core.db.routers
+DB_REPLICA_HOSTS = [
+    host.strip()
+    for host in os.environ.get('DB_REPLICA_HOSTS', '').split(',')
+    if host.strip()
+]
+REPLICA_ALIASES = []
+for number, host in enumerate(DB_REPLICA_HOSTS):
+    REPLICA_ALIASES.append(f'replica{number}')
+    DATABASES[f'replica{number}'] = {
+        **DATABASES['default'],
+        'HOST': host,
+        # tests read the primary's test database instead
+        'TEST': {'MIRROR': 'default'},
     }
+
+DATABASE_ROUTERS = ['core.db.routers.ReplicaRouter']
+REPLICAS = {
+    'ALIASES': REPLICA_ALIASES,
+    # seconds a user reads from the primary after writing, should
+    # be longer than the replicas usually lag behind
+    'PIN_SECONDS': int(os.environ.get('DB_REPLICA_PIN_SECONDS', 5)),
+    # must be shared between processes (eg. redis) for pins set by
+    # one uwsgi worker to apply in the others, a system check refuses
+    # process local caches while replicas are in use
+    'CACHE_ALIAS': os.environ.get('DB_REPLICA_PIN_CACHE_ALIAS', 'default'),
 }
 
+# password hashing costs, tune with the benchmark_hashers command,
+# see core.hashers. Passwords are rehashed as users log in
+PASSWORD_HASHING = {
+    # used for new passwords: pbkdf2_sha256, scrypt or argon2 (needs
+    # the argon2-cffi package)
+    'ALGORITHM': os.environ.get('PASSWORD_HASHER', 'pbkdf2_sha256'),
+    'PBKDF2_ITERATIONS': int(
+        os.environ.get('PASSWORD_PBKDF2_ITERATIONS', 320000)),
+    'SCRYPT_WORK_FACTOR': int(
+        os.environ.get('PASSWORD_SCRYPT_WORK_FACTOR', 2**14)),
+    'ARGON2_TIME_COST': int(os.environ.get('PASSWORD_ARGON2_TIME_COST', 2)),
+    # KiB
+    'ARGON2_MEMORY_COST': int(
+        os.environ.get('PASSWORD_ARGON2_MEMORY_COST', 102400)),
+    'ARGON2_PARALLELISM': int(
+        os.environ.get('PASSWORD_ARGON2_PARALLELISM', 8)),
+}
+_PASSWORD_HASHERS = {
+    'pbkdf2_sha256': 'core.hashers.PBKDF2PasswordHasher',
+    'scrypt': 'core.hashers.ScryptPasswordHasher',
+    'argon2': 'core.hashers.Argon2PasswordHasher',
+}
+# the first hashes new passwords, the others still check old ones
+PASSWORD_HASHERS = [
+    _PASSWORD_HASHERS[PASSWORD_HASHING['ALGORITHM']],
+    *(hasher for algorithm, hasher in _PASSWORD_HASHERS.items()
+      if algorithm != PASSWORD_HASHING['ALGORITHM']),
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+]
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -152,6 +230,134 @@ AUTH_USER_MODEL = 'core.User'
 # use drf spectacular to create api schema for swagger
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    # orjson backed JSON, same output as DRF's classes but faster
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'core.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+}
+# default number of items per page returned by the list endpoints
+API_PAGE_SIZE = int(os.environ.get('API_PAGE_SIZE', 100))
+# largest page a client can request with ?page_size=
+API_MAX_PAGE_SIZE = int(os.environ.get('API_MAX_PAGE_SIZE', 500))
+# number of rows validated and written per transaction by the
+# bulk recipe import
+RECIPE_IMPORT_CHUNK_SIZE = int(
+    os.environ.get('RECIPE_IMPORT_CHUNK_SIZE', 500))
+# postgres text search configuration used for recipe search
+RECIPE_SEARCH_CONFIG = os.environ.get('RECIPE_SEARCH_CONFIG', 'english')
+# number of recipes fetched per round trip by the streaming export
+RECIPE_EXPORT_CHUNK_SIZE = int(
+    os.environ.get('RECIPE_EXPORT_CHUNK_SIZE', 2000))
+# serve the API views as async views, set by scripts/run.sh when
+# running under ASGI, see core.asgi
+ASYNC_API = bool(int(os.environ.get('ASYNC_API', 0)))
+# threads per ASGI process running the API views
+ASYNC_API_THREADS = int(os.environ.get('ASYNC_API_THREADS', 16))
+# resized copies generated for each uploaded recipe image,
+# name -> longest side in pixels, see recipe.images
+RECIPE_IMAGE_VARIANTS = {
+    'thumb': int(os.environ.get('RECIPE_IMAGE_THUMB_SIZE', 200)),
+    'medium': int(os.environ.get('RECIPE_IMAGE_MEDIUM_SIZE', 800)),
+}
+# background jobs, see core.jobs and `manage.py run_worker`
+JOBS = {
+    # jobs each worker process runs at once
+    'CONCURRENCY': int(os.environ.get('JOB_CONCURRENCY', 4)),
+    # seconds before a claimed job whose worker stopped extending the
+    # claim (died or hung) is retried, or failed if out of attempts
+    'VISIBILITY_TIMEOUT': int(os.environ.get('JOB_VISIBILITY_TIMEOUT', 600)),
+    # seconds an idle worker waits before polling again
+    'POLL_INTERVAL': float(os.environ.get('JOB_POLL_INTERVAL', 1)),
+    # default runs per job, handlers can override it
+    'MAX_ATTEMPTS': int(os.environ.get('JOB_MAX_ATTEMPTS', 3)),
+    # seconds before the first retry, doubled for each one after
+    'RETRY_DELAY': int(os.environ.get('JOB_RETRY_DELAY', 10)),
+}
+# local memory by default, point 'default' at a shared backend
+# (eg. redis) to share cached responses between workers
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    }
+}
+# per user cache of list responses, see recipe.cache
+RESPONSE_CACHE = {
+    'ENABLED': bool(int(os.environ.get('RESPONSE_CACHE_ENABLED', 1))),
+    'CACHE_ALIAS': os.environ.get('RESPONSE_CACHE_ALIAS', 'default'),
+    # seconds an entry is kept, writes invalidate sooner
+    'TTL': int(os.environ.get('RESPONSE_CACHE_TTL', 300)),
+}
+# caching of token authentication lookups, see core.authentication
+TOKEN_AUTH_CACHE = {
+    # entries kept in each worker process
+    'MAX_SIZE': int(os.environ.get('TOKEN_AUTH_CACHE_SIZE', 1024)),
+    # seconds before an entry is looked up again
+    'TTL': int(os.environ.get('TOKEN_AUTH_CACHE_TTL', 30)),
+    # optional CACHES alias shared between workers
+    'CACHE_ALIAS': os.environ.get('TOKEN_AUTH_CACHE_ALIAS') or None,
+}
+# per request query/timing instrumentation, see core.instrumentation
+INSTRUMENTATION = {
+    # fraction of requests instrumented, 0 turns it off
+    'SAMPLE_RATE': float(
+        os.environ.get('INSTRUMENTATION_SAMPLE_RATE', 0.01)),
+    # add a Server-Timing header to instrumented responses
+    'SERVER_TIMING': bool(
+        int(os.environ.get('INSTRUMENTATION_SERVER_TIMING', 1))),
+}
+# turns the sampling above off while testing
+TEST_RUNNER = 'core.test_runner.TestRunner'
+# request/cache/upload metrics served at /api/metrics/, see core.metrics
+METRICS = {
+    # where each worker process writes its values for the endpoint
+    # to add up, needed when running several worker processes
+    'MULTIPROCESS_DIR': os.environ.get('METRICS_MULTIPROCESS_DIR') or None,
+    # seconds between writes of a process's values
+    'FLUSH_INTERVAL': float(os.environ.get('METRICS_FLUSH_INTERVAL', 1)),
+    # scrapes must send "Authorization: Bearer <token>", without one
+    # the endpoint is only served while DEBUG is on
+    'TOKEN': os.environ.get('METRICS_TOKEN') or None,
+}
+# readiness checks served at /api/ready/, see core.readiness
+READINESS = {
+    # seconds each check may take before it counts as failed
+    'TIMEOUT': float(os.environ.get('READINESS_TIMEOUT', 2)),
+    # seconds a result is reused for before checking again
+    'CACHE_TTL': float(os.environ.get('READINESS_CACHE_TTL', 5)),
+    # share of a connection pool in use at which the worker is
+    # reported not ready, 1 only when every connection is taken
+    'MAX_POOL_SATURATION': float(
+        os.environ.get('READINESS_MAX_POOL_SATURATION', 1)),
+}
+# instrumented requests are logged as JSON lines on stderr, with
+# why readiness checks failed
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'core.instrumentation': {
+            'handlers': ['console'],
+            'level': os.environ.get('INSTRUMENTATION_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+        'core.readiness': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
 }
 # this setting helps images work when viewing API in browser
 SPECTACULAR_SETTINGS = {
@@ -27,6 +27,10 @@ from core import views as core_views
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/health-check/', core_views.health_check, name='health-check'),
+    path('api/ready/', core_views.readiness, name='readiness'),
+    path('api/metrics/', core_views.metrics, name='metrics'),
+    path('api/jobs/<int:pk>/', core_views.JobDetailView.as_view(),
+         name='job-detail'),
     path('api/schema/', SpectacularAPIView.as_view(), name="api_schema"),
     path('api/docs/', SpectacularSwaggerView.as_view(url_name='api_schema'),
          name='api-docs'),
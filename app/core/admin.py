@@ -50,6 +50,41 @@ class UserAdmin(BaseUserAdmin):
     )
 
 
+class UserDataAdmin(admin.ModelAdmin):
+    """Admin pages for a user's recipes, tags or ingredients, which
+    record deletes in the owners' data version"""
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        models.User.objects.mark_data_changed(obj.user_id)
+
+    def delete_queryset(self, request, queryset):
+        user_ids = set(queryset.values_list('user_id', flat=True))
+        super().delete_queryset(request, queryset)
+        for user_id in user_ids:
+            models.User.objects.mark_data_changed(user_id)
+
+
+class RecipeAdmin(UserDataAdmin):
+    """Define the admin pages for recipes."""
+
+    def save_related(self, request, form, formsets, change):
+        """Reindex recipe for search once its tags/ingredients are saved"""
+        super().save_related(request, form, formsets, change)
+        models.Recipe.objects.filter(
+            pk=form.instance.pk).update_search_vector()
+
+
+class JobAdmin(admin.ModelAdmin):
+    """Define the admin pages for background jobs."""
+    list_display = ['id', 'name', 'status', 'attempts', 'user', 'created_at']
+    list_filter = ['status', 'name']
+    readonly_fields = [
+        'name', 'payload', 'user', 'attempts', 'result', 'last_error',
+        'created_at', 'finished_at',
+    ]
+
+
 # register User model to display in admin and use
 # our custom UserAdmin class to define what should be displayed
 # since we changed the default user class
@@ -57,6 +92,7 @@ class UserAdmin(BaseUserAdmin):
 # since we changed it
 admin.site.register(models.User, UserAdmin)
 # When registering regular classes you just need to add the class
-admin.site.register(models.Recipe)
-admin.site.register(models.Tag)
-admin.site.register(models.Ingredient)
+admin.site.register(models.Recipe, RecipeAdmin)
+admin.site.register(models.Tag, UserDataAdmin)
+admin.site.register(models.Ingredient, UserDataAdmin)
+admin.site.register(models.Job, JobAdmin)
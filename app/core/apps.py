@@ -1,6 +1,15 @@
 from django.apps import AppConfig
+from django.utils.module_loading import autodiscover_modules
 
 
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        # connect signal handlers
+        from core import signals  # noqa: F401
+        # register system checks
+        from core import checks  # noqa: F401
+        # register job handlers from each app's jobs module
+        autodiscover_modules('jobs')
@@ -0,0 +1,126 @@
+"""
+Async (ASGI) serving of the API, see scripts/run.sh.
+Django 4.0 has no async ORM, and under ASGI it runs sync views one
+at a time in a single thread, so a slow query holds up every other
+request in the process. Here views run on a pool of threads instead,
+ASYNC_API_THREADS per process, while the event loop keeps accepting
+connections, and each thread manages its database connection the
+way a uwsgi worker would.
+"""
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.handlers import asgi
+from django.db import close_old_connections
+from rest_framework.routers import DefaultRouter
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Return this process's view thread pool"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.ASYNC_API_THREADS,
+                thread_name_prefix='api',
+            )
+    return _executor
+
+
+async def run_in_thread(func, *args, executor=None):
+    """Await func(*args) run on executor (the view thread pool by
+    default), with the caller's context variables"""
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(
+        executor or get_executor(),
+        functools.partial(context.run, func, *args),
+    )
+
+
+def _call_view(view, request, args, kwargs):
+    """Run a sync view the way a WSGI worker would"""
+    # request_started/finished only tidy up the connections of
+    # the thread they run in, so do it for this one by hand
+    close_old_connections()
+    try:
+        response = view(request, *args, **kwargs)
+        if hasattr(response, 'render'):
+            # rendering the serialized data is part of the work too
+            response.render()
+        return response
+    finally:
+        close_old_connections()
+
+
+def async_view(view):
+    """Wrap a sync view in an async view running it on the pool"""
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        return await run_in_thread(_call_view, view, request, args, kwargs)
+    return wrapper
+
+
+class AsyncRouter(DefaultRouter):
+    """DefaultRouter whose views are async when ASYNC_API is on"""
+
+    def get_urls(self):
+        urls = super().get_urls()
+        if not settings.ASYNC_API:
+            # under WSGI an async view would need an event loop
+            # per request, so keep the plain sync views
+            return urls
+        for url in urls:
+            url.callback = async_view(url.callback)
+        return urls
+
+
+class ASGIHandler(asgi.ASGIHandler):
+    """Django's ASGIHandler, except streamed responses (eg. the
+    recipe export) are iterated on a thread of their own"""
+
+    async def send_response(self, response, send):
+        if not response.streaming:
+            return await super().send_response(response, send)
+
+        headers = [
+            (str(header).encode('ascii'), str(value).encode('latin1'))
+            for header, value in response.items()
+        ]
+        headers.extend(
+            (b'Set-Cookie', cookie.output(header='').encode('ascii').strip())
+            for cookie in response.cookies.values()
+        )
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': headers,
+        })
+        # the iterator may hold a server side cursor, which belongs
+        # to one thread's connection, so use the same thread throughout
+        executor = ThreadPoolExecutor(max_workers=1)
+        try:
+            parts = iter(response)
+            while True:
+                part = await run_in_thread(
+                    next, parts, None, executor=executor)
+                if part is None:
+                    break
+                for chunk, _ in self.chunk_bytes(part):
+                    await send({
+                        'type': 'http.response.body',
+                        'body': chunk,
+                        'more_body': True,
+                    })
+            await send({'type': 'http.response.body'})
+        finally:
+            await run_in_thread(response.close, executor=executor)
+            await run_in_thread(close_old_connections, executor=executor)
+            executor.shutdown(wait=False)
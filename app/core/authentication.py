@@ -0,0 +1,198 @@
+"""
+Token authentication with a cache in front of the token lookup.
+Entries hold only (user id, is active, generation), never the user
+row and its password hash, and live in a small in-process LRU and,
+optionally, in a shared Django cache so other workers can skip the
+database as well.
+
+Deleting a token or saving its user (deactivated, password
+changed...) drops the entries of this process and, with the shared
+cache, starts a new generation for the user there, see core.signals.
+Every worker checks an entry's generation against the shared one
+before using it, so that reaches all of them at once. Without the
+shared cache other workers only see it once their copy expires.
+"""
+import hashlib
+import threading
+import time
+import uuid
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+
+from core import metrics
+
+
+class LRUCache:
+    """Thread safe LRU cache whose entries expire after ttl seconds"""
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the value for key or None if missing/expired"""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        """Store value, evicting the least recently used entry"""
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        """Drop key if present"""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_where(self, predicate):
+        """Drop every entry whose value matches predicate"""
+        with self._lock:
+            for key in [
+                key for key, (expires, value) in self._data.items()
+                if predicate(value)
+            ]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_local_cache = None
+_local_cache_lock = threading.Lock()
+
+
+def get_local_cache():
+    """Return the per process cache, creating it from settings"""
+    global _local_cache
+    if _local_cache is None:
+        with _local_cache_lock:
+            if _local_cache is None:
+                config = settings.TOKEN_AUTH_CACHE
+                _local_cache = LRUCache(config['MAX_SIZE'], config['TTL'])
+    return _local_cache
+
+
+def get_shared_cache():
+    """Return the shared cache tier, or None if not configured"""
+    alias = settings.TOKEN_AUTH_CACHE['CACHE_ALIAS']
+    return caches[alias] if alias else None
+
+
+def shared_cache_key(key):
+    """Cache key for a token, hashed so raw tokens
+    never end up in the cache backend"""
+    digest = hashlib.sha256(key.encode()).hexdigest()
+    return f'auth-token:{digest}'
+
+
+def generation_key(user_id):
+    """Cache key of the shared generation of a user's entries"""
+    return f'auth-user-generation:{user_id}'
+
+
+def get_generation(shared, user_id):
+    """Return the user's current generation in the shared cache.
+    Random rather than a counter, so an evicted generation can't
+    come back with a value old entries still match"""
+    return shared.get_or_set(
+        generation_key(user_id), lambda: uuid.uuid4().hex, None)
+
+
+def new_generation(user_id):
+    """Make every cached entry of the user stale in all workers"""
+    shared = get_shared_cache()
+    if shared is not None:
+        shared.set(generation_key(user_id), uuid.uuid4().hex, None)
+
+
+# what is cached for a token
+Entry = namedtuple('Entry', ['user_id', 'is_active', 'generation'])
+
+
+def invalidate_token(key, user_id):
+    """Forget the cached lookup for a token"""
+    get_local_cache().delete(key)
+    shared = get_shared_cache()
+    if shared is not None:
+        shared.delete(shared_cache_key(key))
+    new_generation(user_id)
+
+
+def invalidate_user(user_id):
+    """Forget cached lookups of all the user's tokens"""
+    get_local_cache().delete_where(lambda entry: entry.user_id == user_id)
+    new_generation(user_id)
+
+
+def cached_user(entry):
+    """The user of a cached entry, fields other than the id load
+    from the database when first used"""
+    return get_user_model().from_db(
+        DEFAULT_DB_ALIAS, ['id', 'is_active'],
+        [entry.user_id, entry.is_active])
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication that caches the token/user lookup"""
+
+    def authenticate_credentials(self, key):
+        local = get_local_cache()
+        shared = get_shared_cache()
+        entry = local.get(key)
+        # local hits keep their expiry, refreshing it would let a
+        # token in constant use stay cached forever
+        from_local = entry is not None
+        if entry is None and shared is not None:
+            entry = shared.get(shared_cache_key(key))
+        if (
+            entry is not None and shared is not None
+            and entry.generation != get_generation(shared, entry.user_id)
+        ):
+            # the token or user changed since it was cached
+            entry = None
+        # a hit in either tier skips the database
+        metrics.record_cache('token_auth', entry is not None)
+
+        if entry is None:
+            # raises AuthenticationFailed for bad/inactive tokens,
+            # those are never cached
+            user, token = super().authenticate_credentials(key)
+            entry = Entry(
+                user.pk, user.is_active,
+                get_generation(shared, user.pk) if shared else None)
+            if shared is not None:
+                shared.set(
+                    shared_cache_key(key), entry,
+                    settings.TOKEN_AUTH_CACHE['TTL'])
+            local.set(key, entry)
+            return (user, token)
+
+        if not from_local:
+            local.set(key, entry)
+        if not entry.is_active:
+            raise AuthenticationFailed('User inactive or deleted.')
+        user = cached_user(entry)
+        token = Token(key=key, user_id=entry.user_id)
+        token.user = user
+        return (user, token)
@@ -0,0 +1,60 @@
+"""Timing helpers shared by the benchmark commands"""
+import math
+import time
+
+
+def percentile(samples, pct):
+    """Return the pct percentile of samples (nearest rank)"""
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(samples):
+    """Summarize durations in seconds as milliseconds"""
+    return {
+        'count': len(samples),
+        'mean_ms': sum(samples) / len(samples) * 1000 if samples else 0.0,
+        'p50_ms': percentile(samples, 50) * 1000,
+        'p95_ms': percentile(samples, 95) * 1000,
+        'p99_ms': percentile(samples, 99) * 1000,
+    }
+
+
+def time_calls(func, repeat, warmup=1):
+    """Call func warmup + repeat times, return the timed durations"""
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def regressions(results, baseline, tolerance):
+    """Compare benchmark results with a baseline of the same shape,
+    {name: {'p95_ms', 'queries', 'errors', ...}}. Returns a message
+    for each endpoint whose p95 grew by more than tolerance (a
+    fraction), that runs more queries or that started failing."""
+    found = []
+    for name, base in baseline.items():
+        current = results.get(name)
+        if current is None:
+            # not part of this run
+            continue
+        limit = base['p95_ms'] * (1 + tolerance)
+        if current['p95_ms'] > limit:
+            found.append(
+                f'{name}: p95 {current["p95_ms"]:.2f}ms, baseline '
+                f'{base["p95_ms"]:.2f}ms (limit {limit:.2f}ms)')
+        if current['queries'] > base['queries']:
+            found.append(
+                f'{name}: {current["queries"]} queries, '
+                f'baseline {base["queries"]}')
+        if current['errors'] and not base['errors']:
+            found.append(f'{name}: {current["errors"]} failed requests')
+    return found
@@ -0,0 +1,31 @@
+"""System checks for the core app's settings"""
+from django.conf import settings
+from django.core.checks import Error, register
+
+# cache backends whose entries only exist in the process that set them
+PROCESS_LOCAL_CACHES = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+}
+
+
+@register()
+def check_replica_pin_cache(app_configs, **kwargs):
+    """Replica routing needs pins shared by every worker process,
+    or a user's writes handled by one worker won't pin the reads
+    the others handle"""
+    config = settings.REPLICAS
+    if not config['ALIASES'] or not config['PIN_SECONDS']:
+        return []
+    alias = config['CACHE_ALIAS']
+    backend = settings.CACHES.get(alias, {}).get('BACKEND')
+    if backend in PROCESS_LOCAL_CACHES:
+        return [Error(
+            f"REPLICAS['CACHE_ALIAS'] {alias!r} uses {backend}, which "
+            f'worker processes do not share, so users could miss their '
+            f'own writes on replicas.',
+            hint='Point DB_REPLICA_PIN_CACHE_ALIAS at a shared cache '
+                 '(eg. redis) or unset DB_REPLICA_HOSTS.',
+            id='core.E001',
+        )]
+    return []
@@ -0,0 +1,104 @@
+"""
+PostgreSQL backend with connection health checks and optional
+pooling, both configured from the DATABASES entry:
+
+    'CONN_HEALTH_CHECKS': True,
+    'POOL': {'MAX_SIZE': 4, 'MIN_SIZE': 0, 'TIMEOUT': 30},
+
+CONN_HEALTH_CHECKS behaves like the setting of the same name added
+in Django 4.1: a persistent connection (CONN_MAX_AGE > 0) is checked
+before its first use in each request and replaced if the server has
+dropped it, rather than failing that request.
+
+With a POOL whose MAX_SIZE is set, connections come from a per
+process core.db.pool.ConnectionPool and closing one returns it to
+the pool, so even with CONN_MAX_AGE = 0 requests reuse connections.
+"""
+import psycopg2.extras
+
+from django.db.backends.postgresql import base
+
+from core.db import pool
+from core.db.backends.postgresql.creation import DatabaseCreation
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.health_check_done = False
+        # pool the open connection came from, if any
+        self._pool = None
+
+    @property
+    def health_check_enabled(self):
+        return self.settings_dict.get('CONN_HEALTH_CHECKS', False)
+
+    def get_pool(self, conn_params):
+        """Return the pool to use, or None if pooling is off"""
+        config = self.settings_dict.get('POOL') or {}
+        if not config.get('MAX_SIZE'):
+            return None
+        return pool.get_pool(self.alias, conn_params, config)
+
+    def get_new_connection(self, conn_params):
+        connection_pool = self.get_pool(conn_params)
+        if connection_pool is None:
+            return super().get_new_connection(conn_params)
+
+        connection = connection_pool.getconn()
+        # the rest is what the postgresql backend does after connecting
+        options = self.settings_dict['OPTIONS']
+        try:
+            self.isolation_level = options['isolation_level']
+        except KeyError:
+            self.isolation_level = connection.isolation_level
+        else:
+            if self.isolation_level != connection.isolation_level:
+                connection.set_session(isolation_level=self.isolation_level)
+        psycopg2.extras.register_default_jsonb(
+            conn_or_curs=connection, loads=lambda x: x)
+        self._pool = connection_pool
+        return connection
+
+    def _close(self):
+        connection_pool = self._pool
+        if connection_pool is None or self.connection is None:
+            return super()._close()
+
+        self._pool = None
+        if self.in_atomic_block:
+            # Django keeps using the closed connection object until
+            # the atomic block exits, so it can't go back to the pool
+            with self.wrap_database_errors:
+                self.connection.close()
+        connection_pool.putconn(self.connection)
+
+    def connect(self):
+        super().connect()
+        # a brand new connection doesn't need checking
+        self.health_check_done = True
+
+    def close_if_health_check_failed(self):
+        """Close the connection if it's the first use in this request
+        of a persistent connection and it no longer works"""
+        if (
+            self.connection is None
+            or not self.health_check_enabled
+            or self.health_check_done
+        ):
+            return
+        if not self.in_atomic_block and not self.is_usable():
+            self.close()
+        self.health_check_done = True
+
+    def _cursor(self, name=None):
+        self.close_if_health_check_failed()
+        return super()._cursor(name)
+
+    def close_if_unusable_or_obsolete(self):
+        # runs at the start and end of every request
+        if self.connection is not None:
+            self.health_check_done = False
+        super().close_if_unusable_or_obsolete()
@@ -0,0 +1,12 @@
+from django.db.backends.postgresql import creation
+
+from core.db import pool
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # pooled connections to the test database would stop it
+        # from being dropped
+        pool.close_pools()
+        super()._destroy_test_db(test_database_name, verbosity)
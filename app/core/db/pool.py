@@ -0,0 +1,141 @@
+"""
+In-process pool of Postgres connections, see
+core.db.backends.postgresql. Each worker process keeps up to
+MAX_SIZE open connections that its threads take turns using, so the
+database sees a bounded number of connections per process and
+requests skip the connect/auth handshake.
+"""
+import threading
+from collections import deque
+
+import psycopg2
+from psycopg2 import extensions
+
+from django.db.utils import OperationalError
+
+# (alias, connection params) -> ConnectionPool for this process
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class ConnectionPool:
+    """Thread safe pool that blocks for up to timeout seconds
+    when every connection is in use instead of failing at once.
+    Returned connections are kept open for reuse, up to max_size."""
+
+    def __init__(self, min_size, max_size, timeout, **conn_params):
+        self.timeout = timeout
+        self.max_size = max_size
+        self.conn_params = conn_params
+        # connections checked out right now
+        self.in_use = 0
+        self.closed = False
+        self._lock = threading.Lock()
+        # open connections waiting to be checked out, handed out
+        # last in first out so any beyond what's needed stay idle
+        self._idle = deque()
+        # one slot per connection, open or not, so there are never
+        # more than max_size
+        self._slots = threading.BoundedSemaphore(max_size)
+        for _ in range(min_size):
+            self._idle.append(self.connect())
+
+    def connect(self):
+        return psycopg2.connect(**self.conn_params)
+
+    def getconn(self):
+        """Check out a connection"""
+        if not self._slots.acquire(timeout=self.timeout):
+            raise OperationalError(
+                f'No pooled database connection free after '
+                f'{self.timeout}s, raise DB_POOL_MAX_SIZE')
+        try:
+            connection = self._take_idle()
+            if connection is None:
+                connection = self.connect()
+        except BaseException:
+            self._slots.release()
+            raise
+        with self._lock:
+            self.in_use += 1
+        return connection
+
+    def _take_idle(self):
+        """Return a reusable idle connection, or None"""
+        while True:
+            with self._lock:
+                if not self._idle:
+                    return None
+                connection = self._idle.pop()
+            if is_reusable(connection):
+                return connection
+            # dropped by the server while idle in the pool
+            connection.close()
+
+    def putconn(self, connection):
+        """Return a checked out connection, discarding it if broken"""
+        try:
+            if not self.closed and is_reusable(connection):
+                status = connection.get_transaction_status()
+                if status != extensions.TRANSACTION_STATUS_IDLE:
+                    # never hand the next user an open transaction
+                    connection.rollback()
+                with self._lock:
+                    self._idle.append(connection)
+            else:
+                connection.close()
+        except Exception:
+            connection.close()
+        finally:
+            with self._lock:
+                self.in_use -= 1
+            self._slots.release()
+
+    def closeall(self):
+        """Close the idle connections, checked out ones are closed
+        when they are returned"""
+        with self._lock:
+            self.closed = True
+            idle, self._idle = list(self._idle), deque()
+        for connection in idle:
+            connection.close()
+
+
+def is_reusable(connection):
+    """Cheap check, without a round trip, that connection is open"""
+    return not connection.closed and (
+        connection.get_transaction_status()
+        != extensions.TRANSACTION_STATUS_UNKNOWN
+    )
+
+
+def get_pool(alias, conn_params, config):
+    """Return this process's pool for alias, creating it on first use"""
+    key = (alias, tuple(sorted(conn_params.items())))
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ConnectionPool(
+                config.get('MIN_SIZE', 0),
+                config['MAX_SIZE'],
+                config.get('TIMEOUT', 30),
+                **conn_params,
+            )
+        return _pools[key]
+
+
+def pools():
+    """Return {alias: [ConnectionPool, ...]} of this process"""
+    with _pools_lock:
+        items = list(_pools.items())
+    found = {}
+    for (alias, _), connection_pool in items:
+        found.setdefault(alias, []).append(connection_pool)
+    return found
+
+
+def close_pools():
+    """Close every pooled connection of this process"""
+    with _pools_lock:
+        for connection_pool in _pools.values():
+            connection_pool.closeall()
+        _pools.clear()
@@ -0,0 +1,107 @@
+"""
+Routing of reads to read replicas.
+Replicas are only used for reads made while handling a safe (GET,
+HEAD, OPTIONS) request, see core.middleware.ReplicaRoutingMiddleware.
+Everything else, including management commands and job workers,
+reads from the primary like before.
+
+Replicas lag behind the primary, so after a user writes anything
+they are pinned to the primary for settings.REPLICAS['PIN_SECONDS'],
+long enough for the replicas to catch up and for a recipe they just
+created to show up in their lists. Pins are kept in the cache
+REPLICAS['CACHE_ALIAS'], which every worker process must share, see
+core.checks.
+"""
+import contextvars
+import random
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+
+# apps whose models are always read from the primary: they're read
+# while authenticating, before we know whether the user is pinned
+PRIMARY_APPS = {'admin', 'auth', 'authtoken', 'contenttypes', 'sessions'}
+# same for these core models, Job also because workers poll it
+PRIMARY_MODELS = {'core.user', 'core.job'}
+
+_request = contextvars.ContextVar('replica_request', default=None)
+
+
+def replica_aliases():
+    return settings.REPLICAS['ALIASES']
+
+
+def _pin_key(user_id):
+    return f'replica-pin:{user_id}'
+
+
+def pin_user(user_id):
+    """Send user_id's reads to the primary for the pin window"""
+    config = settings.REPLICAS
+    if not config['ALIASES'] or not config['PIN_SECONDS']:
+        return
+    caches[config['CACHE_ALIAS']].set(
+        _pin_key(user_id), True, config['PIN_SECONDS'])
+
+
+def is_pinned(user_id):
+    """Whether user_id wrote recently enough to read from the primary"""
+    cache = caches[settings.REPLICAS['CACHE_ALIAS']]
+    return bool(cache.get(_pin_key(user_id)))
+
+
+class ReadState:
+    """Which database the reads of one request go to"""
+
+    def __init__(self, request):
+        self.request = request
+        self.alias = None
+
+    def db_for_read(self):
+        if self.alias is None:
+            user = getattr(self.request, 'user', None)
+            if user is None or not user.is_authenticated:
+                # not authenticated yet, decide on a later read
+                return DEFAULT_DB_ALIAS
+            # one database per request so its reads are consistent
+            if is_pinned(user.pk):
+                self.alias = DEFAULT_DB_ALIAS
+            else:
+                self.alias = random.choice(replica_aliases())
+        return self.alias
+
+
+def start_request(request):
+    """Allow reads made for request to use a replica, returns a
+    token to pass to end_request"""
+    return _request.set(ReadState(request))
+
+
+def end_request(token):
+    _request.reset(token)
+
+
+class ReplicaRouter:
+    """Send safe request reads to replicas and everything else
+    to the primary"""
+
+    def db_for_read(self, model, **hints):
+        state = _request.get()
+        if state is None or not replica_aliases():
+            return DEFAULT_DB_ALIAS
+        if model._meta.app_label in PRIMARY_APPS \
+                or model._meta.label_lower in PRIMARY_MODELS:
+            return DEFAULT_DB_ALIAS
+        return state.db_for_read()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # replicas get the schema through replication
+        return db == DEFAULT_DB_ALIAS
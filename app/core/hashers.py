@@ -0,0 +1,83 @@
+"""
+Password hashers whose cost comes from settings.PASSWORD_HASHING,
+so it can be tuned per deployment (see the benchmark_hashers
+command) instead of being fixed by the Django version.
+
+They keep the algorithm names of Django's hashers, so hashes made
+by either verify with the other. Whenever a password is checked,
+eg. by the token endpoint, Django rehashes and saves it if it was
+made with another algorithm than PASSWORD_HASHING['ALGORITHM'] or
+with other costs, so changing the settings takes effect as users
+log in.
+"""
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+def _config(key):
+    return settings.PASSWORD_HASHING[key]
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    """PBKDF2 with PASSWORD_HASHING['PBKDF2_ITERATIONS']"""
+
+    @property
+    def iterations(self):
+        return _config('PBKDF2_ITERATIONS')
+
+
+class ScryptPasswordHasher(hashers.ScryptPasswordHasher):
+    """scrypt with PASSWORD_HASHING['SCRYPT_WORK_FACTOR'] (a power
+    of 2)"""
+
+    # scrypt needs 128 * work_factor * block_size bytes, OpenSSL's
+    # default limit of 32MB rules out work factors over 2**14. Only
+    # a limit, high enough to verify hashes made with a higher work
+    # factor than the current one
+    maxmem = 2**30
+
+    @property
+    def work_factor(self):
+        return _config('SCRYPT_WORK_FACTOR')
+
+
+class Argon2PasswordHasher(hashers.Argon2PasswordHasher):
+    """argon2 with PASSWORD_HASHING['ARGON2_TIME_COST'],
+    ['ARGON2_MEMORY_COST'] (KiB) and ['ARGON2_PARALLELISM'], needs
+    the argon2-cffi package"""
+
+    @property
+    def time_cost(self):
+        return _config('ARGON2_TIME_COST')
+
+    @property
+    def memory_cost(self):
+        return _config('ARGON2_MEMORY_COST')
+
+    @property
+    def parallelism(self):
+        return _config('ARGON2_PARALLELISM')
+
+
+# algorithm -> the PASSWORD_HASHING key that sets its cost, which
+# hashing time grows in proportion to
+COST_SETTINGS = {
+    PBKDF2PasswordHasher.algorithm: 'PBKDF2_ITERATIONS',
+    ScryptPasswordHasher.algorithm: 'SCRYPT_WORK_FACTOR',
+    Argon2PasswordHasher.algorithm: 'ARGON2_TIME_COST',
+}
+
+
+def cost_for_budget(algorithm, cost, took, budget):
+    """Return the highest cost of algorithm hashing within budget,
+    given that one hash at cost took took, in the same unit"""
+    target = cost * budget / took
+    if algorithm == ScryptPasswordHasher.algorithm:
+        # work factors are powers of 2
+        work_factor = 2
+        while work_factor * 2 <= target:
+            work_factor *= 2
+        return work_factor
+    if algorithm == PBKDF2PasswordHasher.algorithm:
+        return max(1000, int(target) // 1000 * 1000)
+    return max(1, int(target))
@@ -0,0 +1,195 @@
+"""
+Per request instrumentation of queries and where time goes.
+A sample of requests, settings.INSTRUMENTATION['SAMPLE_RATE'], is
+instrumented by core.middleware.InstrumentationMiddleware. For those
+it records the query count, time spent in the database, the slowest
+query and the time spent authenticating, serializing and rendering,
+then reports them in a Server-Timing header and a JSON log line.
+
+Queries are timed by an execute wrapper installed on every database
+connection (see core.signals). It and the other timers only look up
+a context variable when the request isn't sampled, so requests that
+aren't instrumented pay next to nothing.
+"""
+import contextvars
+import hashlib
+import json
+import logging
+import random
+import re
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.utils.functional import SimpleLazyObject, empty
+
+logger = logging.getLogger(__name__)
+
+_metrics = contextvars.ContextVar('request_metrics', default=None)
+
+# the parts of a query that change between runs of the same query
+_LITERALS = re.compile(r"%s|'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_LISTS = re.compile(r'\(\?(?:\s*,\s*\?)+\)')
+_SPACE = re.compile(r'\s+')
+# longest fingerprint logged, IN lists etc. are already collapsed
+MAX_FINGERPRINT = 1000
+
+
+def fingerprint(sql):
+    """Return sql with its literals and parameters replaced by ?
+    and lists of them by (...), so runs of a query compare equal"""
+    sql = _LITERALS.sub('?', sql)
+    sql = _LISTS.sub('(...)', sql)
+    return _SPACE.sub(' ', sql).strip()
+
+
+class RequestMetrics:
+    """What one instrumented request spent its time on"""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.slowest_time = 0.0
+        self.slowest_sql = None
+        # phase (auth, serialize, render) -> seconds spent
+        self.timings = {}
+        # phases being timed, nested timers of the same phase
+        # (eg. nested serializers) are only counted once
+        self.active = set()
+
+    def record_query(self, sql, duration):
+        """Add a query that took duration seconds"""
+        self.queries += 1
+        self.db_time += duration
+        if duration >= self.slowest_time:
+            self.slowest_time = duration
+            self.slowest_sql = sql
+
+
+def start():
+    """Instrument the current request, returns a token to pass to
+    finish along with its metrics"""
+    metrics = RequestMetrics()
+    return _metrics.set(metrics), metrics
+
+
+def finish(token):
+    _metrics.reset(token)
+
+
+def is_sampled(rate):
+    """Whether to instrument a request at the given sample rate"""
+    return rate > 0 and random.random() < rate
+
+
+@contextmanager
+def timed(phase):
+    """Add the time spent in the block to phase of the current
+    request's metrics, if it's instrumented"""
+    metrics = _metrics.get()
+    if metrics is None or phase in metrics.active:
+        yield
+        return
+    metrics.active.add(phase)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.timings[phase] = (
+            metrics.timings.get(phase, 0.0)
+            + time.perf_counter() - started)
+        metrics.active.discard(phase)
+
+
+def query_timer(execute, sql, params, many, context):
+    """Database execute wrapper timing queries of instrumented
+    requests"""
+    metrics = _metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.record_query(sql, time.perf_counter() - started)
+
+
+class InstrumentedViewMixin:
+    """Time the authentication of a DRF view"""
+
+    def perform_authentication(self, request):
+        with timed('auth'):
+            super().perform_authentication(request)
+
+
+class TimedSerializerMixin:
+    """Time building a serializer's representation of instances"""
+
+    def to_representation(self, instance):
+        metrics = _metrics.get()
+        if metrics is None or 'serialize' in metrics.active:
+            return super().to_representation(instance)
+        with timed('serialize'):
+            return super().to_representation(instance)
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 3)
+
+
+def server_timing(metrics, total):
+    """Return the Server-Timing header value for metrics"""
+    entries = [
+        f'db;dur={_ms(metrics.db_time)};desc="{metrics.queries} queries"',
+    ]
+    if metrics.slowest_sql is not None:
+        entries.append(
+            f'db-slowest;dur={_ms(metrics.slowest_time)};'
+            f'desc="{query_id(metrics.slowest_sql)}"')
+    entries.extend(
+        f'{phase};dur={_ms(seconds)}'
+        for phase, seconds in metrics.timings.items())
+    entries.append(f'total;dur={_ms(total)}')
+    return ', '.join(entries)
+
+
+def query_id(sql):
+    """Short id of a query's fingerprint, to match headers to logs"""
+    return hashlib.md5(fingerprint(sql).encode()).hexdigest()[:12]
+
+
+def _user_id(request):
+    """Id of the request's user, without loading a session user
+    nothing has looked at"""
+    user = getattr(request, 'user', None)
+    if isinstance(user, SimpleLazyObject) and user._wrapped is empty:
+        return None
+    return getattr(user, 'pk', None)
+
+
+def report(request, response, metrics, total):
+    """Add the Server-Timing header and log a line for a request"""
+    if settings.INSTRUMENTATION['SERVER_TIMING']:
+        response['Server-Timing'] = server_timing(metrics, total)
+
+    match = request.resolver_match
+    line = {
+        'method': request.method,
+        'path': request.path,
+        'view': match.view_name if match else None,
+        'status': response.status_code,
+        'user': _user_id(request),
+        'total_ms': _ms(total),
+        'queries': metrics.queries,
+        'db_ms': _ms(metrics.db_time),
+        **{f'{phase}_ms': _ms(seconds)
+           for phase, seconds in metrics.timings.items()},
+    }
+    if metrics.slowest_sql is not None:
+        line.update({
+            'slowest_query_ms': _ms(metrics.slowest_time),
+            'slowest_query_id': query_id(metrics.slowest_sql),
+            'slowest_query':
+                fingerprint(metrics.slowest_sql)[:MAX_FINGERPRINT],
+        })
+    logger.info(json.dumps(line))
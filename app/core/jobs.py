@@ -0,0 +1,189 @@
+"""
+Postgres backed queue for work that shouldn't hold up a request.
+Jobs are rows of core.models.Job. Workers (manage.py run_worker) claim
+them with SELECT ... FOR UPDATE SKIP LOCKED, so any number of workers
+can poll the table without being handed the same job, and a job that
+is enqueued inside a transaction only becomes visible if it commits.
+
+Handlers are registered by name in a `jobs` module of any installed
+app, eg. recipe/jobs.py:
+
+    @jobs.register('recipe.image_variants', max_attempts=3)
+    def image_variants(job):
+        ...
+
+A handler gets the Job and returns a JSON serializable result. If it
+raises, the job is retried with exponential backoff until it has run
+max_attempts times.
+
+While a handler runs its claim is extended every third of the
+visibility timeout, so only a worker that died or hung loses its
+jobs. Those are claimed again while they have attempts left, and
+fail otherwise: a handler registered with max_attempts=1 never runs
+twice, whatever happened to the first run.
+"""
+import threading
+import traceback
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from core.models import Job
+
+# name -> (handler, max_attempts)
+registry = {}
+# longest traceback kept on a failed job
+MAX_ERROR_LENGTH = 10000
+
+
+def register(name, max_attempts=None):
+    """Decorator registering a job handler under name"""
+    def decorator(func):
+        registry[name] = (
+            func, max_attempts or settings.JOBS['MAX_ATTEMPTS'])
+        return func
+    return decorator
+
+
+def enqueue(name, payload=None, user=None, delay=0):
+    """Queue a run of the handler registered as name"""
+    if name not in registry:
+        raise ValueError(f'No job handler registered as {name!r}')
+    handler, max_attempts = registry[name]
+    return Job.objects.create(
+        name=name,
+        payload=payload or {},
+        user=user,
+        max_attempts=max_attempts,
+        run_at=timezone.now() + timedelta(seconds=delay),
+    )
+
+
+def claim(limit=1, visibility_timeout=None):
+    """Claim up to limit due jobs for this worker. A claimed job
+    that isn't finished within visibility_timeout seconds (eg. its
+    worker died) becomes claimable again, or fails if it has no
+    attempts left."""
+    if visibility_timeout is None:
+        visibility_timeout = settings.JOBS['VISIBILITY_TIMEOUT']
+    now = timezone.now()
+    with transaction.atomic():
+        timed_out = Job.objects.select_for_update(skip_locked=True).filter(
+            status=Job.RUNNING,
+            run_at__lte=now,
+            attempts__gte=F('max_attempts'),
+        )
+        Job.objects.filter(
+            pk__in=list(timed_out.values_list('pk', flat=True)),
+        ).update(
+            status=Job.FAILED, finished_at=now,
+            last_error='The last attempt did not finish within the '
+                       'visibility timeout')
+        jobs = list(
+            Job.objects.select_for_update(skip_locked=True).filter(
+                Q(status=Job.QUEUED)
+                | Q(status=Job.RUNNING, attempts__lt=F('max_attempts')),
+                run_at__lte=now,
+            ).order_by('run_at', 'id')[:limit]
+        )
+        for job in jobs:
+            job.status = Job.RUNNING
+            job.attempts += 1
+            job.run_at = now + timedelta(seconds=visibility_timeout)
+        Job.objects.bulk_update(jobs, ['status', 'attempts', 'run_at'])
+    return jobs
+
+
+def retry_delay(attempts):
+    """Seconds to wait before retrying a job that failed attempts
+    times, doubling each time"""
+    return settings.JOBS['RETRY_DELAY'] * 2 ** (attempts - 1)
+
+
+def extend_claim(job, visibility_timeout):
+    """Move the end of a running job's visibility timeout to
+    visibility_timeout seconds from now, returns False if the job
+    is no longer claimed by this worker"""
+    return Job.objects.filter(
+        pk=job.pk, status=Job.RUNNING, attempts=job.attempts,
+    ).update(
+        run_at=timezone.now() + timedelta(seconds=visibility_timeout),
+    ) > 0
+
+
+@contextmanager
+def heartbeat(job, visibility_timeout):
+    """Keep extending the job's claim from another thread while the
+    block runs, so a slow handler isn't handed to another worker"""
+    stop = threading.Event()
+
+    def beat():
+        try:
+            while not stop.wait(visibility_timeout / 3):
+                if not extend_claim(job, visibility_timeout):
+                    break
+        finally:
+            # the thread's own db connection
+            connections.close_all()
+
+    thread = threading.Thread(
+        target=beat, name=f'job-{job.pk}-heartbeat', daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def run(job, visibility_timeout=None):
+    """Run a claimed job and record the outcome, returns the job"""
+    if visibility_timeout is None:
+        visibility_timeout = settings.JOBS['VISIBILITY_TIMEOUT']
+    # only record the outcome if no other worker has claimed the
+    # job since, ie. our visibility timeout hasn't run out
+    claimed = Job.objects.filter(
+        pk=job.pk, status=Job.RUNNING, attempts=job.attempts)
+    now = timezone.now
+    try:
+        if job.name not in registry:
+            raise LookupError(f'No job handler registered as {job.name!r}')
+        handler, max_attempts = registry[job.name]
+        with heartbeat(job, visibility_timeout):
+            job.result = handler(job)
+    except Exception:
+        job.last_error = traceback.format_exc()[-MAX_ERROR_LENGTH:]
+        if job.attempts < job.max_attempts:
+            job.status = Job.QUEUED
+            job.run_at = now() + timedelta(
+                seconds=retry_delay(job.attempts))
+        else:
+            job.status = Job.FAILED
+            job.finished_at = now()
+        claimed.update(
+            status=job.status, run_at=job.run_at,
+            last_error=job.last_error, finished_at=job.finished_at)
+        return job
+
+    job.status = Job.SUCCEEDED
+    job.finished_at = now()
+    claimed.update(
+        status=job.status, result=job.result,
+        last_error='', finished_at=job.finished_at)
+    return job
+
+
+def run_pending(limit=None):
+    """Claim and run due jobs in this thread until none are left,
+    returns the jobs run"""
+    done = []
+    while limit is None or len(done) < limit:
+        jobs = claim()
+        if not jobs:
+            break
+        done.append(run(jobs[0]))
+    return done
@@ -0,0 +1,235 @@
+"""
+Django command to benchmark the API endpoints.
+Seeds users with recipes, tags and ingredients inside a transaction
+that is rolled back, then sends requests through the Django test
+client (no server or network needed) and reports p50/p95/p99
+latency, throughput and queries per request for each endpoint.
+Results can be written to a JSON file and checked against a
+baseline written by an earlier run, failing on regressions.
+"""
+import io
+import itertools
+import json
+import platform
+import tempfile
+from contextlib import ExitStack
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.benchmark import regressions, summarize, time_calls
+from core.seed import seed_users
+
+
+def image_file():
+    """Return a small in memory JPEG to upload"""
+    content = io.BytesIO()
+    Image.new('RGB', (10, 10)).save(content, format='JPEG')
+    content.seek(0)
+    content.name = 'image.jpg'
+    return content
+
+
+def endpoints(user):
+    """Return {name: function(i) -> (method, url, data, format)}
+    sending the i-th request for each benchmarked endpoint"""
+    recipe_ids = list(user.recipe_set.values_list('id', flat=True)[:100])
+    tag_ids = ','.join(
+        str(pk) for pk in user.tag_set.values_list('id', flat=True)[:2])
+    ingredient_ids = ','.join(
+        str(pk) for pk in
+        user.ingredient_set.values_list('id', flat=True)[:2])
+    recipes_url = reverse('recipe:recipe-list')
+
+    def detail(i):
+        recipe_id = recipe_ids[i % len(recipe_ids)]
+        url = reverse('recipe:recipe-detail', args=[recipe_id])
+        return 'get', url, None, None
+
+    def upload_image(i):
+        recipe_id = recipe_ids[i % len(recipe_ids)]
+        url = reverse('recipe:recipe-upload-image', args=[recipe_id])
+        return 'post', url, {'image': image_file()}, 'multipart'
+
+    def create(i):
+        return 'post', recipes_url, {
+            'title': f'Benchmark recipe {i}',
+            'time_minutes': 30,
+            'price': '7.50',
+            'tags': [{'name': 'Tag 0'}, {'name': f'New tag {i}'}],
+            'ingredients': [
+                {'name': 'Ingredient 0'}, {'name': f'New ingredient {i}'},
+            ],
+        }, 'json'
+
+    return {
+        'recipe list': lambda i: ('get', recipes_url, None, None),
+        'recipe list filtered': lambda i: ('get', recipes_url, {
+            'tags': tag_ids, 'ingredients': ingredient_ids,
+        }, None),
+        'recipe detail': detail,
+        # writes last, they change what the reads above return
+        'recipe create': create,
+        'recipe upload image': upload_image,
+        'token auth': lambda i: ('post', reverse('user:token'), {
+            'email': user.email, 'password': 'seedpass123',
+        }, 'json'),
+    }
+
+
+class Command(BaseCommand):
+    """Django command to benchmark the API endpoints"""
+    help = 'Measure latency, throughput and queries per API endpoint.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=5)
+        parser.add_argument('--recipes', type=int, default=1000,
+                            help='Recipes per user')
+        parser.add_argument('--tags', type=int, default=50,
+                            help='Tags per user')
+        parser.add_argument('--ingredients', type=int, default=200,
+                            help='Ingredients per user')
+        parser.add_argument('--requests', type=int, default=100,
+                            help='Timed requests per endpoint')
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--endpoint', action='append',
+                            help='Only benchmark this endpoint, '
+                                 'repeatable')
+        parser.add_argument('--cache', action='store_true',
+                            help='Keep the response cache on, by '
+                                 'default it is off to time the queries')
+        parser.add_argument('--output', help='Write results to this file')
+        parser.add_argument('--baseline',
+                            help='Fail if results regressed from the '
+                                 'results in this file')
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help='Fraction p95 may grow over the baseline')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command"""
+        response_cache = {
+            **settings.RESPONSE_CACHE, 'ENABLED': options['cache']}
+        with ExitStack() as stack:
+            media_root = stack.enter_context(tempfile.TemporaryDirectory())
+            stack.enter_context(override_settings(
+                ALLOWED_HOSTS=['testserver'],
+                # uploads are thrown away with the data
+                MEDIA_ROOT=media_root,
+                RESPONSE_CACHE=response_cache,
+                # the seeded data is never committed for replicas to see
+                REPLICAS={**settings.REPLICAS, 'ALIASES': []},
+            ))
+            stack.enter_context(transaction.atomic())
+            self.stdout.write('Seeding data...')
+            users = seed_users(
+                users=options['users'],
+                recipes=options['recipes'],
+                tags=options['tags'],
+                ingredients=options['ingredients'],
+                email_prefix='benchmark-api',
+            )
+            results = self.run_endpoints(users[0], options)
+            transaction.set_rollback(True)
+
+        report = {
+            'config': {
+                key: options[key] for key in (
+                    'users', 'recipes', 'tags', 'ingredients',
+                    'requests', 'cache')
+            },
+            'environment': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+            },
+            'endpoints': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2)
+            self.stdout.write(f'Results written to {options["output"]}')
+
+        if options['baseline']:
+            self.check_baseline(results, options)
+
+    def run_endpoints(self, user, options):
+        """Benchmark each selected endpoint, return their results"""
+        client = APIClient()
+        token = Token.objects.create(user=user)
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        selected = endpoints(user)
+        unknown = set(options['endpoint'] or []) - set(selected)
+        if unknown:
+            raise CommandError(
+                f'Unknown endpoint(s): {", ".join(sorted(unknown))}')
+
+        results = {}
+        for name, build in selected.items():
+            if options['endpoint'] and name not in options['endpoint']:
+                continue
+            results[name] = self.run_endpoint(client, build, options)
+            self.report(name, results[name])
+        return results
+
+    def run_endpoint(self, client, build, options):
+        """Time requests built by build, return their statistics"""
+        numbers = itertools.count()
+        statuses = []
+
+        def request():
+            method, url, data, content_format = build(next(numbers))
+            if method == 'get':
+                response = client.get(url, data)
+            else:
+                response = client.post(url, data, format=content_format)
+            statuses.append(response.status_code)
+
+        # queries per request are the same every time, count them
+        # once rather than slow down the timed requests
+        with ExitStack() as stack:
+            captured = [
+                stack.enter_context(CaptureQueriesContext(connection))
+                for connection in connections.all()
+            ]
+            request()
+        queries = sum(len(capture) for capture in captured)
+
+        samples = time_calls(request, options['requests'], options['warmup'])
+        stats = summarize(samples)
+        stats['throughput_rps'] = len(samples) / max(sum(samples), 1e-9)
+        stats['queries'] = queries
+        stats['errors'] = sum(1 for code in statuses if code >= 400)
+        return stats
+
+    def report(self, name, stats):
+        """Print the results of one endpoint"""
+        line = (
+            f'{name}: p50 {stats["p50_ms"]:.2f}ms, '
+            f'p95 {stats["p95_ms"]:.2f}ms, p99 {stats["p99_ms"]:.2f}ms, '
+            f'{stats["throughput_rps"]:.1f} req/s, '
+            f'{stats["queries"]} queries'
+        )
+        if stats['errors']:
+            self.stdout.write(self.style.ERROR(
+                f'{line}, {stats["errors"]} failed requests'))
+        else:
+            self.stdout.write(line)
+
+    def check_baseline(self, results, options):
+        """Raise CommandError if results regressed from the baseline"""
+        with open(options['baseline']) as baseline:
+            base = json.load(baseline)['endpoints']
+        found = regressions(results, base, options['tolerance'])
+        for message in found:
+            self.stdout.write(self.style.ERROR(message))
+        if found:
+            raise CommandError(
+                f'{len(found)} regression(s) against {options["baseline"]}')
+        self.stdout.write(self.style.SUCCESS('No regressions'))
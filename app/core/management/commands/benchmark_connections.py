@@ -0,0 +1,102 @@
+"""
+Django command to benchmark database connection handling.
+Sends requests for the recipe list through the WSGI handler, the
+way uwsgi does, so connections are opened and closed at the same
+points as in production, under each connection configuration.
+"""
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import RequestFactory, override_settings
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+
+from core.benchmark import summarize, time_calls
+from core.db import pool
+from core.seed import seed_users
+
+# name -> DATABASES settings used for that run
+SCENARIOS = {
+    'new connection per request': {
+        'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False,
+        'POOL': {'MAX_SIZE': 0},
+    },
+    'persistent': {
+        'CONN_MAX_AGE': 60, 'CONN_HEALTH_CHECKS': False,
+        'POOL': {'MAX_SIZE': 0},
+    },
+    'persistent + health checks': {
+        'CONN_MAX_AGE': 60, 'CONN_HEALTH_CHECKS': True,
+        'POOL': {'MAX_SIZE': 0},
+    },
+    'pooled': {
+        'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False,
+        'POOL': {'MAX_SIZE': 1},
+    },
+}
+
+
+def start_response(status, headers):
+    """WSGI start_response that discards the response"""
+
+
+class Command(BaseCommand):
+    """Django command to benchmark connection handling"""
+    help = 'Compare recipe list latency per connection configuration.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--recipes', type=int, default=20,
+                            help='Recipes listed per request')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command"""
+        # requests close the connection, so the data has to be
+        # committed rather than rolled back afterwards
+        user, = seed_users(
+            recipes=options['recipes'],
+            email_prefix='benchmark-connections',
+        )
+        token = Token.objects.create(user=user)
+        original = dict(connection.settings_dict)
+        try:
+            # measure the database, not the response cache
+            with override_settings(
+                    ALLOWED_HOSTS=['testserver'],
+                    RESPONSE_CACHE={
+                        **settings.RESPONSE_CACHE, 'ENABLED': False}):
+                for name, config in SCENARIOS.items():
+                    self.run_scenario(name, config, token, options)
+        finally:
+            self.reset(original)
+            user.delete()
+
+    def reset(self, settings_dict):
+        """Drop open connections and restore the configuration"""
+        connection.close()
+        pool.close_pools()
+        connection.settings_dict.clear()
+        connection.settings_dict.update(settings_dict)
+
+    def run_scenario(self, name, config, token, options):
+        """Time requests with the given connection settings"""
+        self.reset({**connection.settings_dict, **config})
+        handler = WSGIHandler()
+        factory = RequestFactory()
+        url = reverse('recipe:recipe-list')
+
+        def request():
+            environ = factory.get(
+                url, HTTP_AUTHORIZATION=f'Token {token.key}').environ
+            response = handler(environ, start_response)
+            b''.join(response)
+            # fires request_finished, which closes old connections
+            response.close()
+
+        stats = summarize(time_calls(request, options['requests']))
+        self.stdout.write(
+            f'{name}: p50 {stats["p50_ms"]:.2f}ms, '
+            f'p95 {stats["p95_ms"]:.2f}ms, '
+            f'mean {stats["mean_ms"]:.2f}ms'
+        )
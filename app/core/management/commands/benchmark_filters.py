@@ -0,0 +1,104 @@
+"""
+Django command to benchmark the recipe tag/ingredient filters.
+Compares the EXISTS based filters against the join + DISTINCT
+queries they replaced, on seeded data that is rolled back.
+"""
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from core.benchmark import summarize, time_calls
+from core.models import Recipe
+from core.seed import seed_users
+from recipe import filters
+
+
+def join_queryset(user, tags, ingredients, match):
+    """The join + DISTINCT form of the filters"""
+    queryset = Recipe.objects.filter(user=user)
+    if match == filters.MATCH_ANY:
+        if tags:
+            queryset = queryset.filter(tags__id__in=tags)
+        if ingredients:
+            queryset = queryset.filter(ingredients__id__in=ingredients)
+    else:
+        # each filter() call on a multi valued relation adds a join
+        for tag_id in tags:
+            queryset = queryset.filter(tags__id=tag_id)
+        for ingredient_id in ingredients:
+            queryset = queryset.filter(ingredients__id=ingredient_id)
+    return queryset.order_by('-id').distinct()
+
+
+def exists_queryset(user, tags, ingredients, match):
+    """The EXISTS form the API uses"""
+    queryset = filters.filter_recipes(
+        Recipe.objects.filter(user=user), tags, ingredients, match)
+    return queryset.order_by('-id')
+
+
+class Command(BaseCommand):
+    """Django command to benchmark recipe filtering"""
+    help = 'Compare EXISTS and join + DISTINCT recipe filtering.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=5000,
+                            help='Recipes for the benchmark user')
+        parser.add_argument('--tags', type=int, default=30)
+        parser.add_argument('--ingredients', type=int, default=100)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--limit', type=int, default=101,
+                            help='Rows fetched per query, like a page')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command"""
+        with transaction.atomic():
+            self.stdout.write('Seeding data...')
+            user, = seed_users(
+                recipes=options['recipes'],
+                tags=options['tags'],
+                ingredients=options['ingredients'],
+                email_prefix='benchmark-filters',
+            )
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+            tag_ids = list(user.tag_set.values_list('id', flat=True)[:3])
+            ingredient_ids = list(
+                user.ingredient_set.values_list('id', flat=True)[:3])
+            scenarios = [
+                ('tags', tag_ids, [], filters.MATCH_ANY),
+                ('ingredients', [], ingredient_ids, filters.MATCH_ANY),
+                ('tags + ingredients', tag_ids, ingredient_ids,
+                 filters.MATCH_ANY),
+                ('all tags', tag_ids, [], filters.MATCH_ALL),
+                ('all tags + ingredients', tag_ids, ingredient_ids,
+                 filters.MATCH_ALL),
+            ]
+            for scenario in scenarios:
+                self.compare(user, *scenario, options)
+
+            transaction.set_rollback(True)
+
+    def compare(self, user, name, tags, ingredients, match, options):
+        """Time both forms of one filter and print the speedup"""
+        limit = options['limit']
+        join = join_queryset(user, tags, ingredients, match)[:limit]
+        exists = exists_queryset(user, tags, ingredients, match)[:limit]
+        # both forms must find the same recipes to be comparable
+        join_ids = [recipe.id for recipe in join]
+        exists_ids = [recipe.id for recipe in exists]
+        if join_ids != exists_ids:
+            self.stdout.write(self.style.ERROR(f'{name}: results differ'))
+            return
+
+        join_stats = summarize(
+            time_calls(lambda: list(join.all()), options['repeat']))
+        exists_stats = summarize(
+            time_calls(lambda: list(exists.all()), options['repeat']))
+        speedup = join_stats['p50_ms'] / max(exists_stats['p50_ms'], 1e-6)
+        self.stdout.write(
+            f'{name} ({len(exists_ids)} rows): '
+            f'join+distinct p50 {join_stats["p50_ms"]:.2f}ms, '
+            f'exists p50 {exists_stats["p50_ms"]:.2f}ms, '
+            f'{speedup:.1f}x'
+        )
@@ -0,0 +1,64 @@
+"""
+Django command to benchmark the password hashers, see core.hashers.
+Times hashing a password with each algorithm at the configured cost
+on one thread, so one core, and reports hashes per second. With
+--budget-ms it also suggests the cost that keeps checking a
+password, most of the token endpoint's time, within that budget.
+"""
+from django.conf import settings
+from django.contrib.auth.hashers import get_hasher
+from django.core.management.base import BaseCommand, CommandError
+
+from core.benchmark import summarize, time_calls
+from core.hashers import COST_SETTINGS, cost_for_budget
+
+
+class Command(BaseCommand):
+    """Django command to benchmark the password hashers"""
+    help = 'Measure password hashes per second per core.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--algorithm', action='append',
+                            choices=sorted(COST_SETTINGS),
+                            help='Only benchmark this algorithm, '
+                                 'repeatable')
+        parser.add_argument('--repeat', type=int, default=10)
+        parser.add_argument('--budget-ms', type=float,
+                            help='Suggest costs hashing within this time')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command"""
+        if options['budget_ms'] is not None and options['budget_ms'] <= 0:
+            raise CommandError('--budget-ms must be positive')
+
+        configured = settings.PASSWORD_HASHING['ALGORITHM']
+        for algorithm in options['algorithm'] or sorted(COST_SETTINGS):
+            hasher = get_hasher(algorithm)
+            salt = hasher.salt()
+            try:
+                samples = time_calls(
+                    lambda: hasher.encode('benchmark password', salt),
+                    options['repeat'])
+            except ValueError as error:
+                # eg. argon2-cffi isn't installed
+                self.stdout.write(self.style.WARNING(
+                    f'{algorithm}: skipped, {error}'))
+                continue
+            self.report(
+                algorithm, algorithm == configured, summarize(samples),
+                options['budget_ms'])
+
+    def report(self, algorithm, in_use, stats, budget_ms):
+        """Print the results of one algorithm"""
+        setting = COST_SETTINGS[algorithm]
+        cost = settings.PASSWORD_HASHING[setting]
+        line = (
+            f'{algorithm}{" (in use)" if in_use else ""}, {setting}={cost}: '
+            f'p50 {stats["p50_ms"]:.2f}ms, '
+            f'{1000 / max(stats["p50_ms"], 1e-6):.1f} hashes/s per core'
+        )
+        if budget_ms is not None:
+            suggested = cost_for_budget(
+                algorithm, cost, stats['p50_ms'], budget_ms)
+            line += f', {setting}={suggested} for {budget_ms:g}ms'
+        self.stdout.write(line)
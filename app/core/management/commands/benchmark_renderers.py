@@ -0,0 +1,83 @@
+"""
+Django command to benchmark the API JSON renderer and parser.
+Serializes a large list of seeded recipes (rolled back) and times
+DRF's JSONRenderer/JSONParser against the orjson backed ones.
+"""
+import io
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from core.benchmark import summarize, time_calls
+from core.parsers import FastJSONParser
+from core.renderers import FastJSONRenderer, orjson
+from core.models import Recipe
+from core.seed import seed_users
+from recipe.prefetch import prefetch_for_serializer
+from recipe.serializers import RecipeSerializer
+
+
+class Command(BaseCommand):
+    """Django command to benchmark JSON rendering"""
+    help = 'Compare DRF and orjson rendering of large recipe lists.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=5000,
+                            help='Recipes in the rendered list')
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        """Entrypoint for command"""
+        if orjson is None:
+            self.stdout.write(self.style.WARNING(
+                'orjson is not installed, both sides use the stdlib'))
+
+        with transaction.atomic():
+            self.stdout.write('Seeding data...')
+            user, = seed_users(
+                recipes=options['recipes'],
+                email_prefix='benchmark-renderers',
+            )
+            recipes = prefetch_for_serializer(
+                Recipe.objects.filter(user=user).order_by('-id'),
+                RecipeSerializer,
+            )
+            payloads = [
+                # what the list endpoint renders
+                ('serialized list', RecipeSerializer(recipes, many=True).data),
+                # raw rows, prices are Decimal instances
+                ('values() rows', list(recipes.values(
+                    'id', 'title', 'time_minutes', 'price', 'link'))),
+            ]
+            transaction.set_rollback(True)
+
+        for name, data in payloads:
+            self.compare(name, data, options['repeat'])
+
+    def compare(self, name, data, repeat):
+        """Time rendering and parsing data both ways"""
+        slow = JSONRenderer().render(data)
+        fast = FastJSONRenderer().render(data)
+        # the fast renderer must be a drop in replacement
+        if slow != fast:
+            self.stdout.write(self.style.ERROR(f'{name}: output differs'))
+            return
+
+        timings = [
+            ('render', lambda: JSONRenderer().render(data),
+             lambda: FastJSONRenderer().render(data)),
+            ('parse', lambda: JSONParser().parse(io.BytesIO(slow)),
+             lambda: FastJSONParser().parse(io.BytesIO(slow))),
+        ]
+        for step, drf, faster in timings:
+            drf_stats = summarize(time_calls(drf, repeat))
+            fast_stats = summarize(time_calls(faster, repeat))
+            speedup = drf_stats['p50_ms'] / max(fast_stats['p50_ms'], 1e-6)
+            self.stdout.write(
+                f'{name} {step} ({len(fast)} bytes): '
+                f'drf p50 {drf_stats["p50_ms"]:.2f}ms, '
+                f'orjson p50 {fast_stats["p50_ms"]:.2f}ms, '
+                f'{speedup:.1f}x'
+            )
@@ -0,0 +1,77 @@
+"""
+Django command to benchmark rendering the recipe list.
+Times RecipeSerializer over prefetched instances against the
+values() rows fast path the list endpoint uses, on seeded data
+that is rolled back, and reports rows per second.
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.benchmark import summarize, time_calls
+from core.models import Recipe
+from core.renderers import dumps
+from core.seed import seed_users
+from recipe import rows
+from recipe.prefetch import prefetch_for_serializer
+from recipe.serializers import RecipeSerializer
+
+
+def serializer_page(queryset):
+    """Render a page through RecipeSerializer"""
+    return RecipeSerializer(
+        prefetch_for_serializer(queryset, RecipeSerializer), many=True).data
+
+
+def rows_page(queryset):
+    """Render a page through the values() fast path"""
+    return rows.to_representation(
+        RecipeSerializer, rows.values(queryset, RecipeSerializer))
+
+
+class Command(BaseCommand):
+    """Django command to benchmark recipe list serialization"""
+    help = 'Compare RecipeSerializer and values() list rendering.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=5000,
+                            help='Recipes for the benchmark user')
+        parser.add_argument('--page-size', type=int, action='append',
+                            help='Rows rendered per call, repeatable '
+                                 '(default 100 and 500)')
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        """Entrypoint for command"""
+        with transaction.atomic():
+            self.stdout.write('Seeding data...')
+            user, = seed_users(
+                recipes=options['recipes'],
+                email_prefix='benchmark-serializers',
+            )
+            recipes = Recipe.objects.filter(user=user).order_by('-id')
+            for page_size in options['page_size'] or [100, 500]:
+                self.compare(recipes[:page_size], options['repeat'])
+
+            transaction.set_rollback(True)
+
+    def compare(self, queryset, repeat):
+        """Time both paths on one page, including their queries"""
+        expected = dumps(serializer_page(queryset))
+        count = len(queryset)
+        # the fast path must stay a drop in replacement
+        if dumps(rows_page(queryset)) != expected:
+            self.stdout.write(self.style.ERROR(
+                f'{count} rows: output differs'))
+            return
+
+        results = []
+        for name, render in (('serializer', serializer_page),
+                             ('values()', rows_page)):
+            stats = summarize(time_calls(lambda: render(queryset), repeat))
+            rate = count / max(stats['p50_ms'] / 1000, 1e-9)
+            results.append(stats['p50_ms'])
+            self.stdout.write(
+                f'{count} rows {name}: p50 {stats["p50_ms"]:.2f}ms, '
+                f'p95 {stats["p95_ms"]:.2f}ms, {rate:,.0f} rows/s')
+        speedup = results[0] / max(results[1], 1e-6)
+        self.stdout.write(f'{count} rows: values() {speedup:.1f}x faster')
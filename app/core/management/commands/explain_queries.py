@@ -0,0 +1,153 @@
+"""
+Django command to audit the query plans of the API querysets.
+Seeds data inside a transaction that is rolled back, runs
+EXPLAIN (ANALYZE) on the queryset each list/detail endpoint runs
+and flags sequential scans and sorts/hashes that spill to disk.
+"""
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import RequestFactory
+from rest_framework.request import Request
+
+from core.seed import seed_users
+from recipe.views import RecipeViewSet, TagViewSet, IngredientViewSet
+
+
+def api_queryset(viewset_class, action, user, params=None):
+    """Return the queryset viewset_class runs for action, including
+    the ordering and limit pagination adds for list actions"""
+    request = Request(RequestFactory().get('/', params or {}))
+    request.user = user
+    view = viewset_class(
+        request=request, action=action, format_kwarg=None, kwargs={})
+    queryset = view.get_queryset()
+    paginator = view.paginator
+    if action != 'list' or paginator is None:
+        return queryset
+
+    ordering = paginator.get_ordering(request, queryset, view)
+    return queryset.order_by(*ordering)[:paginator.page_size + 1]
+
+
+def iter_plan_nodes(node):
+    """Yield a plan node and all of its children"""
+    yield node
+    for child in node.get('Plans', []):
+        yield from iter_plan_nodes(child)
+
+
+def plan_issues(plan):
+    """Return a description of each problem found in a plan"""
+    issues = []
+    for node in iter_plan_nodes(plan['Plan']):
+        node_type = node['Node Type']
+        if node_type == 'Seq Scan':
+            issues.append(f'sequential scan on {node["Relation Name"]}')
+        if node.get('Sort Space Type') == 'Disk':
+            issues.append(
+                f'sort spilled to disk ({node["Sort Space Used"]}kB)')
+        if node.get('Hash Batches', 1) > 1:
+            issues.append(
+                f'hash spilled to disk ({node["Hash Batches"]} batches)')
+        if node.get('Disk Usage', 0) > 0:
+            issues.append(
+                f'{node_type} spilled to disk ({node["Disk Usage"]}kB)')
+    return issues
+
+
+def explain(queryset):
+    """Run EXPLAIN (ANALYZE) on queryset and return the parsed plan"""
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]
+
+
+class Command(BaseCommand):
+    """Django command to audit the API query plans"""
+    help = 'EXPLAIN ANALYZE the API querysets against seeded data.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument('--recipes', type=int, default=2000,
+                            help='Recipes per user')
+        parser.add_argument('--tags', type=int, default=50,
+                            help='Tags per user')
+        parser.add_argument('--ingredients', type=int, default=200,
+                            help='Ingredients per user')
+        parser.add_argument('--strict', action='store_true',
+                            help='Exit with an error if issues are found')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command"""
+        with transaction.atomic():
+            self.stdout.write('Seeding data...')
+            users = seed_users(
+                users=options['users'],
+                recipes=options['recipes'],
+                tags=options['tags'],
+                ingredients=options['ingredients'],
+                email_prefix='explain',
+            )
+            # give the planner statistics for the seeded data
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+            total_issues = self.audit(users[0])
+            # nothing seeded here should ever be kept
+            transaction.set_rollback(True)
+
+        if total_issues and options['strict']:
+            raise CommandError(f'{total_issues} query plan issue(s) found')
+
+    def audit(self, user):
+        """Explain each API queryset for user, return the issue count"""
+        tag_ids = ','.join(
+            str(pk) for pk in user.tag_set.values_list('id', flat=True)[:2])
+        ingredient_ids = ','.join(
+            str(pk) for pk in
+            user.ingredient_set.values_list('id', flat=True)[:2])
+        recipe_id = user.recipe_set.values_list('id', flat=True).first()
+
+        checks = [
+            ('recipe list', RecipeViewSet, 'list', {}),
+            ('recipe list by tags', RecipeViewSet, 'list',
+             {'tags': tag_ids}),
+            ('recipe list by ingredients', RecipeViewSet, 'list',
+             {'ingredients': ingredient_ids}),
+            ('recipe list by tags and ingredients', RecipeViewSet, 'list',
+             {'tags': tag_ids, 'ingredients': ingredient_ids}),
+            ('recipe search', RecipeViewSet, 'list', {'search': 'curry'}),
+            ('tag list', TagViewSet, 'list', {}),
+            ('tag list assigned only', TagViewSet, 'list',
+             {'assigned_only': 1}),
+            ('ingredient list', IngredientViewSet, 'list', {}),
+            ('ingredient list assigned only', IngredientViewSet, 'list',
+             {'assigned_only': 1}),
+        ]
+
+        total_issues = 0
+        for name, viewset_class, action, params in checks:
+            queryset = api_queryset(viewset_class, action, user, params)
+            total_issues += self.report(name, explain(queryset))
+
+        detail = api_queryset(
+            RecipeViewSet, 'retrieve', user).filter(pk=recipe_id)
+        total_issues += self.report('recipe detail', explain(detail))
+        return total_issues
+
+    def report(self, name, plan):
+        """Print the result for one queryset, return its issue count"""
+        issues = plan_issues(plan)
+        line = f'{name}: {plan["Execution Time"]:.2f}ms'
+        if not issues:
+            self.stdout.write(self.style.SUCCESS(f'{line} ok'))
+        for issue in issues:
+            self.stdout.write(self.style.WARNING(f'{line} {issue}'))
+        return len(issues)
@@ -0,0 +1,160 @@
+"""
+Django command to load test a running deployment of the API.
+Opens --concurrency keep-alive connections and sends GETs over all
+of them at once for --duration seconds, then reports throughput and
+latency percentiles. Run it against the uwsgi and the ASGI setup
+(SERVER_MODE in scripts/run.sh) to compare them, eg.
+
+    python manage.py load_test http://proxy:8000/api/recipe/recipes/ \\
+        --token <key> --concurrency 200
+"""
+import asyncio
+import ssl
+import time
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.benchmark import summarize
+
+
+class HTTPError(Exception):
+    """A response that couldn't be read or wasn't a 2xx"""
+
+
+async def read_response(reader):
+    """Read one HTTP/1.1 response, return (status, keep alive)"""
+    head = await reader.readuntil(b'\r\n\r\n')
+    status_line, *header_lines = head.decode('latin1').split('\r\n')
+    status = int(status_line.split()[1])
+    headers = {}
+    for line in header_lines:
+        if ':' in line:
+            name, value = line.split(':', 1)
+            headers[name.strip().lower()] = value.strip()
+
+    if headers.get('transfer-encoding', '').lower() == 'chunked':
+        while True:
+            size = int((await reader.readuntil(b'\r\n')).split(b';')[0], 16)
+            # chunk data plus its trailing CRLF
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    elif 'content-length' in headers:
+        await reader.readexactly(int(headers['content-length']))
+    else:
+        # body runs until the server closes the connection
+        await reader.read()
+        return status, False
+    return status, headers.get('connection', '').lower() != 'close'
+
+
+class LoadTest:
+    """Runs the requests and collects the results"""
+
+    def __init__(self, url, headers, concurrency, duration, timeout):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.secure = parts.scheme == 'https'
+        self.port = parts.port or (443 if self.secure else 80)
+        path = parts.path or '/'
+        if parts.query:
+            path += f'?{parts.query}'
+        lines = [f'GET {path} HTTP/1.1', f'Host: {parts.netloc}']
+        lines += [f'{name}: {value}' for name, value in headers.items()]
+        self.request = ('\r\n'.join(lines) + '\r\n\r\n').encode('latin1')
+        self.concurrency = concurrency
+        self.duration = duration
+        self.timeout = timeout
+        self.latencies = []
+        self.errors = {}
+
+    def error(self, reason):
+        self.errors[reason] = self.errors.get(reason, 0) + 1
+
+    async def connect(self):
+        return await asyncio.wait_for(
+            asyncio.open_connection(
+                self.host, self.port,
+                ssl=ssl.create_default_context() if self.secure else None),
+            self.timeout)
+
+    async def client(self, deadline):
+        """Send requests over one connection until deadline"""
+        writer = None
+        while time.monotonic() < deadline:
+            try:
+                if writer is None:
+                    reader, writer = await self.connect()
+                start = time.perf_counter()
+                writer.write(self.request)
+                status, keep_alive = await asyncio.wait_for(
+                    read_response(reader), self.timeout)
+                elapsed = time.perf_counter() - start
+            except (OSError, asyncio.TimeoutError,
+                    asyncio.IncompleteReadError) as exc:
+                self.error(type(exc).__name__)
+                if writer is not None:
+                    writer.close()
+                writer = None
+                continue
+
+            if 200 <= status < 300:
+                self.latencies.append(elapsed)
+            else:
+                self.error(f'HTTP {status}')
+            if not keep_alive:
+                writer.close()
+                writer = None
+        if writer is not None:
+            writer.close()
+
+    async def run(self):
+        """Run all clients, returns the elapsed seconds"""
+        start = time.monotonic()
+        deadline = start + self.duration
+        await asyncio.gather(
+            *(self.client(deadline) for _ in range(self.concurrency)))
+        return time.monotonic() - start
+
+
+class Command(BaseCommand):
+    """Django command to load test the API over HTTP"""
+    help = 'Measure throughput and latency of concurrent GETs to a url.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('url')
+        parser.add_argument('--token', help='API token to authenticate as')
+        parser.add_argument('--concurrency', type=int, default=50,
+                            help='Connections open at once')
+        parser.add_argument('--duration', type=float, default=10,
+                            help='Seconds to send requests for')
+        parser.add_argument('--timeout', type=float, default=30,
+                            help='Seconds before a request counts as failed')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command"""
+        if urlsplit(options['url']).scheme not in ('http', 'https'):
+            raise CommandError('url must be http:// or https://')
+        headers = {'Accept': 'application/json'}
+        if options['token']:
+            headers['Authorization'] = f'Token {options["token"]}'
+        load_test = LoadTest(
+            options['url'], headers, options['concurrency'],
+            options['duration'], options['timeout'])
+
+        elapsed = asyncio.run(load_test.run())
+
+        latencies = load_test.latencies
+        stats = summarize(latencies)
+        self.stdout.write(
+            f'{len(latencies)} requests in {elapsed:.1f}s over '
+            f'{options["concurrency"]} connections: '
+            f'{len(latencies) / elapsed:.1f} req/s'
+        )
+        self.stdout.write(
+            f'latency p50 {stats["p50_ms"]:.1f}ms, '
+            f'p95 {stats["p95_ms"]:.1f}ms, p99 {stats["p99_ms"]:.1f}ms'
+        )
+        for reason, count in sorted(load_test.errors.items()):
+            self.stdout.write(self.style.WARNING(f'{count} x {reason}'))
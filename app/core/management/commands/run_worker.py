@@ -0,0 +1,97 @@
+"""
+Django command to run background jobs, see core.jobs.
+Polls the job table and runs up to --concurrency jobs at once in
+threads. SIGTERM/SIGINT stop claiming new jobs and wait for the
+running ones to finish.
+"""
+import signal
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core import jobs
+from core.models import Job
+
+
+class Command(BaseCommand):
+    """Django command to run background jobs"""
+    help = 'Run queued background jobs.'
+
+    def add_arguments(self, parser):
+        config = settings.JOBS
+        parser.add_argument('--concurrency', type=int,
+                            default=config['CONCURRENCY'],
+                            help='Jobs run at the same time')
+        parser.add_argument('--visibility-timeout', type=int,
+                            default=config['VISIBILITY_TIMEOUT'],
+                            help='Seconds before a job whose worker '
+                                 'stopped responding is retried')
+        parser.add_argument('--poll-interval', type=float,
+                            default=config['POLL_INTERVAL'],
+                            help='Seconds to wait when no jobs are due')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit once no jobs are due')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command"""
+        self.stopping = threading.Event()
+        previous = {
+            signum: signal.signal(signum, self.stop)
+            for signum in (signal.SIGTERM, signal.SIGINT)
+        }
+        try:
+            self.work(options)
+        finally:
+            for signum, handler in previous.items():
+                signal.signal(signum, handler)
+
+    def stop(self, signum, frame):
+        """Finish the running jobs, then exit"""
+        self.stdout.write('Stopping after running jobs finish...')
+        self.stopping.set()
+
+    def work(self, options):
+        """Claim and run jobs until stopped"""
+        concurrency = options['concurrency']
+        self.stdout.write(f'Worker started, concurrency {concurrency}')
+        running = set()
+        with ThreadPoolExecutor(
+                max_workers=concurrency,
+                thread_name_prefix='job') as pool:
+            while not self.stopping.is_set():
+                free = concurrency - len(running)
+                claimed = jobs.claim(
+                    free, options['visibility_timeout']) if free else []
+                running.update(
+                    pool.submit(
+                        self.run_job, job, options['visibility_timeout'])
+                    for job in claimed)
+                if not running and options['once']:
+                    break
+                if claimed and len(running) < concurrency:
+                    # more may be due, claim again straight away
+                    continue
+                # wait for a free slot or for new jobs to be due
+                if running:
+                    done, running = wait(
+                        running, timeout=options['poll_interval'],
+                        return_when=FIRST_COMPLETED)
+                else:
+                    self.stopping.wait(options['poll_interval'])
+        self.stdout.write(self.style.SUCCESS('Worker stopped'))
+
+    def run_job(self, job, visibility_timeout):
+        """Run one job in a pool thread"""
+        try:
+            job = jobs.run(job, visibility_timeout)
+        finally:
+            # each thread opens its own db connection, don't leak it
+            connections.close_all()
+        line = f'{job} attempt {job.attempts}/{job.max_attempts}'
+        if job.status == Job.SUCCEEDED:
+            self.stdout.write(self.style.SUCCESS(line))
+        else:
+            self.stdout.write(self.style.WARNING(line))
@@ -0,0 +1,150 @@
+"""
+Django command to get the app ready to serve, see scripts/run.sh.
+Does what wait_for_db, collectstatic and migrate do but faster:
+
+- waits for the database by opening a connection, retrying with
+  jittered exponential backoff up to --timeout seconds, rather than
+  running the system checks every second
+- collects static files while waiting for the database, skipped
+  when the hash of every static source file's path, size and
+  modification time matches the one stored by the last collection
+- skips migrate when no migrations are pending
+
+then prints how long each phase took.
+"""
+import hashlib
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.migrations.executor import MigrationExecutor
+from django.db.utils import OperationalError
+from psycopg2 import OperationalError as Psycopg2Error
+
+# in STATIC_ROOT, hash of the sources last collected there
+STATIC_HASH_FILE = '.collectstatic-hash'
+
+
+def backoff_delays(initial, maximum):
+    """Yield delays doubling from initial up to maximum, each
+    randomized between half and all of it so workers starting
+    together don't retry in step"""
+    delay = initial
+    while True:
+        yield random.uniform(delay / 2, delay)
+        delay = min(delay * 2, maximum)
+
+
+def static_hash():
+    """Hash of the static files collectstatic would copy"""
+    entries = []
+    for finder in finders.get_finders():
+        for path, storage in finder.list([]):
+            prefix = getattr(storage, 'prefix', None) or ''
+            stat = os.stat(storage.path(path))
+            entries.append(
+                f'{os.path.join(prefix, path)}:{stat.st_size}:'
+                f'{stat.st_mtime_ns}')
+    digest = hashlib.sha256(settings.STATICFILES_STORAGE.encode())
+    for entry in sorted(entries):
+        digest.update(entry.encode())
+        digest.update(b'\n')
+    return digest.hexdigest()
+
+
+class Command(BaseCommand):
+    """Django command to get the app ready to serve"""
+    help = ('Wait for the database, collect static files and migrate, '
+            'skipping work that is already done.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--timeout', type=float, default=60,
+                            help='Seconds to wait for the database')
+        parser.add_argument('--initial-delay', type=float, default=0.1,
+                            help='Seconds before the first retry')
+        parser.add_argument('--max-delay', type=float, default=2,
+                            help='Longest wait between retries')
+        parser.add_argument('--force', action='store_true',
+                            help='Collect static files and migrate even '
+                                 'if nothing changed')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command"""
+        started = time.perf_counter()
+        timings = []
+        # static files don't need the database, collect them meanwhile
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            static = executor.submit(self.collect_static, options['force'])
+            timings.append(self.timed('wait for database', self.wait_for_db,
+                                      options))
+            timings.append(static.result())
+        timings.append(self.timed('migrate', self.migrate, options['force']))
+
+        for name, seconds, outcome in timings:
+            self.stdout.write(f'{name}: {seconds:.2f}s ({outcome})')
+        self.stdout.write(self.style.SUCCESS(
+            f'Ready in {time.perf_counter() - started:.2f}s'))
+
+    def timed(self, name, phase, *args):
+        """Run phase, return (name, seconds, what it did)"""
+        started = time.perf_counter()
+        outcome = phase(*args)
+        return name, time.perf_counter() - started, outcome
+
+    def wait_for_db(self, options):
+        """Open a connection, retrying until --timeout"""
+        connection = connections['default']
+        deadline = time.monotonic() + options['timeout']
+        delays = backoff_delays(options['initial_delay'], options['max_delay'])
+        attempts = 0
+        while True:
+            attempts += 1
+            try:
+                connection.ensure_connection()
+                return f'{attempts} attempt(s)'
+            except (Psycopg2Error, OperationalError) as error:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise CommandError(
+                        f'Database unavailable after {attempts} attempts: '
+                        f'{error}')
+                delay = min(next(delays), remaining)
+                self.stdout.write(
+                    f'Database unavailable, retrying in {delay:.2f}s...')
+                time.sleep(delay)
+
+    def collect_static(self, force):
+        """Run collectstatic unless the sources are unchanged"""
+        return self.timed('collectstatic', self._collect_static, force)
+
+    def _collect_static(self, force):
+        current = static_hash()
+        hash_path = os.path.join(settings.STATIC_ROOT, STATIC_HASH_FILE)
+        try:
+            with open(hash_path) as stored:
+                unchanged = stored.read() == current
+        except OSError:
+            unchanged = False
+        if unchanged and not force:
+            return 'unchanged, skipped'
+
+        call_command('collectstatic', interactive=False, verbosity=0)
+        with open(hash_path, 'w') as stored:
+            stored.write(current)
+        return 'collected'
+
+    def migrate(self, force):
+        """Run migrate if any migrations are pending"""
+        executor = MigrationExecutor(connections['default'])
+        plan = executor.migration_plan(executor.loader.graph.leaf_nodes())
+        if not plan and not force:
+            return 'no pending migrations, skipped'
+
+        call_command('migrate', interactive=False, verbosity=0)
+        return f'{len(plan)} migration(s) applied'
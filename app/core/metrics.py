@@ -0,0 +1,313 @@
+"""
+In process metrics, served in the Prometheus text format at
+/api/metrics/ (see core.views.metrics).
+
+Each process counts into its own registry. With several worker
+processes (uwsgi runs 4) set settings.METRICS['MULTIPROCESS_DIR']:
+every process then writes its values to its own file there, at most
+every FLUSH_INTERVAL seconds and when it exits, and the endpoint
+adds up the files of all processes, including ones that have exited
+since, so counts don't drop when a worker is recycled. The directory
+should be emptied when the server starts, see scripts/run.sh.
+"""
+import atexit
+import bisect
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+
+from django.conf import settings
+
+# seconds, for request latency
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
+# bytes, for uploads
+SIZE_BUCKETS = (
+    10_000, 100_000, 500_000, 1_000_000, 5_000_000, 10_000_000)
+
+
+class Registry:
+    """The metrics of this process and their current values"""
+
+    def __init__(self):
+        self.metrics = {}
+        # (metric name, label values) -> value, a number for counters,
+        # [count per bucket..., count over the last bucket, sum]
+        # for histograms
+        self.values = {}
+        self._lock = threading.Lock()
+        self._reset_file()
+
+    def _reset_file(self):
+        # a process's own file, the pid alone could be reused
+        self.pid = os.getpid()
+        self.file_name = f'metrics_{self.pid}_{uuid.uuid4().hex}.json'
+        self.flushed_at = time.monotonic()
+
+    def after_fork(self):
+        """Start from zero in a forked worker, its parent's values
+        are already counted in the parent's file"""
+        self._lock = threading.Lock()
+        self.values = {}
+        self._reset_file()
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def add(self, key, amount):
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def observe(self, key, buckets, value):
+        index = bisect.bisect_left(buckets, value)
+        with self._lock:
+            counts = self.values.get(key)
+            if counts is None:
+                counts = self.values[key] = [0] * (len(buckets) + 2)
+            counts[index] += 1
+            counts[-1] += value
+
+    def snapshot(self):
+        """Return {name: {labels: value}} of this process"""
+        with self._lock:
+            values = list(self.values.items())
+        snapshot = {}
+        for (name, labels), value in values:
+            snapshot.setdefault(name, {})[labels] = (
+                list(value) if isinstance(value, list) else value)
+        return snapshot
+
+    def flush(self, force=False):
+        """Write this process's values to its file in the
+        multiprocess directory, if there is one and it's time to"""
+        directory = settings.METRICS['MULTIPROCESS_DIR']
+        if not directory:
+            return
+        now = time.monotonic()
+        interval = settings.METRICS['FLUSH_INTERVAL']
+        if not force and now - self.flushed_at < interval:
+            return
+        self.flushed_at = now
+        if os.getpid() != self.pid:
+            # forked without the at fork hook running (eg. by uwsgi)
+            self._reset_file()
+        data = {
+            name: [[list(labels), value] for labels, value in values.items()]
+            for name, values in self.snapshot().items()
+        }
+        path = os.path.join(directory, self.file_name)
+        # write then rename so readers never see half a file
+        with open(f'{path}.tmp', 'w') as output:
+            json.dump(data, output)
+        os.replace(f'{path}.tmp', path)
+
+    def collect(self):
+        """Return {name: {labels: value}} for every process"""
+        directory = settings.METRICS['MULTIPROCESS_DIR']
+        if not directory:
+            return self.snapshot()
+
+        self.flush(force=True)
+        merged = {}
+        for file_name in sorted(os.listdir(directory)):
+            if not file_name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(directory, file_name)) as source:
+                    data = json.load(source)
+            except (OSError, ValueError):
+                # removed while we were listing the directory
+                continue
+            for name, values in data.items():
+                totals = merged.setdefault(name, {})
+                for labels, value in values:
+                    _merge(totals, tuple(labels), value)
+        return merged
+
+
+def _merge(totals, labels, value):
+    """Add value to totals[labels], elementwise for histograms"""
+    current = totals.get(labels)
+    if current is None:
+        totals[labels] = value
+    elif isinstance(value, list):
+        totals[labels] = [a + b for a, b in zip(current, value)]
+    else:
+        totals[labels] = current + value
+
+
+registry = Registry()
+os.register_at_fork(after_in_child=registry.after_fork)
+atexit.register(lambda: registry.flush(force=True))
+
+
+class Metric:
+    """A named metric with a fixed set of labels"""
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        registry.register(self)
+
+    def key(self, labels):
+        return self.name, tuple(str(labels[label]) for label in self.labels)
+
+
+class Counter(Metric):
+    """A count that only goes up"""
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        registry.add(self.key(labels), amount)
+
+
+class Histogram(Metric):
+    """Counts of observed values by bucket, plus their sum"""
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(),
+                 buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        registry.observe(self.key(labels), self.buckets, value)
+
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds',
+    'Time to build the response, by route',
+    labels=('route', 'method'),
+)
+RESPONSES = Counter(
+    'http_responses_total',
+    'Responses sent, by route and status code',
+    labels=('route', 'method', 'status'),
+)
+REQUEST_QUERIES = Histogram(
+    'http_request_db_queries',
+    'Database queries run per request, by route',
+    labels=('route',), buckets=QUERY_BUCKETS,
+)
+CACHE_REQUESTS = Counter(
+    'cache_requests_total',
+    'Cache lookups by cache and result (hit or miss)',
+    labels=('cache', 'result'),
+)
+IMAGE_UPLOAD_BYTES = Histogram(
+    'image_upload_bytes',
+    'Size of uploaded recipe images',
+    buckets=SIZE_BUCKETS,
+)
+
+
+def record_cache(cache, hit):
+    """Count a cache lookup"""
+    CACHE_REQUESTS.inc(cache=cache, result='hit' if hit else 'miss')
+
+
+# queries run so far by the current request, a one item list
+_queries = contextvars.ContextVar('request_queries', default=None)
+
+
+def query_counter(execute, sql, params, many, context):
+    """Database execute wrapper counting the queries of requests"""
+    counter = _queries.get()
+    if counter is not None:
+        counter[0] += 1
+    return execute(sql, params, many, context)
+
+
+def start_request():
+    """Start counting the current request's queries, returns a
+    token to pass to end_request"""
+    return _queries.set([0])
+
+
+def end_request(token):
+    """Stop counting, return the number of queries run"""
+    queries = _queries.get()[0]
+    _queries.reset(token)
+    return queries
+
+
+def record_response(request, response, duration, queries):
+    """Record a finished request"""
+    match = request.resolver_match
+    # view names are a fixed set, unlike paths
+    route = match.view_name if match else 'unmatched'
+    REQUEST_LATENCY.observe(duration, route=route, method=request.method)
+    RESPONSES.inc(
+        route=route, method=request.method, status=response.status_code)
+    REQUEST_QUERIES.observe(queries, route=route)
+    registry.flush()
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace(
+        '"', r'\"').replace('\n', r'\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    labels = ','.join(f'{name}="{_escape(value)}"' for name, value in pairs)
+    return f'{{{labels}}}'
+
+
+def _format_bound(bound):
+    return '+Inf' if bound == float('inf') else repr(float(bound))
+
+
+def cache_hit_ratios(collected):
+    """Return {(cache,): ratio} from the collected cache lookups"""
+    counts = {}
+    for (cache, result), value in collected.get(
+            CACHE_REQUESTS.name, {}).items():
+        hits, total = counts.get(cache, (0, 0))
+        counts[cache] = (
+            hits + (value if result == 'hit' else 0), total + value)
+    return {
+        (cache,): hits / total
+        for cache, (hits, total) in counts.items() if total
+    }
+
+
+def render():
+    """Return every metric in the Prometheus text format"""
+    collected = registry.collect()
+    lines = []
+    for name, metric in registry.metrics.items():
+        lines.append(f'# HELP {name} {metric.documentation}')
+        lines.append(f'# TYPE {name} {metric.kind}')
+        for labels, value in sorted(collected.get(name, {}).items()):
+            label_text = _format_labels(metric.labels, labels)
+            if metric.kind == 'counter':
+                lines.append(f'{name}{label_text} {value}')
+                continue
+            # counted per bucket, prometheus buckets are cumulative
+            cumulative = 0
+            for bound, count in zip(
+                    metric.buckets + (float('inf'),), value[:-1]):
+                cumulative += count
+                bucket_labels = _format_labels(
+                    metric.labels, labels, [('le', _format_bound(bound))])
+                lines.append(f'{name}_bucket{bucket_labels} {cumulative}')
+            lines.append(f'{name}_sum{label_text} {value[-1]}')
+            lines.append(f'{name}_count{label_text} {cumulative}')
+
+    ratios = cache_hit_ratios(collected)
+    lines.append('# HELP cache_hit_ratio Share of cache lookups that hit')
+    lines.append('# TYPE cache_hit_ratio gauge')
+    for labels, ratio in sorted(ratios.items()):
+        lines.append(
+            f'cache_hit_ratio{_format_labels(("cache",), labels)} {ratio}')
+    return '\n'.join(lines) + '\n'
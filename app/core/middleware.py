@@ -0,0 +1,126 @@
+"""Middleware for the API. Each one runs sync or async to match
+the rest of the chain, so serving ASGI (see core.asgi) doesn't put
+a thread switch in front of every request."""
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from core import instrumentation, metrics
+from core.db import routers
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class Middleware:
+    """Middleware that is sync or async like the get_response it
+    wraps. Subclasses implement __call__ for sync chains and
+    __acall__ for async ones."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+
+class ReplicaRoutingMiddleware(Middleware):
+    """Let reads for safe requests use the read replicas,
+    see core.db.routers"""
+
+    def uses_replicas(self, request):
+        return request.method in SAFE_METHODS and routers.replica_aliases()
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not self.uses_replicas(request):
+            return self.get_response(request)
+
+        token = routers.start_request(request)
+        try:
+            return self.get_response(request)
+        finally:
+            # streamed responses (eg. the export) read afterwards,
+            # from the primary
+            routers.end_request(token)
+
+    async def __acall__(self, request):
+        if not self.uses_replicas(request):
+            return await self.get_response(request)
+
+        token = routers.start_request(request)
+        try:
+            return await self.get_response(request)
+        finally:
+            routers.end_request(token)
+
+
+class MetricsMiddleware(Middleware):
+    """Count every request into the metrics, see core.metrics"""
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        token = metrics.start_request()
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            queries = metrics.end_request(token)
+        metrics.record_response(
+            request, response, time.perf_counter() - started, queries)
+        return response
+
+    async def __acall__(self, request):
+        token = metrics.start_request()
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            queries = metrics.end_request(token)
+        metrics.record_response(
+            request, response, time.perf_counter() - started, queries)
+        return response
+
+
+class InstrumentationMiddleware(Middleware):
+    """Record the queries and timings of a sample of requests,
+    see core.instrumentation. Goes first so the timings cover the
+    other middleware too."""
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        rate = settings.INSTRUMENTATION['SAMPLE_RATE']
+        if not instrumentation.is_sampled(rate):
+            return self.get_response(request)
+
+        token, metrics = instrumentation.start()
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            instrumentation.finish(token)
+        # streamed responses (eg. the export) query while being
+        # sent, after this, so those queries aren't included
+        instrumentation.report(
+            request, response, metrics, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        rate = settings.INSTRUMENTATION['SAMPLE_RATE']
+        if not instrumentation.is_sampled(rate):
+            return await self.get_response(request)
+
+        token, metrics = instrumentation.start()
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            instrumentation.finish(token)
+        instrumentation.report(
+            request, response, metrics, time.perf_counter() - started)
+        return response
@@ -0,0 +1,41 @@
+# Generated by Django 4.0.7 on 2026-10-18 10:41
+
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def merge_duplicate_names(apps, schema_editor):
+    """Merge tags/ingredients a user has more than once under the
+    same name into the oldest one so the unique constraint applies"""
+    Recipe = apps.get_model('core', 'Recipe')
+    for model_name, relation in (('Tag', 'tags'), ('Ingredient', 'ingredients')):
+        model = apps.get_model('core', model_name)
+        through = getattr(Recipe, relation).through
+        column = f'{model_name.lower()}_id'
+        duplicates = (
+            model.objects.values('user_id', 'name')
+            .annotate(keep=Min('id'), total=Count('id'))
+            .filter(total__gt=1)
+        )
+        for duplicate in duplicates:
+            group = model.objects.filter(
+                user_id=duplicate['user_id'], name=duplicate['name'])
+            links = through.objects.filter(**{f'{column}__in': group.values('id')})
+            recipe_ids = set(links.values_list('recipe_id', flat=True))
+            links.delete()
+            through.objects.bulk_create([
+                through(recipe_id=recipe_id, **{column: duplicate['keep']})
+                for recipe_id in recipe_ids
+            ])
+            group.exclude(id=duplicate['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_per_user_ordering_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_names, migrations.RunPython.noop),
+    ]
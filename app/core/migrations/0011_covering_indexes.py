@@ -0,0 +1,42 @@
+# Generated by Django 4.0.7 on 2026-10-18 15:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_recipe_search_vector'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='tag',
+            name='unique_tag_name_per_user',
+        ),
+        migrations.AddConstraint(
+            model_name='tag',
+            constraint=models.UniqueConstraint(fields=('user', 'name'), include=('id',), name='unique_tag_name_per_user'),
+        ),
+        migrations.RemoveConstraint(
+            model_name='ingredient',
+            name='unique_ingredient_name_per_user',
+        ),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('user', 'name'), include=('id',), name='unique_ingredient_name_per_user'),
+        ),
+        # the auto created through tables only get the (recipe_id, tag_id)
+        # unique index, filtering recipes by tag/ingredient and listing
+        # assigned tags/ingredients look them up the other way round
+        migrations.RunSQL(
+            'CREATE INDEX core_recipe_tags_tag_recipe_idx '
+            'ON core_recipe_tags (tag_id, recipe_id);',
+            'DROP INDEX core_recipe_tags_tag_recipe_idx;',
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX core_recipe_ingredients_ingredient_recipe_idx '
+            'ON core_recipe_ingredients (ingredient_id, recipe_id);',
+            'DROP INDEX core_recipe_ingredients_ingredient_recipe_idx;',
+        ),
+    ]
@@ -2,16 +2,30 @@
 Database models.
 admin login info: admin@exmaple.com/password1
 """
+import contextvars
 import uuid
 import os
+from contextlib import contextmanager
+
 from django.conf import settings
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import (
+    SearchQuery, SearchRank, SearchVector, SearchVectorField,
+)
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import (
     AbstractBaseUser,
     BaseUserManager,
     PermissionsMixin
 )
 
+from core.db import routers
+
+# ids of users whose data changed inside batch_data_changes()
+_data_changes = contextvars.ContextVar('data_changes', default=None)
+
 
 def recipe_image_file_path(instance, filename):
     """Generate file apth for new recipe image"""
@@ -21,6 +35,46 @@ def recipe_image_file_path(instance, filename):
     return os.path.join('uploads', 'recipe', filename)
 
 
+def recipe_search_vector(tag_model, ingredient_model):
+    """Expression computing a recipe's search vector from its title,
+    description and tag/ingredient names, most important first"""
+    config = settings.RECIPE_SEARCH_CONFIG
+
+    def names(model):
+        # all of the recipe's tag/ingredient names as one string
+        return models.Subquery(
+            model.objects.filter(recipe=models.OuterRef('pk'))
+            .values('recipe')
+            .annotate(names=StringAgg('name', ' '))
+            .values('names')
+        )
+
+    return (
+        SearchVector('title', weight='A', config=config)
+        + SearchVector('description', weight='B', config=config)
+        + SearchVector(names(tag_model), weight='C', config=config)
+        + SearchVector(names(ingredient_model), weight='C', config=config)
+    )
+
+
+class RecipeQuerySet(models.QuerySet):
+    """Queryset for recipes"""
+
+    def update_search_vector(self):
+        """Recompute the stored search vector of these recipes.
+        Call after changing a recipe, its tags or its ingredients."""
+        return self.update(
+            search_vector=recipe_search_vector(Tag, Ingredient))
+
+    def search(self, text):
+        """Filter to recipes matching text, annotated with their rank"""
+        query = SearchQuery(
+            text, search_type='websearch',
+            config=settings.RECIPE_SEARCH_CONFIG)
+        return self.filter(search_vector=query).annotate(
+            search_rank=SearchRank(models.F('search_vector'), query))
+
+
 class UserManager(BaseUserManager):
     """Manager for users"""
 
@@ -42,6 +96,38 @@ class UserManager(BaseUserManager):
         user.save(using=self._db)
         return user
 
+    def mark_data_changed(self, user_id):
+        """Record that a user's recipe data changed"""
+        batch = _data_changes.get()
+        if batch is not None:
+            batch.add(user_id)
+            return
+        # update() so concurrent writes can't lose a bump and
+        # no save signals fire for the user
+        self.filter(pk=user_id).update(
+            data_version=models.F('data_version') + 1,
+            data_modified_at=timezone.now(),
+        )
+        # read the user's own writes from the primary for a while
+        routers.pin_user(user_id)
+
+    @contextmanager
+    def batch_data_changes(self):
+        """Bump each user's data version once when the block ends,
+        however many of their rows it writes"""
+        if _data_changes.get() is not None:
+            # already inside a batch, it bumps them
+            yield
+            return
+        batch = set()
+        token = _data_changes.set(batch)
+        try:
+            yield
+        finally:
+            _data_changes.reset(token)
+            for user_id in batch:
+                self.mark_data_changed(user_id)
+
     # overwrite create_superuser func from BaseUserManager
     def create_superuser(self, email, password):
         """Create and return a new superuser"""
@@ -64,6 +150,10 @@ class User(AbstractBaseUser, PermissionsMixin):
     name = models.CharField(max_length=255)
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
+    # bumped whenever the user's recipes, tags or ingredients change,
+    # lets the API answer conditional requests without querying them
+    data_version = models.PositiveBigIntegerField(default=0)
+    data_modified_at = models.DateTimeField(default=timezone.now)
 
     # assign user model to User manager
     objects = UserManager()
@@ -71,6 +161,10 @@ class User(AbstractBaseUser, PermissionsMixin):
     # field we want to use for authentication
     USERNAME_FIELD = 'email'
 
+    def mark_data_changed(self):
+        """Record that the user's recipe data changed"""
+        User.objects.mark_data_changed(self.pk)
+
 
 class Recipe(models.Model):
     """Recipe object"""
@@ -87,6 +181,22 @@ class Recipe(models.Model):
     ingredients = models.ManyToManyField('Ingredient')
     # pass in function that will generate url for image
     image = models.ImageField(null=True, upload_to=recipe_image_file_path)
+    # storage names of the resized copies of image, by variant and
+    # format eg. {'thumb': {'webp': ..., 'jpeg': ...}}, see recipe.images
+    image_variants = models.JSONField(default=dict, editable=False)
+    # title, description and tag/ingredient names for full text search,
+    # kept up to date with Recipe.objects.update_search_vector()
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = RecipeQuerySet.as_manager()
+
+    class Meta:
+        # matches the per-user, newest first listing so pagination
+        # can seek straight to a page
+        indexes = [
+            models.Index(fields=['user', '-id'], name='recipe_user_id_idx'),
+            GinIndex(fields=['search_vector'], name='recipe_search_idx'),
+        ]
 
     # Decides what will be displayed in django admin
     def __str__(self):
@@ -101,6 +211,16 @@ class Tag(models.Model):
         on_delete=models.CASCADE,
     )
 
+    class Meta:
+        # lets recipes safely create tags in bulk, the unique index
+        # also serves the per-user listing by name
+        constraints = [
+            # id is included so listing tags is an index only scan
+            models.UniqueConstraint(
+                fields=['user', 'name'], include=['id'],
+                name='unique_tag_name_per_user'),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -113,5 +233,60 @@ class Ingredient(models.Model):
         on_delete=models.CASCADE
     )
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'name'], include=['id'],
+                name='unique_ingredient_name_per_user'),
+        ]
+
     def __str__(self):
         return self.name
+
+
+class Job(models.Model):
+    """Unit of deferred work, run by `manage.py run_worker`"""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+    ]
+
+    # registered handler name, see core.jobs
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    # user the job was started for, only they can see its status
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        null=True,
+        blank=True,
+        on_delete=models.CASCADE,
+    )
+    status = models.CharField(
+        max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=1)
+    # when a worker may next pick the job up: the retry time while
+    # queued, the end of the visibility timeout while running
+    run_at = models.DateTimeField(default=timezone.now)
+    result = models.JSONField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # only the jobs a worker could claim, finished ones
+            # pile up without slowing the polling query down
+            models.Index(
+                fields=['run_at'], name='job_claimable_idx',
+                condition=models.Q(status__in=['queued', 'running'])),
+        ]
+
+    def __str__(self):
+        return f'{self.name} #{self.pk} ({self.status})'
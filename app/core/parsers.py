@@ -0,0 +1,33 @@
+"""
+JSON request parsing with orjson.
+Bodies orjson rejects are parsed again by DRF's JSONParser, so
+errors read the same as before. Integers too big for 64 bits are
+read as floats, none of the API's fields accept them either way.
+"""
+import io
+
+from django.conf import settings
+from rest_framework import parsers
+
+from core.renderers import FastJSONRenderer, orjson
+
+
+class FastJSONParser(parsers.JSONParser):
+    """JSONParser that decodes UTF-8 bodies with orjson"""
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        """Parse the request body as JSON"""
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or encoding.lower().replace('-', '') != 'utf8':
+            return super().parse(stream, media_type, parser_context)
+
+        body = stream.read()
+        try:
+            return orjson.loads(body)
+        except orjson.JSONDecodeError:
+            # invalid documents and NaN when STRICT_JSON is off,
+            # DRF accepts or reports them
+            return super().parse(
+                io.BytesIO(body), media_type, parser_context)
@@ -0,0 +1,182 @@
+"""
+Readiness checks of what a worker needs to serve requests, served
+at /api/ready/ for the load balancer. Unlike the liveness check at
+/api/health-check/, which only shows the process answers, these
+run a query on each database, check the connection pools aren't
+saturated, write a file to MEDIA_ROOT and round trip each cache.
+
+Checks run in parallel, each given settings.READINESS['TIMEOUT']
+seconds, and the result is kept for CACHE_TTL seconds so frequent
+probes from several load balancers don't become load themselves.
+
+The endpoint is public, so it only reports whether each check passed
+and how long it took. Why a check failed is logged, as errors can
+name internal hosts.
+"""
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+
+from core.db import pool
+
+logger = logging.getLogger(__name__)
+
+# a check stuck past its timeout keeps its thread, leave room for
+# a few of those before new checks have to queue
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='readiness')
+_lock = threading.Lock()
+# (monotonic time checked, result) of the last check
+_cached = None
+
+
+class CheckFailed(Exception):
+    """A check that ran but found a problem, with details to log"""
+
+    def __init__(self, message, details=None):
+        super().__init__(message)
+        self.details = details or {}
+
+
+def check_database(alias):
+    """Run a query on a fresh connection to alias"""
+    connection = connections[alias]
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+            cursor.fetchone()
+    finally:
+        # this thread's connection, nothing else closes it
+        connection.close()
+    return {}
+
+
+def check_pool(alias):
+    """Report how many of alias's pooled connections are in use,
+    failing when the share reaches MAX_POOL_SATURATION"""
+    connection_pools = pool.pools().get(alias, [])
+    in_use = sum(
+        connection_pool.in_use for connection_pool in connection_pools)
+    max_size = sum(
+        connection_pool.max_size for connection_pool in connection_pools)
+    if not max_size:
+        max_size = settings.DATABASES[alias]['POOL']['MAX_SIZE']
+    saturation = in_use / max_size
+    result = {'in_use': in_use, 'max_size': max_size,
+              'saturation': round(saturation, 3)}
+    if saturation >= settings.READINESS['MAX_POOL_SATURATION']:
+        raise CheckFailed('Connection pool saturated', result)
+    return result
+
+
+def check_media():
+    """Write and remove a file in MEDIA_ROOT"""
+    with tempfile.NamedTemporaryFile(
+            dir=settings.MEDIA_ROOT, prefix='.readiness-') as output:
+        output.write(b'ready')
+        output.flush()
+        os.fsync(output.fileno())
+    return {}
+
+
+def check_cache(alias):
+    """Set, read back and delete a key in the cache alias"""
+    cache = caches[alias]
+    key = f'readiness:{uuid.uuid4().hex}'
+    cache.set(key, 1, timeout=10)
+    try:
+        if cache.get(key) != 1:
+            raise CheckFailed('Value written was not read back')
+    finally:
+        cache.delete(key)
+    return {}
+
+
+def checks():
+    """Return {name: function()} of the checks to run"""
+    found = {}
+    for alias, config in settings.DATABASES.items():
+        found[f'database:{alias}'] = lambda alias=alias: check_database(
+            alias)
+        if (config.get('POOL') or {}).get('MAX_SIZE'):
+            found[f'pool:{alias}'] = lambda alias=alias: check_pool(alias)
+    found['media'] = check_media
+    for alias in settings.CACHES:
+        found[f'cache:{alias}'] = lambda alias=alias: check_cache(alias)
+    return found
+
+
+def _latency_ms(started):
+    return round((time.perf_counter() - started) * 1000, 3)
+
+
+def _timed(name, check):
+    """Run check, return whether it passed and the time it took"""
+    started = time.perf_counter()
+    try:
+        check()
+        ok = True
+    except CheckFailed as error:
+        logger.warning('Readiness check %s failed: %s %s',
+                       name, error, error.details)
+        ok = False
+    except Exception:
+        logger.warning('Readiness check %s failed', name, exc_info=True)
+        ok = False
+    return {'ok': ok, 'latency_ms': _latency_ms(started)}
+
+
+def run_checks():
+    """Run every check in parallel, return the readiness result"""
+    timeout = settings.READINESS['TIMEOUT']
+    # pools first, the database checks take connections themselves
+    found = checks()
+    results = {
+        name: _timed(name, check) for name, check in found.items()
+        if name.startswith('pool:')
+    }
+    started = time.perf_counter()
+    futures = {
+        name: _executor.submit(_timed, name, check)
+        for name, check in found.items() if name not in results
+    }
+    wait(futures.values(), timeout=timeout)
+    for name, future in futures.items():
+        if future.done():
+            results[name] = future.result()
+        else:
+            logger.warning('Readiness check %s timed out after %ss',
+                           name, timeout)
+            results[name] = {'ok': False, 'latency_ms': _latency_ms(started)}
+    return {
+        'ready': all(result['ok'] for result in results.values()),
+        'checks': dict(sorted(results.items())),
+    }
+
+
+def check_readiness():
+    """Return the readiness result, at most CACHE_TTL seconds old"""
+    global _cached
+    with _lock:
+        now = time.monotonic()
+        if (
+            _cached is None
+            or now - _cached[0] >= settings.READINESS['CACHE_TTL']
+        ):
+            _cached = (now, run_checks())
+        checked_at, result = _cached
+    return {**result, 'age_seconds': round(now - checked_at, 3)}
+
+
+def clear_cache():
+    """Forget the last result, so the next call checks again"""
+    global _cached
+    with _lock:
+        _cached = None
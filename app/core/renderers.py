@@ -0,0 +1,60 @@
+"""
+JSON rendering with orjson.
+Produces the same bytes as DRF's JSONRenderer for API data, falling
+back to it when orjson isn't installed or pretty printing is asked
+for, which orjson can only do with a fixed indent. The one
+difference is NaN/Infinity floats, written as null instead of
+raising, the API has no float fields for them to come from.
+"""
+from rest_framework import renderers
+from rest_framework.utils.encoders import JSONEncoder
+
+from core.instrumentation import timed
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+# values orjson doesn't write the way DRF does (Decimal, lazy
+# strings, querysets, ...) are converted by DRF's own encoder.
+# datetimes are passed through to it too, DRF trims them to
+# milliseconds and writes UTC as Z
+_encoder = JSONEncoder()
+if orjson is not None:
+    OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+
+def dumps(data):
+    """Serialize data to compact UTF-8 JSON bytes"""
+    if orjson is None:  # pragma: no cover
+        return renderers.JSONRenderer().render(data)
+    try:
+        content = orjson.dumps(
+            data, default=_encoder.default, option=OPTIONS)
+    except TypeError:
+        # integers over 64 bits, or data DRF can't encode either,
+        # in which case it raises its usual error
+        return renderers.JSONRenderer().render(data)
+    # keep the output a strict javascript subset, like DRF
+    return content.replace(
+        b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+
+
+class FastJSONRenderer(renderers.JSONRenderer):
+    """JSONRenderer that encodes with orjson when it can"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        """Render data into JSON, returning a bytestring"""
+        fast = (
+            orjson is not None
+            and self.compact
+            and not self.ensure_ascii
+            and self.get_indent(
+                accepted_media_type, renderer_context or {}) is None
+        )
+        with timed('render'):
+            if not fast or data is None:
+                return super().render(
+                    data, accepted_media_type, renderer_context)
+            return dumps(data)
@@ -0,0 +1,76 @@
+"""
+Seed realistic volumes of recipe data for query plan audits
+and benchmarks. Everything is written with bulk inserts.
+"""
+import random
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+
+from core.models import Recipe, Tag, Ingredient
+
+# words recipe titles and descriptions are made of
+WORDS = [
+    'chicken', 'curry', 'pasta', 'salad', 'spicy', 'garlic', 'lemon',
+    'roast', 'soup', 'stew', 'vegan', 'cheese', 'tomato', 'basil',
+    'grilled', 'fried', 'baked', 'sweet', 'sour', 'crispy', 'noodle',
+    'rice', 'bean', 'mushroom', 'onion', 'pepper', 'ginger', 'honey',
+]
+
+
+def _link(relation, recipes, related, per_recipe, rng):
+    """Link each recipe to per_recipe random related objects"""
+    field = Recipe._meta.get_field(relation)
+    through = field.remote_field.through
+    target = f'{field.m2m_reverse_field_name()}_id'
+    count = min(per_recipe, len(related))
+    through.objects.bulk_create(
+        [
+            through(recipe_id=recipe.id, **{target: obj.id})
+            for recipe in recipes
+            for obj in rng.sample(related, count)
+        ],
+        batch_size=5000,
+    )
+
+
+def seed_users(users=1, recipes=100, tags=20, ingredients=50,
+               tags_per_recipe=3, ingredients_per_recipe=6,
+               seed=0, email_prefix='seed'):
+    """Create users each with their own recipes, tags and ingredients.
+    Returns the created users."""
+    rng = random.Random(seed)
+    created = []
+    for number in range(users):
+        user = get_user_model().objects.create_user(
+            email=f'{email_prefix}{number}@example.com',
+            password='seedpass123',
+        )
+        user_tags = Tag.objects.bulk_create(
+            [Tag(user=user, name=f'Tag {i}') for i in range(tags)])
+        user_ingredients = Ingredient.objects.bulk_create([
+            Ingredient(user=user, name=f'Ingredient {i}')
+            for i in range(ingredients)
+        ])
+        user_recipes = Recipe.objects.bulk_create(
+            [
+                Recipe(
+                    user=user,
+                    title=f'Recipe {i} {rng.choice(WORDS)}',
+                    description=' '.join(rng.choices(WORDS, k=12)),
+                    time_minutes=rng.randint(5, 180),
+                    price=Decimal(rng.randint(100, 9999)) / 100,
+                    link=f'https://example.com/recipes/{i}',
+                )
+                for i in range(recipes)
+            ],
+            batch_size=5000,
+        )
+        _link('tags', user_recipes, user_tags, tags_per_recipe, rng)
+        _link(
+            'ingredients', user_recipes, user_ingredients,
+            ingredients_per_recipe, rng)
+        Recipe.objects.filter(user=user).update_search_vector()
+        created.append(user)
+
+    return created
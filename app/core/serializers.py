@@ -0,0 +1,17 @@
+"""Serializers for the core APIs"""
+from rest_framework import serializers
+
+from core.models import Job
+
+
+class JobSerializer(serializers.ModelSerializer):
+    """Serializer for the status of a background job"""
+    url = serializers.HyperlinkedIdentityField(view_name='job-detail')
+
+    class Meta:
+        model = Job
+        fields = [
+            'id', 'url', 'name', 'status', 'attempts', 'result',
+            'created_at', 'finished_at',
+        ]
+        read_only_fields = fields
@@ -0,0 +1,45 @@
+"""Signal handlers for the core app"""
+from django.contrib.auth import get_user_model
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from core import authentication, instrumentation, metrics
+from core.models import Recipe, Tag, Ingredient
+
+
+@receiver(post_delete, sender=Token)
+def forget_deleted_token(sender, instance, **kwargs):
+    """Stop authenticating with a token once it's deleted"""
+    authentication.invalidate_token(instance.key, instance.user_id)
+
+
+@receiver(post_save, sender=get_user_model())
+def forget_saved_user_tokens(sender, instance, **kwargs):
+    """Drop cached lookups for a user whenever they are saved,
+    eg. deactivated or their password changed"""
+    authentication.invalidate_user(instance.pk)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+def mark_user_data_changed(sender, instance, **kwargs):
+    """Bump the owner's data version whenever a recipe, tag or
+    ingredient is saved, through the API or otherwise. Bulk writes
+    don't send signals and bump it themselves. Deletes bump it where
+    they happen (API views, admin): a post_delete receiver would stop
+    deleting a user from cascading to their rows in one query, and
+    bump the user once for each of them."""
+    get_user_model().objects.mark_data_changed(instance.user_id)
+
+
+@receiver(connection_created)
+def install_query_timer(sender, connection, **kwargs):
+    """Count queries for the metrics and time the queries of
+    instrumented requests, on every connection"""
+    # the wrapper list outlives the connection, don't add them twice
+    for wrapper in (metrics.query_counter, instrumentation.query_timer):
+        if wrapper not in connection.execute_wrappers:
+            connection.execute_wrappers.append(wrapper)
@@ -0,0 +1,16 @@
+"""
+Test runner for the project, see settings.TEST_RUNNER.
+"""
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+
+class TestRunner(DiscoverRunner):
+    """Runs tests with request sampling off, so results don't
+    depend on the production INSTRUMENTATION['SAMPLE_RATE'].
+    Tests of the instrumentation opt in with override_settings."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        settings.INSTRUMENTATION = {
+            **settings.INSTRUMENTATION, 'SAMPLE_RATE': 0}
@@ -0,0 +1,56 @@
+"""
+Tests for serving the API async.
+"""
+import asyncio
+import threading
+
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from rest_framework.decorators import api_view
+from rest_framework.response import Response
+
+from core.asgi import AsyncRouter, async_view
+from recipe.views import TagViewSet
+
+
+class AsyncViewTests(SimpleTestCase):
+    """Test running sync views from async views"""
+
+    def test_async_view_runs_in_pool_thread(self):
+        """Test the view runs off the calling thread"""
+        threads = []
+
+        def view(request):
+            threads.append(threading.current_thread())
+            return HttpResponse('ok')
+
+        wrapped = async_view(view)
+        response = asyncio.run(wrapped(RequestFactory().get('/')))
+
+        self.assertTrue(asyncio.iscoroutinefunction(wrapped))
+        self.assertEqual(response.content, b'ok')
+        self.assertIsNot(threads[0], threading.current_thread())
+
+    def test_async_view_renders_response(self):
+        """Test DRF responses are rendered in the pool thread"""
+        @api_view(['GET'])
+        def view(request):
+            return Response({'ok': True})
+
+        response = asyncio.run(async_view(view)(RequestFactory().get('/')))
+
+        self.assertTrue(response.is_rendered)
+        self.assertIn(b'"ok"', response.content)
+
+    def test_router_wraps_views_when_enabled(self):
+        """Test AsyncRouter only makes views async with ASYNC_API"""
+        for enabled in (False, True):
+            with override_settings(ASYNC_API=enabled):
+                router = AsyncRouter()
+                router.register('tags', TagViewSet)
+                for url in router.urls:
+                    self.assertEqual(
+                        asyncio.iscoroutinefunction(url.callback), enabled)
+
+        # the viewset is still reachable for schema generation etc.
+        self.assertIs(router.urls[0].callback.cls, TagViewSet)
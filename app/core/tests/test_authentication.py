@@ -0,0 +1,163 @@
+"""Tests for the cached token authentication"""
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIClient
+
+from core.authentication import (
+    CachedTokenAuthentication, Entry, LRUCache, get_local_cache,
+    new_generation, shared_cache_key,
+)
+
+ME_URL = reverse('user:me')
+
+
+class LRUCacheTests(TestCase):
+    """Test the in-process LRU cache"""
+
+    def test_evicts_least_recently_used(self):
+        """Test the oldest unused entry is evicted when full"""
+        cache = LRUCache(max_size=2, ttl=60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 3)
+
+    def test_entries_expire(self):
+        """Test entries are not returned after their ttl"""
+        cache = LRUCache(max_size=2, ttl=-1)
+        cache.set('a', 1)
+
+        self.assertIsNone(cache.get('a'))
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    """Test token lookups are cached and invalidated"""
+
+    def setUp(self):
+        get_local_cache().clear()
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com', password='testpass123')
+        self.token = Token.objects.create(user=self.user)
+        self.auth = CachedTokenAuthentication()
+
+    def test_lookup_cached(self):
+        """Test a token is only looked up in the db once"""
+        self.auth.authenticate_credentials(self.token.key)
+
+        with self.assertNumQueries(0):
+            user, token = self.auth.authenticate_credentials(self.token.key)
+
+        self.assertEqual(user, self.user)
+        self.assertEqual(token.key, self.token.key)
+
+    def test_only_ids_cached(self):
+        """Test the cache holds the user's id, not the user row"""
+        self.auth.authenticate_credentials(self.token.key)
+
+        entry = get_local_cache().get(self.token.key)
+
+        self.assertEqual(entry, Entry(self.user.pk, True, None))
+
+    def test_deleted_token_rejected(self):
+        """Test a deleted token stops authenticating"""
+        self.auth.authenticate_credentials(self.token.key)
+
+        self.token.delete()
+
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.authenticate_credentials(self.token.key)
+
+    def test_deactivated_user_rejected(self):
+        """Test a deactivated user's token stops authenticating"""
+        self.auth.authenticate_credentials(self.token.key)
+
+        self.user.is_active = False
+        self.user.save()
+
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.authenticate_credentials(self.token.key)
+
+    def test_entry_expires_while_in_use(self):
+        """Test using a token doesn't keep its entry cached past the
+        ttl, so changes made in other workers are seen"""
+        ttl = get_local_cache().ttl
+        with patch('core.authentication.time.monotonic') as monotonic:
+            monotonic.return_value = 1000
+            self.auth.authenticate_credentials(self.token.key)
+            # no signals, like a change made by another worker
+            get_user_model().objects.filter(pk=self.user.pk).update(
+                is_active=False)
+
+            for elapsed in (ttl / 3, ttl * 2 / 3):
+                monotonic.return_value = 1000 + elapsed
+                self.auth.authenticate_credentials(self.token.key)
+
+            monotonic.return_value = 1000 + ttl + 1
+            with self.assertRaises(AuthenticationFailed):
+                self.auth.authenticate_credentials(self.token.key)
+
+    def test_password_change_invalidates(self):
+        """Test changing password through the api drops the cache"""
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        client.get(ME_URL)
+
+        res = client.patch(ME_URL, {'password': 'newpass123'})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        self.assertIsNone(get_local_cache().get(self.token.key))
+
+
+SHARED = {'MAX_SIZE': 1024, 'TTL': 30, 'CACHE_ALIAS': 'default'}
+
+
+@override_settings(TOKEN_AUTH_CACHE=SHARED)
+class SharedTokenCacheTests(TestCase):
+    """Test the shared tier and invalidation across workers"""
+
+    def setUp(self):
+        get_local_cache().clear()
+        caches['default'].clear()
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com', password='testpass123')
+        self.token = Token.objects.create(user=self.user)
+        self.auth = CachedTokenAuthentication()
+
+    def test_shared_entry_used(self):
+        """Test another worker's lookup skips the database"""
+        self.auth.authenticate_credentials(self.token.key)
+        # as if this process never looked it up
+        get_local_cache().clear()
+
+        with self.assertNumQueries(0):
+            user, token = self.auth.authenticate_credentials(self.token.key)
+
+        self.assertEqual(user.pk, self.user.pk)
+        self.assertEqual(token.user_id, self.user.pk)
+        entry = caches['default'].get(shared_cache_key(self.token.key))
+        self.assertNotIn('password', repr(entry))
+
+    def test_invalidated_in_other_worker(self):
+        """Test a user changed by another worker stops authenticating
+        here although this process still has the entry"""
+        self.auth.authenticate_credentials(self.token.key)
+        # deactivated without signals reaching this process's cache,
+        # the other worker starts a new generation
+        get_user_model().objects.filter(pk=self.user.pk).update(
+            is_active=False)
+        new_generation(self.user.pk)
+
+        self.assertIsNotNone(get_local_cache().get(self.token.key))
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.authenticate_credentials(self.token.key)
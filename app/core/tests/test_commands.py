@@ -2,12 +2,28 @@
 Test custom Django management commands.
 """
 
+import json
+import os
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
 from unittest.mock import patch
 from psycopg2 import OperationalError as Psycopg2Error
 
+from django.conf import settings
 from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connections
 from django.db.utils import OperationalError
-from django.test import SimpleTestCase
+from django.test import (
+    SimpleTestCase, TestCase, TransactionTestCase, override_settings,
+)
+
+from core.benchmark import regressions
+from core.management.commands.explain_queries import plan_issues
+from core import jobs
+from core.models import Job, Recipe, User
 
 
 @patch('core.management.commands.wait_for_db.Command.check')
@@ -37,3 +53,325 @@ class CommandTest(SimpleTestCase):
         self.assertEqual(patched_check.call_count, 6)
 
         patched_check.assert_called_with(databases=['default'])
+
+
+class StartupCommandTests(TestCase):
+    """Test the startup command skips work already done"""
+
+    def setUp(self):
+        static_root = tempfile.TemporaryDirectory()
+        self.addCleanup(static_root.cleanup)
+        patcher = override_settings(STATIC_ROOT=static_root.name)
+        patcher.enable()
+        self.addCleanup(patcher.disable)
+
+    def startup(self, **options):
+        out = StringIO()
+        call_command('startup', stdout=out, **options)
+        return out.getvalue()
+
+    @patch('core.management.commands.startup.call_command')
+    def test_startup_skips_unchanged(self, patched_call_command):
+        """Test unchanged static files and no pending migrations are
+        skipped on the second start"""
+        first = self.startup()
+        second = self.startup()
+
+        self.assertIn('collectstatic: ', first)
+        self.assertIn('(collected)', first)
+        self.assertIn('(unchanged, skipped)', second)
+        self.assertIn('(no pending migrations, skipped)', second)
+        patched_call_command.assert_called_once_with(
+            'collectstatic', interactive=False, verbosity=0)
+
+    @patch('core.management.commands.startup.call_command')
+    def test_startup_force(self, patched_call_command):
+        """Test --force collects and migrates regardless"""
+        self.startup()
+        self.startup(force=True)
+
+        self.assertEqual(patched_call_command.call_count, 3)
+        patched_call_command.assert_called_with(
+            'migrate', interactive=False, verbosity=0)
+
+    @patch('core.management.commands.startup.call_command')
+    @patch('time.sleep')
+    def test_startup_retries_database(self, patched_sleep, _):
+        """Test the database is retried with growing delays"""
+        errors = iter([Psycopg2Error, OperationalError, OperationalError])
+
+        def ensure_connection():
+            # fail three times, then use the open test connection
+            error = next(errors, None)
+            if error:
+                raise error
+
+        connection = connections['default']
+        with patch.object(connection, 'ensure_connection',
+                          side_effect=ensure_connection):
+            output = self.startup(initial_delay=1, max_delay=10)
+
+        self.assertIn('wait for database: ', output)
+        self.assertIn('(4 attempt(s))', output)
+        delays = [call.args[0] for call in patched_sleep.call_args_list]
+        self.assertEqual(len(delays), 3)
+        for delay, upper in zip(delays, (1, 2, 4)):
+            self.assertGreaterEqual(delay, upper / 2)
+            self.assertLessEqual(delay, upper)
+
+    @patch('core.management.commands.startup.call_command')
+    def test_startup_deadline(self, _):
+        """Test giving up on the database after --timeout"""
+        connection = connections['default']
+        with patch.object(connection, 'ensure_connection',
+                          side_effect=OperationalError):
+            with self.assertRaises(CommandError):
+                self.startup(timeout=0)
+
+
+class ExplainQueriesCommandTests(TestCase):
+    """Test the query plan audit command"""
+
+    def test_explain_queries_reports_each_queryset(self):
+        """Test every API queryset is explained and data rolled back"""
+        out = StringIO()
+
+        call_command(
+            'explain_queries', users=1, recipes=5, tags=3, ingredients=3,
+            stdout=out)
+
+        output = out.getvalue()
+        self.assertIn('recipe list by tags and ingredients:', output)
+        self.assertIn('tag list assigned only:', output)
+        self.assertIn('recipe detail:', output)
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_plan_issues(self):
+        """Test sequential scans and disk spills are flagged"""
+        plan = {'Plan': {
+            'Node Type': 'Sort',
+            'Sort Space Type': 'Disk',
+            'Sort Space Used': 2048,
+            'Plans': [
+                {'Node Type': 'Seq Scan', 'Relation Name': 'core_recipe'},
+                {'Node Type': 'Index Scan', 'Relation Name': 'core_tag'},
+            ],
+        }}
+
+        issues = plan_issues(plan)
+
+        self.assertEqual(issues, [
+            'sort spilled to disk (2048kB)',
+            'sequential scan on core_recipe',
+        ])
+
+
+class BenchmarkFiltersCommandTests(TestCase):
+    """Test the recipe filter benchmark command"""
+
+    def test_benchmark_filters(self):
+        """Test each scenario is timed on matching results"""
+        out = StringIO()
+
+        call_command(
+            'benchmark_filters', recipes=20, tags=5, ingredients=5,
+            repeat=1, stdout=out)
+
+        output = out.getvalue()
+        self.assertIn('all tags + ingredients', output)
+        self.assertNotIn('results differ', output)
+        self.assertFalse(Recipe.objects.exists())
+
+
+class BenchmarkRenderersCommandTests(TestCase):
+    """Test the JSON renderer benchmark command"""
+
+    def test_benchmark_renderers(self):
+        """Test both payloads render the same and are timed"""
+        out = StringIO()
+
+        call_command('benchmark_renderers', recipes=5, repeat=1, stdout=out)
+
+        output = out.getvalue()
+        self.assertIn('serialized list render', output)
+        self.assertIn('values() rows parse', output)
+        self.assertNotIn('output differs', output)
+        self.assertFalse(Recipe.objects.exists())
+
+
+class BenchmarkHashersCommandTests(SimpleTestCase):
+    """Test the password hasher benchmark command"""
+
+    def test_benchmark_hashers(self):
+        """Test hashing is timed and a cost suggested"""
+        out = StringIO()
+        hashing = {**settings.PASSWORD_HASHING, 'PBKDF2_ITERATIONS': 1000}
+
+        with override_settings(PASSWORD_HASHING=hashing):
+            call_command(
+                'benchmark_hashers', algorithm=['pbkdf2_sha256'], repeat=1,
+                budget_ms=100, stdout=out)
+
+        output = out.getvalue()
+        self.assertIn('PBKDF2_ITERATIONS=1000: p50 ', output)
+        self.assertIn('hashes/s per core', output)
+        self.assertIn('for 100ms', output)
+
+
+class BenchmarkSerializersCommandTests(TestCase):
+    """Test the recipe list serialization benchmark command"""
+
+    def test_benchmark_serializers(self):
+        """Test both paths render the same and report rows/sec"""
+        out = StringIO()
+
+        call_command(
+            'benchmark_serializers', recipes=5, page_size=[3],
+            repeat=1, stdout=out)
+
+        output = out.getvalue()
+        self.assertIn('3 rows values(): p50', output)
+        self.assertIn('rows/s', output)
+        self.assertNotIn('output differs', output)
+        self.assertFalse(Recipe.objects.exists())
+
+
+class BenchmarkApiCommandTests(TestCase):
+    """Test the API benchmark command"""
+
+    def benchmark(self, **options):
+        """Run a small benchmark, return the results written"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'results.json')
+            call_command(
+                'benchmark_api', users=1, recipes=5, tags=3,
+                ingredients=3, requests=2, warmup=0, output=path,
+                stdout=StringIO(), **options)
+            with open(path) as results:
+                return json.load(results)
+
+    def test_benchmark_api(self):
+        """Test every endpoint is measured and the data removed"""
+        results = self.benchmark()
+
+        endpoints = results['endpoints']
+        self.assertEqual(set(endpoints), {
+            'recipe list', 'recipe list filtered', 'recipe detail',
+            'recipe create', 'recipe upload image', 'token auth',
+        })
+        for stats in endpoints.values():
+            self.assertEqual(stats['errors'], 0)
+            self.assertGreater(stats['queries'], 0)
+            self.assertGreater(stats['throughput_rps'], 0)
+            self.assertLessEqual(stats['p50_ms'], stats['p99_ms'])
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_benchmark_api_baseline(self):
+        """Test results slower than the baseline fail the command"""
+        with tempfile.NamedTemporaryFile('w', suffix='.json') as baseline:
+            json.dump({'endpoints': {'recipe list': {
+                'p95_ms': 0.001, 'queries': 1, 'errors': 0,
+            }}}, baseline)
+            baseline.flush()
+
+            with self.assertRaisesMessage(CommandError, 'regression'):
+                self.benchmark(
+                    endpoint=['recipe list'], baseline=baseline.name)
+
+    def test_regressions(self):
+        """Test latency, query and error regressions are reported"""
+        baseline = {
+            'list': {'p95_ms': 10.0, 'queries': 3, 'errors': 0},
+            'detail': {'p95_ms': 5.0, 'queries': 2, 'errors': 0},
+            'missing': {'p95_ms': 5.0, 'queries': 2, 'errors': 0},
+        }
+        results = {
+            'list': {'p95_ms': 12.0, 'queries': 3, 'errors': 0},
+            'detail': {'p95_ms': 9.0, 'queries': 4, 'errors': 1},
+        }
+
+        found = regressions(results, baseline, tolerance=0.25)
+
+        self.assertEqual(len(found), 3)
+        self.assertTrue(all(line.startswith('detail') for line in found))
+
+
+@patch.dict(jobs.registry)
+class RunWorkerCommandTests(TransactionTestCase):
+    """Test the background job worker command"""
+
+    def test_run_worker_once(self):
+        """Test the worker runs every due job in its threads"""
+        jobs.register('test.double')(lambda job: job.payload['n'] * 2)
+        queued = [jobs.enqueue('test.double', {'n': n}) for n in range(3)]
+        out = StringIO()
+
+        call_command('run_worker', once=True, concurrency=2, stdout=out)
+
+        for job in queued:
+            job.refresh_from_db()
+            self.assertEqual(job.status, Job.SUCCEEDED)
+            self.assertEqual(job.result, job.payload['n'] * 2)
+        self.assertIn('Worker stopped', out.getvalue())
+
+
+class BenchmarkConnectionsCommandTests(TransactionTestCase):
+    """Test the connection benchmark command"""
+
+    def test_benchmark_connections(self):
+        """Test each configuration is timed and the data removed"""
+        out = StringIO()
+
+        call_command(
+            'benchmark_connections', requests=2, recipes=2, stdout=out)
+
+        output = out.getvalue()
+        self.assertIn('new connection per request', output)
+        self.assertIn('pooled', output)
+        self.assertFalse(User.objects.exists())
+
+
+class LoadTestCommandTests(SimpleTestCase):
+    """Test the HTTP load test command"""
+
+    def setUp(self):
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                ok = self.headers['Authorization'] == 'Token abc'
+                body = b'{}'
+                self.send_response(200 if ok else 401)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self.server.serve_forever).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.url = f'http://127.0.0.1:{self.server.server_port}/api/'
+
+    def test_load_test(self):
+        """Test requests are sent and throughput reported"""
+        out = StringIO()
+
+        call_command(
+            'load_test', self.url, token='abc', concurrency=2,
+            duration=0.2, stdout=out)
+
+        output = out.getvalue()
+        self.assertIn('req/s', output)
+        self.assertNotIn('HTTP 401', output)
+
+    def test_load_test_counts_errors(self):
+        """Test non 2xx responses are reported as errors"""
+        out = StringIO()
+
+        call_command(
+            'load_test', self.url, concurrency=1, duration=0.2, stdout=out)
+
+        self.assertIn('HTTP 401', out.getvalue())
@@ -0,0 +1,105 @@
+"""
+Tests for the database backend's health checks and pooling.
+"""
+from django.db import connection, connections
+from django.db.utils import OperationalError
+from django.test import TransactionTestCase
+from unittest.mock import patch
+
+from core.db import pool
+
+
+class DatabaseBackendTests(TransactionTestCase):
+    """Test connection health checks and pooling"""
+
+    def setUp(self):
+        # tests change the connection's config, put it back after
+        original = dict(connection.settings_dict)
+        self.addCleanup(connection.settings_dict.update, original)
+        self.addCleanup(pool.close_pools)
+        self.addCleanup(connection.close)
+        connection.close()
+
+    def start_request(self):
+        """Do what Django does at the start of a request"""
+        connection.close_if_unusable_or_obsolete()
+
+    def query(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+            return cursor.fetchone()
+
+    def test_health_check_replaces_dropped_connection(self):
+        """Test a connection the server dropped is replaced"""
+        connection.settings_dict.update(
+            CONN_MAX_AGE=60, CONN_HEALTH_CHECKS=True)
+        self.query()
+        # eg. postgres restarted or an idle timeout between requests
+        connection.connection.close()
+
+        self.start_request()
+
+        self.assertEqual(self.query(), (1,))
+
+    def test_health_check_once_per_request(self):
+        """Test the check runs on first use in a request only"""
+        connection.settings_dict.update(
+            CONN_MAX_AGE=60, CONN_HEALTH_CHECKS=True)
+        self.query()
+        self.start_request()
+
+        with patch.object(
+                connection, 'is_usable', wraps=connection.is_usable) as check:
+            self.query()
+            self.query()
+
+        check.assert_called_once()
+
+    def test_pool_reuses_connections(self):
+        """Test closing a pooled connection keeps it for reuse"""
+        connection.settings_dict.update(
+            CONN_MAX_AGE=0, POOL={'MAX_SIZE': 1, 'TIMEOUT': 1})
+        self.query()
+        raw = connection.connection
+
+        connection.close()
+        self.query()
+
+        self.assertIs(connection.connection, raw)
+        self.assertFalse(raw.closed)
+
+    def test_pool_exhausted(self):
+        """Test waiting too long for a pooled connection is an error"""
+        connection.settings_dict.update(
+            CONN_MAX_AGE=0, POOL={'MAX_SIZE': 1, 'TIMEOUT': 0.01})
+        self.query()
+        other = connections.create_connection('default')
+        other.settings_dict.update(connection.settings_dict)
+
+        with self.assertRaises(OperationalError):
+            other.ensure_connection()
+
+    def test_pool_counts_connections_in_use(self):
+        """Test the pool reports its checked out connections"""
+        connection.settings_dict.update(
+            CONN_MAX_AGE=0, POOL={'MAX_SIZE': 2, 'TIMEOUT': 1})
+        self.query()
+        [connection_pool] = pool.pools()['default']
+
+        self.assertEqual(connection_pool.in_use, 1)
+        connection.close()
+        self.assertEqual(connection_pool.in_use, 0)
+        self.assertEqual(connection_pool.max_size, 2)
+
+    def test_pool_replaces_dropped_idle_connection(self):
+        """Test an idle connection the server dropped isn't reused"""
+        connection.settings_dict.update(
+            CONN_MAX_AGE=0, POOL={'MAX_SIZE': 1, 'TIMEOUT': 1})
+        self.query()
+        raw = connection.connection
+        connection.close()
+        # eg. idle_session_timeout on the server
+        raw.close()
+
+        self.assertEqual(self.query(), (1,))
+        self.assertIsNot(connection.connection, raw)
@@ -0,0 +1,72 @@
+"""
+Tests for the tunable password hashers.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.hashers import cost_for_budget
+
+TOKEN_URL = reverse('user:token')
+
+FAST_HASHING = {
+    **settings.PASSWORD_HASHING,
+    'PBKDF2_ITERATIONS': 1000,
+    'SCRYPT_WORK_FACTOR': 2**4,
+}
+
+
+@override_settings(PASSWORD_HASHING=FAST_HASHING)
+class RehashOnLoginTests(TestCase):
+    """Test passwords move to the configured hashing as users log in"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com', password='test123')
+
+    def get_token(self):
+        res = self.client.post(TOKEN_URL, {
+            'email': 'user@example.com', 'password': 'test123'})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+
+    def test_new_passwords_use_configured_cost(self):
+        """Test passwords are hashed at the configured cost"""
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$1000$'))
+
+    def test_rehash_on_cost_change(self):
+        """Test logging in rehashes a password made at another cost"""
+        with override_settings(PASSWORD_HASHING={
+                **FAST_HASHING, 'PBKDF2_ITERATIONS': 2000}):
+            self.get_token()
+
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$2000$'))
+
+    def test_rehash_on_algorithm_change(self):
+        """Test logging in moves a password to the configured
+        algorithm, and the old hashes still check"""
+        with override_settings(PASSWORD_HASHERS=[
+            'core.hashers.ScryptPasswordHasher',
+            'core.hashers.PBKDF2PasswordHasher',
+        ]):
+            self.get_token()
+
+            self.assertTrue(self.user.password.startswith('scrypt$16$'))
+            self.assertTrue(self.user.check_password('test123'))
+
+
+class CostForBudgetTests(SimpleTestCase):
+    """Test costs suggested for a latency budget"""
+
+    def test_cost_for_budget(self):
+        """Test cost scales with the budget, in each algorithm's steps"""
+        self.assertEqual(
+            cost_for_budget('pbkdf2_sha256', 320000, 200, 50), 80000)
+        self.assertEqual(cost_for_budget('scrypt', 2**14, 60, 50), 2**13)
+        self.assertEqual(cost_for_budget('scrypt', 2**14, 60, 130), 2**15)
+        self.assertEqual(cost_for_budget('argon2', 2, 40, 100), 5)
+        self.assertEqual(cost_for_budget('argon2', 2, 40, 1), 1)
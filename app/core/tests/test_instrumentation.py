@@ -0,0 +1,156 @@
+"""
+Tests for the per request instrumentation.
+"""
+import asyncio
+import json
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.http import HttpResponse
+from django.test import (
+    RequestFactory, SimpleTestCase, TestCase, override_settings,
+)
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core import instrumentation
+from core.middleware import InstrumentationMiddleware
+from core.models import Recipe, Tag
+
+RECIPES_URL = reverse('recipe:recipe-list')
+TOKEN_URL = reverse('user:token')
+
+SAMPLE_ALL = {'SAMPLE_RATE': 1, 'SERVER_TIMING': True}
+
+
+class SampleRateTests(SimpleTestCase):
+    """Test tests don't sample requests unless they opt in"""
+
+    def test_not_sampled_in_tests(self):
+        """Test the test runner turns sampling off"""
+        self.assertEqual(settings.INSTRUMENTATION['SAMPLE_RATE'], 0)
+
+        with override_settings(INSTRUMENTATION=SAMPLE_ALL):
+            self.assertEqual(settings.INSTRUMENTATION['SAMPLE_RATE'], 1)
+
+
+class FingerprintTests(SimpleTestCase):
+    """Test queries are normalized to compare equal between runs"""
+
+    def test_fingerprint(self):
+        """Test parameters, literals and lists are replaced"""
+        sql = (
+            'SELECT "core_recipe"."id" FROM "core_recipe"\n'
+            '  WHERE ("core_recipe"."user_id" = %s AND "core_recipe"."id"'
+            " IN (%s, %s, %s) AND title = 'it''s' AND time_minutes > 10)"
+            ' LIMIT 21'
+        )
+
+        self.assertEqual(
+            instrumentation.fingerprint(sql),
+            'SELECT "core_recipe"."id" FROM "core_recipe" WHERE '
+            '("core_recipe"."user_id" = ? AND "core_recipe"."id" IN (...)'
+            ' AND title = ? AND time_minutes > ?) LIMIT ?',
+        )
+
+
+@override_settings(INSTRUMENTATION=SAMPLE_ALL)
+class InstrumentationMiddlewareTests(TestCase):
+    """Test sampled requests are instrumented"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com', password='test123')
+        token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        recipe = Recipe.objects.create(
+            user=self.user, title='Curry', time_minutes=10,
+            price=Decimal('5.00'))
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Thai'))
+
+    def get_logged(self, *args, method='get', **kwargs):
+        """Send a request, return the response and its log line"""
+        with self.assertLogs('core.instrumentation', 'INFO') as logs:
+            res = getattr(self.client, method)(*args, **kwargs)
+        self.assertEqual(len(logs.records), 1)
+        return res, json.loads(logs.records[0].getMessage())
+
+    def test_recipe_list_instrumented(self):
+        """Test the list reports its queries and timings"""
+        res, line = self.get_logged(RECIPES_URL)
+
+        timing = res['Server-Timing']
+        for phase in ('db', 'db-slowest', 'auth', 'serialize', 'render',
+                      'total'):
+            self.assertIn(f'{phase};dur=', timing)
+        self.assertEqual(line['view'], 'recipe:recipe-list')
+        self.assertEqual(line['status'], 200)
+        self.assertEqual(line['user'], self.user.pk)
+        self.assertGreater(line['queries'], 0)
+        self.assertIn(line['slowest_query_id'], timing)
+        self.assertNotIn('%s', line['slowest_query'])
+        for key in ('total_ms', 'db_ms', 'auth_ms', 'serialize_ms'):
+            self.assertIn(key, line)
+
+    def test_detail_serializer_timed(self):
+        """Test serializing an instance and its nested tags is timed"""
+        recipe = Recipe.objects.get()
+        url = reverse('recipe:recipe-detail', args=[recipe.id])
+
+        res, line = self.get_logged(url)
+
+        self.assertIn('serialize_ms', line)
+        self.assertEqual(res.data['tags'][0]['name'], 'Thai')
+
+    def test_token_password_check_timed(self):
+        """Test checking the password counts as authentication"""
+        self.client.credentials()
+
+        res, line = self.get_logged(TOKEN_URL, {
+            'email': 'user@example.com', 'password': 'test123',
+        }, method='post')
+
+        self.assertEqual(line['view'], 'user:token')
+        self.assertIn('auth_ms', line)
+
+    @override_settings(INSTRUMENTATION={**SAMPLE_ALL, 'SERVER_TIMING': False})
+    def test_server_timing_off(self):
+        """Test the header can be left out"""
+        res, line = self.get_logged(RECIPES_URL)
+
+        self.assertNotIn('Server-Timing', res)
+        self.assertGreater(line['queries'], 0)
+
+    @override_settings(INSTRUMENTATION={**SAMPLE_ALL, 'SAMPLE_RATE': 0})
+    def test_not_sampled(self):
+        """Test requests outside the sample aren't instrumented"""
+        with patch('core.instrumentation.logger') as logger:
+            res = self.client.get(RECIPES_URL)
+
+        self.assertNotIn('Server-Timing', res)
+        logger.info.assert_not_called()
+
+
+@override_settings(INSTRUMENTATION=SAMPLE_ALL)
+class AsyncInstrumentationMiddlewareTests(SimpleTestCase):
+    """Test requests served async are instrumented"""
+
+    def test_async_request_instrumented(self):
+        """Test the middleware stays async and times the request"""
+        async def get_response(request):
+            with instrumentation.timed('serialize'):
+                await asyncio.sleep(0)
+            return HttpResponse()
+
+        middleware = InstrumentationMiddleware(get_response)
+        with self.assertLogs('core.instrumentation', 'INFO') as logs:
+            res = asyncio.run(middleware(RequestFactory().get('/')))
+
+        self.assertTrue(asyncio.iscoroutinefunction(middleware))
+        self.assertIn('serialize;dur=', res['Server-Timing'])
+        line = json.loads(logs.records[0].getMessage())
+        self.assertIn('serialize_ms', line)
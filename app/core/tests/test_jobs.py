@@ -0,0 +1,215 @@
+"""
+Tests for the background job queue.
+"""
+import time
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import jobs
+from core.models import Job
+
+JOBS = {
+    'CONCURRENCY': 2,
+    'VISIBILITY_TIMEOUT': 60,
+    'POLL_INTERVAL': 0.01,
+    'MAX_ATTEMPTS': 2,
+    'RETRY_DELAY': 10,
+}
+
+
+def job_url(job_id):
+    return reverse('job-detail', args=[job_id])
+
+
+@override_settings(JOBS=JOBS)
+class JobQueueTests(TestCase):
+    """Test enqueueing, claiming and running jobs"""
+
+    def setUp(self):
+        # handlers registered here are dropped after each test
+        registry = patch.dict(jobs.registry)
+        registry.start()
+        self.addCleanup(registry.stop)
+        self.calls = []
+
+        @jobs.register('test.add')
+        def add(job):
+            self.calls.append(job.pk)
+            return job.payload['a'] + job.payload['b']
+
+        @jobs.register('test.fail')
+        def fail(job):
+            raise RuntimeError('boom')
+
+    def test_enqueue_unknown_job(self):
+        """Test enqueueing an unregistered job is an error"""
+        with self.assertRaises(ValueError):
+            jobs.enqueue('test.missing')
+
+    def test_run_job(self):
+        """Test a claimed job runs and stores its result"""
+        job = jobs.enqueue('test.add', {'a': 1, 'b': 2})
+
+        claimed = jobs.claim(limit=5)
+        self.assertEqual([claimed_job.pk for claimed_job in claimed],
+                         [job.pk])
+        jobs.run(claimed[0])
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.SUCCEEDED)
+        self.assertEqual(job.result, 3)
+        self.assertEqual(job.attempts, 1)
+        self.assertIsNotNone(job.finished_at)
+
+    def test_claimed_job_not_claimed_again(self):
+        """Test a running job isn't handed out twice"""
+        jobs.enqueue('test.add', {'a': 1, 'b': 2})
+
+        jobs.claim()
+
+        self.assertEqual(jobs.claim(), [])
+
+    def test_delayed_job_not_claimed_early(self):
+        """Test jobs aren't claimed before their run time"""
+        jobs.enqueue('test.add', {'a': 1, 'b': 2}, delay=60)
+
+        self.assertEqual(jobs.claim(), [])
+
+    def test_expired_claim_is_retried(self):
+        """Test a job whose worker timed out is claimed again"""
+        jobs.enqueue('test.add', {'a': 1, 'b': 2})
+        stale, = jobs.claim(visibility_timeout=0)
+
+        retry, = jobs.claim()
+        jobs.run(retry)
+        # the first worker finishing late doesn't overwrite the result
+        stale.payload = {'a': 0, 'b': 0}
+        jobs.run(stale)
+
+        retry.refresh_from_db()
+        self.assertEqual(retry.attempts, 2)
+        self.assertEqual(retry.result, 3)
+
+    def test_expired_last_attempt_fails(self):
+        """Test a timed out job with no attempts left isn't run again"""
+        @jobs.register('test.once', max_attempts=1)
+        def once(job):
+            self.calls.append(job.pk)
+
+        job = jobs.enqueue('test.once')
+        stale, = jobs.claim(visibility_timeout=0)
+
+        self.assertEqual(jobs.claim(), [])
+        jobs.run(stale)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(job.attempts, 1)
+        self.assertIn('visibility timeout', job.last_error)
+        self.assertIsNone(job.result)
+
+    def test_failed_job_retried_with_backoff(self):
+        """Test a failing job is requeued until max attempts"""
+        job = jobs.enqueue('test.fail')
+
+        jobs.run(jobs.claim()[0])
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.QUEUED)
+        self.assertIn('boom', job.last_error)
+        self.assertGreater(job.run_at, timezone.now() + timedelta(seconds=5))
+
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        jobs.run(jobs.claim()[0])
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(job.attempts, 2)
+
+    def test_retry_delay_doubles(self):
+        """Test each retry waits twice as long as the last"""
+        self.assertEqual(
+            [jobs.retry_delay(attempt) for attempt in (1, 2, 3)],
+            [10, 20, 40])
+
+    def test_run_pending(self):
+        """Test run_pending runs every due job in order"""
+        first = jobs.enqueue('test.add', {'a': 1, 'b': 1})
+        second = jobs.enqueue('test.add', {'a': 2, 'b': 2})
+
+        done = jobs.run_pending()
+
+        self.assertEqual(len(done), 2)
+        self.assertEqual(self.calls, [first.pk, second.pk])
+
+
+@override_settings(JOBS=JOBS)
+class JobHeartbeatTests(TransactionTestCase):
+    """Test running jobs keep their claim, the heartbeat writes
+    from its own connection so needs committed jobs"""
+
+    def setUp(self):
+        registry = patch.dict(jobs.registry)
+        registry.start()
+        self.addCleanup(registry.stop)
+
+    def test_slow_job_not_claimed_again(self):
+        """Test a job running past the visibility timeout stays
+        with its worker"""
+        reclaimed = []
+
+        @jobs.register('test.slow')
+        def slow(job):
+            time.sleep(0.9)
+            reclaimed.extend(jobs.claim())
+
+        job = jobs.enqueue('test.slow')
+        jobs.run(jobs.claim(visibility_timeout=0.3)[0], 0.3)
+
+        job.refresh_from_db()
+        self.assertEqual(reclaimed, [])
+        self.assertEqual(job.status, Job.SUCCEEDED)
+        self.assertEqual(job.attempts, 1)
+
+
+class JobApiTests(TestCase):
+    """Test the job status api"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'test123')
+        self.client.force_authenticate(self.user)
+
+    def test_auth_required(self):
+        """Test auth is required to see a job"""
+        job = Job.objects.create(name='test.add', user=self.user)
+
+        res = APIClient().get(job_url(job.id))
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_retrieve_job(self):
+        """Test a user can see the status of their job"""
+        job = Job.objects.create(name='test.add', user=self.user)
+
+        res = self.client.get(job_url(job.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['status'], Job.QUEUED)
+        self.assertNotIn('payload', res.data)
+
+    def test_other_users_job_not_found(self):
+        """Test users can't see each other's jobs"""
+        other = get_user_model().objects.create_user(
+            'other@example.com', 'test123')
+        job = Job.objects.create(name='test.add', user=other)
+
+        res = self.client.get(job_url(job.id))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
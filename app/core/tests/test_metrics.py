@@ -0,0 +1,192 @@
+"""
+Tests for the metrics registry and endpoint.
+"""
+import asyncio
+import json
+import os
+import tempfile
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.http import HttpResponse
+from django.test import (
+    RequestFactory, SimpleTestCase, TestCase, override_settings,
+)
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core import metrics
+from core.middleware import MetricsMiddleware
+from core.models import Recipe
+
+METRICS_URL = reverse('metrics')
+HEALTH_URL = reverse('health-check')
+RECIPES_URL = reverse('recipe:recipe-list')
+
+METRICS = {'MULTIPROCESS_DIR': None, 'FLUSH_INTERVAL': 1, 'TOKEN': 'secret'}
+
+
+def value(name, *labels):
+    """Current value of a metric across processes, 0 if unset"""
+    return metrics.registry.collect().get(name, {}).get(labels, 0)
+
+
+@override_settings(METRICS=METRICS)
+class MetricsEndpointTests(TestCase):
+    """Test requests are counted and served at the endpoint"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer secret')
+
+    def test_responses_counted(self):
+        """Test responses are counted by route and status"""
+        labels = ('health-check', 'GET', '200')
+        before = value('http_responses_total', *labels)
+
+        self.client.get(HEALTH_URL)
+        res = self.client.get(METRICS_URL)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res['Content-Type'].startswith('text/plain'))
+        self.assertIn(
+            'http_responses_total{route="health-check",method="GET",'
+            'status="200"}', res.content.decode())
+        self.assertEqual(value('http_responses_total', *labels), before + 1)
+
+    def test_latency_and_queries_by_route(self):
+        """Test the list's latency and queries go to its route"""
+        user = get_user_model().objects.create_user(
+            email='user@example.com', password='test123')
+        Recipe.objects.create(
+            user=user, title='Curry', time_minutes=5, price=Decimal('1'))
+        self.client.force_authenticate(user)
+        latency = value(
+            'http_request_duration_seconds', 'recipe:recipe-list', 'GET')
+        queries = value('http_request_db_queries', 'recipe:recipe-list')
+
+        self.client.get(RECIPES_URL)
+
+        after = value(
+            'http_request_duration_seconds', 'recipe:recipe-list', 'GET')
+        # [count per bucket..., count over the last bucket, sum]
+        self.assertEqual(sum(after[:-1]), sum((latency or [0])[:-1]) + 1)
+        after = value('http_request_db_queries', 'recipe:recipe-list')
+        self.assertGreater(after[-1], (queries or [0])[-1])
+
+    def test_cache_hit_ratio(self):
+        """Test cache lookups are exposed with their hit ratio"""
+        metrics.record_cache('test', True)
+
+        res = self.client.get(METRICS_URL)
+
+        content = res.content.decode()
+        self.assertIn('cache_requests_total{cache="test",result="hit"}',
+                      content)
+        self.assertIn('cache_hit_ratio{cache="test"}', content)
+
+    def test_token_required(self):
+        """Test scrapes need the token once one is configured"""
+        self.client.credentials()
+        res = self.client.get(METRICS_URL)
+        self.assertEqual(res.status_code, 401)
+
+        res = self.client.get(
+            METRICS_URL, HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(res.status_code, 200)
+
+    def test_non_ascii_token_rejected(self):
+        """Test a token with non-ASCII characters is a 401, not an
+        error"""
+        self.client.credentials()
+        res = self.client.get(
+            METRICS_URL, HTTP_AUTHORIZATION='Bearer s\u00e9cret')
+        self.assertEqual(res.status_code, 401)
+
+    def test_no_token_only_served_in_debug(self):
+        """Test the endpoint isn't public when no token is set"""
+        self.client.credentials()
+        with override_settings(METRICS={**METRICS, 'TOKEN': None}):
+            res = self.client.get(METRICS_URL)
+            self.assertEqual(res.status_code, 404)
+
+            with override_settings(DEBUG=True):
+                res = self.client.get(METRICS_URL)
+            self.assertEqual(res.status_code, 200)
+
+
+class AsyncMetricsMiddlewareTests(SimpleTestCase):
+    """Test requests served async are counted"""
+
+    def test_async_request_counted(self):
+        """Test the middleware stays async and records the response"""
+        async def get_response(request):
+            return HttpResponse(status=204)
+
+        labels = ('unmatched', 'GET', '204')
+        before = value('http_responses_total', *labels)
+        middleware = MetricsMiddleware(get_response)
+
+        asyncio.run(middleware(RequestFactory().get('/')))
+
+        self.assertTrue(asyncio.iscoroutinefunction(middleware))
+        self.assertEqual(value('http_responses_total', *labels), before + 1)
+
+
+class MultiprocessMetricsTests(SimpleTestCase):
+    """Test values of all worker processes are added up"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        patcher = override_settings(METRICS={
+            'MULTIPROCESS_DIR': self.directory,
+            'FLUSH_INTERVAL': 60,
+            'TOKEN': None,
+        })
+        patcher.enable()
+        self.addCleanup(patcher.disable)
+
+    def write_process(self, name, data):
+        """Write the file another worker process would have"""
+        with open(os.path.join(self.directory, name), 'w') as output:
+            json.dump(data, output)
+
+    def test_collect_adds_up_processes(self):
+        """Test counters and histograms are summed across files"""
+        before = metrics.registry.snapshot()
+        local = before.get('image_upload_bytes', {}).get(())
+        local_count = sum(local[:-1]) if local else 0
+        buckets = len(metrics.SIZE_BUCKETS) + 2
+        other = [0] * buckets
+        other[0], other[-1] = 2, 500
+        self.write_process('metrics_1_a.json', {
+            'image_upload_bytes': [[[], other]],
+            'cache_requests_total': [[['other', 'hit'], 3]],
+        })
+        self.write_process('metrics_2_b.json', {
+            'cache_requests_total': [[['other', 'hit'], 4]],
+        })
+
+        metrics.IMAGE_UPLOAD_BYTES.observe(20_000)
+        collected = metrics.registry.collect()
+
+        uploads = collected['image_upload_bytes'][()]
+        self.assertEqual(sum(uploads[:-1]), local_count + 3)
+        self.assertEqual(
+            collected['cache_requests_total'][('other', 'hit')], 7)
+        # this process wrote its own file to add up
+        files = os.listdir(self.directory)
+        self.assertIn(metrics.registry.file_name, files)
+        self.assertIn('image_upload_bytes_count',
+                      metrics.render())
+
+    def test_flush_waits_for_interval(self):
+        """Test values are written at most every FLUSH_INTERVAL"""
+        metrics.registry.flush(force=True)
+        os.remove(os.path.join(self.directory, metrics.registry.file_name))
+
+        metrics.registry.flush()
+
+        self.assertEqual(os.listdir(self.directory), [])
@@ -0,0 +1,90 @@
+"""
+Tests for the readiness check API.
+"""
+import threading
+from unittest.mock import patch
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import readiness
+
+READY_URL = reverse('readiness')
+
+READINESS = {'TIMEOUT': 2, 'CACHE_TTL': 60, 'MAX_POOL_SATURATION': 1}
+
+
+@override_settings(READINESS=READINESS)
+class ReadinessTests(TestCase):
+    """Test the readiness of the worker's dependencies"""
+
+    def setUp(self):
+        self.client = APIClient()
+        readiness.clear_cache()
+        self.addCleanup(readiness.clear_cache)
+
+    def test_ready(self):
+        """Test every dependency is checked and timed"""
+        res = self.client.get(READY_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.data['ready'])
+        for name in ('database:default', 'media', 'cache:default'):
+            self.assertTrue(res.data['checks'][name]['ok'])
+            self.assertIn('latency_ms', res.data['checks'][name])
+
+    def test_failed_check(self):
+        """Test a failing dependency makes the worker not ready"""
+        with patch('core.readiness.check_cache',
+                   side_effect=ConnectionError('refused db.internal')), \
+                self.assertLogs('core.readiness', 'WARNING') as logs:
+            res = self.client.get(READY_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertFalse(res.data['ready'])
+        self.assertEqual(set(res.data['checks']['cache:default']),
+                         {'ok', 'latency_ms'})
+        self.assertFalse(res.data['checks']['cache:default']['ok'])
+        self.assertNotIn(b'db.internal', res.content)
+        self.assertIn('db.internal', logs.output[0])
+        self.assertTrue(res.data['checks']['database:default']['ok'])
+
+    @override_settings(READINESS={**READINESS, 'TIMEOUT': 0.05})
+    def test_check_timeout(self):
+        """Test a check that hangs fails after the timeout"""
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        with patch('core.readiness.check_media', release.wait), \
+                self.assertLogs('core.readiness', 'WARNING') as logs:
+            res = self.client.get(READY_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertFalse(res.data['checks']['media']['ok'])
+        self.assertGreaterEqual(
+            res.data['checks']['media']['latency_ms'], 50)
+        self.assertIn('media timed out after 0.05s', logs.output[0])
+
+    def test_result_cached(self):
+        """Test probes within CACHE_TTL reuse the last result"""
+        with patch('core.readiness.run_checks',
+                   wraps=readiness.run_checks) as run_checks:
+            self.client.get(READY_URL)
+            res = self.client.get(READY_URL)
+
+        run_checks.assert_called_once()
+        self.assertTrue(res.data['ready'])
+
+    def test_pool_saturated(self):
+        """Test a fully used connection pool is reported"""
+        connection_pool = type(
+            'Pool', (), {'in_use': 4, 'max_size': 4})()
+
+        with patch('core.db.pool.pools',
+                   return_value={'default': [connection_pool]}):
+            with self.assertRaises(readiness.CheckFailed) as failed:
+                readiness.check_pool('default')
+
+        self.assertEqual(failed.exception.details['saturation'], 1)
@@ -0,0 +1,86 @@
+"""
+Tests for the orjson backed renderer and parser.
+"""
+import io
+import uuid
+from datetime import date, datetime, timezone
+from decimal import Decimal
+
+from django.test import SimpleTestCase
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from core.parsers import FastJSONParser
+from core.renderers import FastJSONRenderer
+
+
+class FastJSONRendererTests(SimpleTestCase):
+    """Test the renderer is a drop in replacement for DRF's"""
+
+    def assertSameOutput(self, data, accepted_media_type=None):
+        self.assertEqual(
+            FastJSONRenderer().render(data, accepted_media_type),
+            JSONRenderer().render(data, accepted_media_type),
+        )
+
+    def test_render_api_types(self):
+        """Test Decimal, dates, UUIDs and lazy strings render like DRF"""
+        self.assertSameOutput([{
+            'id': 1,
+            'price': Decimal('5.25'),
+            'day': date(2022, 1, 2),
+            'created': datetime(2022, 1, 2, 3, 4, 5, 123456,
+                                tzinfo=timezone.utc),
+            'image': uuid.uuid4(),
+            'title': gettext_lazy('Curry'),
+            'link': None,
+            'ready': True,
+        }])
+
+    def test_render_unicode_and_line_separators(self):
+        """Test non ascii text is kept and U+2028/9 are escaped"""
+        self.assertSameOutput({'title': 'Crème brûlée  '})
+
+    def test_render_non_string_keys_and_big_ints(self):
+        """Test data orjson can't write natively still matches"""
+        self.assertSameOutput({1: 2 ** 70})
+
+    def test_render_indent(self):
+        """Test pretty printed responses match DRF's"""
+        self.assertSameOutput(
+            {'tags': [{'id': 1}]}, 'application/json; indent=4')
+
+    def test_render_none(self):
+        """Test no data renders an empty body"""
+        self.assertEqual(FastJSONRenderer().render(None), b'')
+
+
+class FastJSONParserTests(SimpleTestCase):
+    """Test the parser is a drop in replacement for DRF's"""
+
+    def parse(self, parser_class, body):
+        return parser_class().parse(io.BytesIO(body), parser_context={})
+
+    def test_parse(self):
+        """Test a body parses to the same data"""
+        body = '{"title": "Crème", "price": "5.25", "tags": [1, 2.5]}'
+
+        self.assertEqual(
+            self.parse(FastJSONParser, body.encode()),
+            self.parse(JSONParser, body.encode()),
+        )
+
+    def test_parse_error(self):
+        """Test invalid bodies report DRF's parse error"""
+        for body in (b'{bad', b'{"price": NaN}'):
+            with self.assertRaises(ParseError) as expected:
+                self.parse(JSONParser, body)
+            with self.assertRaises(ParseError) as raised:
+                self.parse(FastJSONParser, body)
+
+            self.assertEqual(
+                str(raised.exception.detail),
+                str(expected.exception.detail),
+            )
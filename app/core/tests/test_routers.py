@@ -0,0 +1,148 @@
+"""
+Tests for routing reads to read replicas.
+"""
+import asyncio
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import (
+    RequestFactory, SimpleTestCase, TestCase, override_settings,
+)
+from rest_framework.authtoken.models import Token
+
+from core.checks import check_replica_pin_cache
+from core.db import routers
+from core.middleware import ReplicaRoutingMiddleware
+from core.models import Job, Recipe
+
+REPLICAS = {
+    'ALIASES': ['replica0'],
+    'PIN_SECONDS': 5,
+    'CACHE_ALIAS': 'default',
+}
+
+
+@override_settings(REPLICAS=REPLICAS)
+class ReplicaRouterTests(SimpleTestCase):
+    """Test which database reads and writes go to"""
+
+    def setUp(self):
+        cache.clear()
+        self.router = routers.ReplicaRouter()
+        self.user = get_user_model()(pk=1, email='user@example.com')
+
+    def read_db(self, model, user=None, method='get'):
+        """Return the database a read of model goes to while
+        ReplicaRoutingMiddleware handles a request"""
+        request = getattr(RequestFactory(), method)('/')
+        request.user = user or self.user
+        used = []
+
+        def get_response(request):
+            used.append(self.router.db_for_read(model))
+            return HttpResponse()
+
+        ReplicaRoutingMiddleware(get_response)(request)
+        return used[0]
+
+    def test_safe_request_reads_from_replica(self):
+        """Test GET requests read recipes from a replica"""
+        self.assertEqual(self.read_db(Recipe), 'replica0')
+
+    def test_unsafe_request_reads_from_primary(self):
+        """Test reads while handling a write use the primary"""
+        self.assertEqual(self.read_db(Recipe, method='post'), 'default')
+
+    def test_reads_outside_requests_use_primary(self):
+        """Test commands and job workers read from the primary"""
+        self.assertEqual(self.router.db_for_read(Recipe), 'default')
+
+    def test_auth_models_read_from_primary(self):
+        """Test models read during authentication use the primary"""
+        for model in (get_user_model(), Token, Job):
+            self.assertEqual(self.read_db(model), 'default')
+
+    def test_anonymous_reads_from_primary(self):
+        """Test reads before the user is known use the primary"""
+        self.assertEqual(self.read_db(Recipe, AnonymousUser()), 'default')
+
+    def test_pinned_user_reads_from_primary(self):
+        """Test a user who just wrote reads their writes"""
+        routers.pin_user(self.user.pk)
+
+        self.assertEqual(self.read_db(Recipe), 'default')
+
+        other = get_user_model()(pk=2, email='other@example.com')
+        self.assertEqual(self.read_db(Recipe, other), 'replica0')
+
+    def test_writes_go_to_primary(self):
+        """Test writes always use the primary"""
+        self.assertEqual(self.router.db_for_write(Recipe), 'default')
+
+    def test_no_replicas(self):
+        """Test everything uses the primary without replicas"""
+        with override_settings(REPLICAS={**REPLICAS, 'ALIASES': []}):
+            self.assertEqual(self.read_db(Recipe), 'default')
+
+    def test_async_request_reads_from_replica(self):
+        """Test the middleware stays async in an async chain and
+        routes reads the same way"""
+        used = []
+
+        async def get_response(request):
+            used.append(self.router.db_for_read(Recipe))
+            return HttpResponse()
+
+        middleware = ReplicaRoutingMiddleware(get_response)
+        for method in ('get', 'post'):
+            request = getattr(RequestFactory(), method)('/')
+            request.user = self.user
+            asyncio.run(middleware(request))
+
+        self.assertTrue(asyncio.iscoroutinefunction(middleware))
+        self.assertEqual(used, ['replica0', 'default'])
+        self.assertEqual(self.router.db_for_read(Recipe), 'default')
+
+
+@override_settings(REPLICAS=REPLICAS)
+class ReplicaPinTests(TestCase):
+    """Test writes pin users to the primary"""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_write_pins_user(self):
+        """Test changing a user's recipe data pins them"""
+        user = get_user_model().objects.create_user(
+            'user@example.com', 'test123')
+        self.assertFalse(routers.is_pinned(user.pk))
+
+        user.recipe_set.create(title='Soup', time_minutes=5, price='1.00')
+
+        self.assertTrue(routers.is_pinned(user.pk))
+
+
+class ReplicaPinCacheCheckTests(SimpleTestCase):
+    """Test pins must be stored where every worker sees them"""
+
+    @override_settings(REPLICAS=REPLICAS, CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_process_local_cache_refused(self):
+        """Test a per process cache is an error with replicas on"""
+        errors = check_replica_pin_cache(None)
+
+        self.assertEqual([error.id for error in errors], ['core.E001'])
+
+    @override_settings(REPLICAS=REPLICAS, CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': 'redis://cache:6379'}})
+    def test_shared_cache_allowed(self):
+        """Test a cache shared between processes passes"""
+        self.assertEqual(check_replica_pin_cache(None), [])
+
+    @override_settings(REPLICAS={**REPLICAS, 'ALIASES': []})
+    def test_no_replicas(self):
+        """Test nothing is required without replicas"""
+        self.assertEqual(check_replica_pin_cache(None), [])
@@ -1,10 +1,71 @@
 """Core views for app"""
+import hmac
 
+from django.conf import settings
+from django.http import HttpResponse
+from django.views.decorators.http import require_GET
+from rest_framework import generics, status
 from rest_framework.decorators import api_view
+from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
+from core.authentication import CachedTokenAuthentication
+from core.metrics import render as render_metrics
+from core.models import Job
+from core.readiness import check_readiness
+from core.serializers import JobSerializer
+
 
 @api_view(['GET'])
 def health_check(request):
-    """Returns successful response"""
+    """Liveness check, returns successful response without touching
+    the database or anything else the worker depends on"""
     return Response({'healthy': True})
+
+
+@api_view(['GET'])
+def readiness(request):
+    """Whether this worker's database, media volume and caches work,
+    see core.readiness. 503 if any check failed"""
+    result = check_readiness()
+    return Response(result, status=(
+        status.HTTP_200_OK if result['ready']
+        else status.HTTP_503_SERVICE_UNAVAILABLE))
+
+
+@require_GET
+def metrics(request):
+    """Metrics of every worker process in the Prometheus text format,
+    only served without a token while DEBUG is on"""
+    token = settings.METRICS['TOKEN']
+    if not token and not settings.DEBUG:
+        return HttpResponse(status=404)
+    # bytes, compare_digest raises TypeError for non-ASCII str
+    if token and not hmac.compare_digest(
+            request.headers.get('Authorization', '').encode(),
+            f'Bearer {token}'.encode()):
+        return HttpResponse(status=401)
+    return HttpResponse(
+        render_metrics(),
+        content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def job_accepted(job, request):
+    """202 response for work handed off to a background job,
+    pointing the client at the job's status"""
+    data = JobSerializer(job, context={'request': request}).data
+    return Response(
+        data, status=status.HTTP_202_ACCEPTED,
+        headers={'Location': data['url']})
+
+
+class JobDetailView(generics.RetrieveAPIView):
+    """Status of a background job started by the user"""
+    serializer_class = JobSerializer
+    queryset = Job.objects.all()
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        """Only show the user their own jobs"""
+        return self.queryset.filter(user=self.request.user)
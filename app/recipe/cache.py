@@ -0,0 +1,74 @@
+"""
+Per user response cache for the recipe list endpoints.
+Keys include the user's data version (see User.mark_data_changed),
+so any write to a user's recipes, tags or ingredients makes their
+old entries unreachable and they simply expire.
+"""
+import hashlib
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+
+from core import metrics
+
+
+class CacheStats:
+    """Hit/miss counters for this process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, hit):
+        metrics.record_cache('response', hit)
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def snapshot(self):
+        """Return the current counts and hit ratio"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / total if total else 0.0,
+            }
+
+    def reset(self):
+        with self._lock:
+            self.hits = self.misses = 0
+
+
+stats = CacheStats()
+
+
+def get_cache():
+    """Return the configured cache, or None if caching is off"""
+    config = settings.RESPONSE_CACHE
+    if not config['ENABLED']:
+        return None
+    return caches[config['CACHE_ALIAS']]
+
+
+def normalize_params(query_params, list_params=()):
+    """Return query params as a stable string, ignoring param order
+    and the order of ids in comma separated list_params"""
+    items = []
+    for key, values in sorted(query_params.lists()):
+        if key in list_params:
+            values = [
+                ','.join(sorted(value.split(','))) for value in values
+            ]
+        items.append((key, sorted(values)))
+    return repr(items)
+
+
+def make_key(user_id, version, name, params):
+    """Cache key for one user/data version/endpoint/params combo"""
+    digest = hashlib.md5(params.encode()).hexdigest()
+    return f'response:{user_id}:{version}:{name}:{digest}'
@@ -0,0 +1,104 @@
+"""
+Filtering for the recipe APIs.
+Tag/ingredient filters compile to EXISTS subqueries against the M2M
+through tables rather than joins, so rows are never multiplied and
+don't need a DISTINCT to deduplicate them afterwards.
+"""
+from django.db.models import Count, Exists, OuterRef, Q, Value
+from django.utils.translation import gettext as _
+from rest_framework.exceptions import ValidationError
+
+from core.models import Recipe, Tag, Ingredient
+
+MATCH_ANY = 'any'
+MATCH_ALL = 'all'
+MATCH_MODES = (MATCH_ANY, MATCH_ALL)
+# facet name -> (model, reverse relation from the model to recipes)
+FACETS = {
+    'tags': (Tag, 'recipe'),
+    'ingredients': (Ingredient, 'recipe'),
+}
+
+
+def parse_ids(value, name):
+    """Convert a comma separated list of ids to integers"""
+    try:
+        return [int(str_id) for str_id in value.split(',')]
+    except ValueError:
+        msg = _('Expected a comma separated list of ids.')
+        raise ValidationError({name: [msg]})
+
+
+def parse_match(value):
+    """Validate the match mode, defaulting to any"""
+    if value is None:
+        return MATCH_ANY
+    if value not in MATCH_MODES:
+        msg = _('Must be one of: %s.') % ', '.join(MATCH_MODES)
+        raise ValidationError({'match': [msg]})
+    return value
+
+
+def _through(relation):
+    """Return the through model and related id column of a
+    recipe M2M relation ('tags' or 'ingredients')"""
+    field = Recipe._meta.get_field(relation)
+    target = f'{field.m2m_reverse_field_name()}_id'
+    return field.remote_field.through, target
+
+
+def linked_to(relation, ids, match=MATCH_ANY):
+    """Condition matching recipes linked to any/all of ids"""
+    through, target = _through(relation)
+    if match == MATCH_ANY:
+        return Exists(through.objects.filter(
+            recipe_id=OuterRef('pk'), **{f'{target}__in': ids}))
+
+    # one probe of the (recipe_id, related_id) unique index per id
+    condition = None
+    for related_id in set(ids):
+        exists = Exists(through.objects.filter(
+            recipe_id=OuterRef('pk'), **{target: related_id}))
+        condition = exists if condition is None else condition & exists
+    return condition
+
+
+def assigned(relation):
+    """Condition matching tags/ingredients used by any recipe"""
+    through, target = _through(relation)
+    return Exists(through.objects.filter(**{target: OuterRef('pk')}))
+
+
+def filter_recipes(queryset, tags=None, ingredients=None, match=MATCH_ANY):
+    """Filter recipes by tag and ingredient ids. With match='any' a
+    recipe needs one of the tags and one of the ingredients, with
+    match='all' it needs every tag and every ingredient."""
+    if tags:
+        queryset = queryset.filter(linked_to('tags', tags, match))
+    if ingredients:
+        queryset = queryset.filter(
+            linked_to('ingredients', ingredients, match))
+    return queryset
+
+
+def facet_counts(user, recipes):
+    """Return {'tags': [...], 'ingredients': [...]} listing every
+    tag/ingredient of user with how many of recipes use it.
+    Both facets are counted in a single grouped query."""
+    recipe_ids = recipes.order_by().prefetch_related(None).values('pk')
+    counted = [
+        model.objects.filter(user=user).annotate(
+            facet=Value(name),
+            # joins the through table only, recipes are matched by id
+            recipe_count=Count(
+                relation, filter=Q(**{f'{relation}__in': recipe_ids})),
+        ).values('facet', 'id', 'name', 'recipe_count')
+        for name, (model, relation) in FACETS.items()
+    ]
+    rows = counted[0].union(*counted[1:], all=True).order_by(
+        'facet', '-recipe_count', 'name')
+
+    result = {name: [] for name in FACETS}
+    for row in rows:
+        result[row.pop('facet')].append(row)
+    return result
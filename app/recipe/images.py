@@ -0,0 +1,117 @@
+"""
+Processing of uploaded recipe images.
+The original upload is saved as is in the request. Afterwards a
+background job rotates it upright, strips its metadata and writes
+resized WebP and JPEG copies, so lists can show small thumbnails
+instead of the full size original.
+"""
+import io
+import os
+
+from PIL import Image, ImageOps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+
+from core import jobs
+from core.models import Recipe
+
+# extension -> (Pillow format, save options), every variant is
+# written in each format so clients can pick what they support
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+}
+
+
+def normalize(image):
+    """Return image rotated per its EXIF orientation, as RGB and
+    without the EXIF data (camera details, GPS position etc.)"""
+    image = ImageOps.exif_transpose(image)
+    if image.mode != 'RGB':
+        # flatten transparency onto white, JPEG has no alpha
+        background = Image.new('RGB', image.size, 'white')
+        rgba = image.convert('RGBA')
+        background.paste(rgba, mask=rgba.getchannel('A'))
+        image = background
+    else:
+        image = image.copy()
+    # drop exif, xmp, icc etc. so nothing is written back out
+    image.info = {}
+    return image
+
+
+def encode(image, extension):
+    """Return image encoded in the format for extension"""
+    pil_format, options = FORMATS[extension]
+    buffer = io.BytesIO()
+    image.save(buffer, format=pil_format, **options)
+    return buffer.getvalue()
+
+
+def variant_name(name, variant, extension):
+    """Storage name of a variant of the image stored as name"""
+    base = os.path.splitext(name)[0]
+    return f'{base}_{variant}.{extension}'
+
+
+def generate_variants(storage, name):
+    """Write the resized copies of the image stored as name and
+    return {variant: {extension: storage name}}"""
+    with storage.open(name, 'rb') as image_file:
+        with Image.open(image_file) as image:
+            image.load()
+            image = normalize(image)
+
+    variants = {}
+    for variant, size in settings.RECIPE_IMAGE_VARIANTS.items():
+        resized = image.copy()
+        # keeps the aspect ratio and never scales up
+        resized.thumbnail((size, size), Image.Resampling.LANCZOS)
+        variants[variant] = {
+            extension: storage.save(
+                variant_name(name, variant, extension),
+                ContentFile(encode(resized, extension)),
+            )
+            for extension in FORMATS
+        }
+    return variants
+
+
+def delete_variants(storage, variants):
+    """Delete the files of previously generated variants"""
+    for files in variants.values():
+        for file_name in files.values():
+            storage.delete(file_name)
+
+
+def process_image(recipe_id, name):
+    """Generate the variants of a recipe's image and record them,
+    returns the variants or None if the image has been replaced"""
+    recipe = Recipe.objects.filter(pk=recipe_id, image=name).first()
+    if recipe is None:
+        # recipe deleted or a newer image uploaded since scheduling
+        return None
+    storage = recipe.image.storage
+    variants = generate_variants(storage, name)
+
+    updated = Recipe.objects.filter(
+        pk=recipe_id, image=name).update(image_variants=variants)
+    if not updated:
+        # lost a race with a newer upload, don't leave files behind
+        delete_variants(storage, variants)
+        return None
+    # the recipe changed without a save(), so invalidate its
+    # cached responses and ETags by hand
+    get_user_model().objects.mark_data_changed(recipe.user_id)
+    return variants
+
+
+def schedule_variants(recipe):
+    """Queue generating variants for recipe's current image. The
+    job only becomes visible to workers if the upload commits."""
+    return jobs.enqueue(
+        'recipe.image_variants',
+        {'recipe_id': recipe.pk, 'name': recipe.image.name},
+        user=recipe.user,
+    )
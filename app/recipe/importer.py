@@ -0,0 +1,193 @@
+"""
+Streaming bulk import of recipes.
+The request body is read and decoded incrementally and rows are
+validated and written a chunk at a time, so memory use depends on
+the chunk size rather than the size of the upload.
+"""
+import codecs
+import json
+
+from django.db import transaction
+from django.utils.translation import gettext as _
+from rest_framework.exceptions import ParseError, ValidationError
+from rest_framework.serializers import as_serializer_error
+
+from core.models import Recipe, Tag, Ingredient
+from recipe.resolvers import resolve_names, link_related
+
+NDJSON_CONTENT_TYPES = ('application/x-ndjson', 'application/jsonl')
+JSON_CONTENT_TYPES = ('application/json',)
+# how much of the body to read at a time
+READ_SIZE = 64 * 1024
+# a single row bigger than this is rejected instead of buffered
+MAX_ROW_SIZE = 1024 * 1024
+
+
+class InvalidRow:
+    """Placeholder for a row that could not be decoded"""
+
+    def __init__(self, message):
+        self.message = message
+
+
+def _iter_text(stream):
+    """Yield the body as decoded text a block at a time"""
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    while True:
+        block = stream.read(READ_SIZE)
+        if not block:
+            break
+        yield decoder.decode(block)
+    yield decoder.decode(b'', final=True)
+
+
+def iter_ndjson(stream):
+    """Yield one decoded row per non blank line"""
+    buffer = ''
+    for text in _iter_text(stream):
+        buffer += text
+        *lines, buffer = buffer.split('\n')
+        if len(buffer) > MAX_ROW_SIZE:
+            raise ParseError(_('Row exceeds the maximum row size.'))
+        for line in lines:
+            if line.strip():
+                yield _decode_line(line)
+    if buffer.strip():
+        yield _decode_line(buffer)
+
+
+def _decode_line(line):
+    """Decode a single NDJSON line"""
+    try:
+        return json.loads(line)
+    except ValueError as exc:
+        return InvalidRow(_('Invalid JSON: %s') % exc)
+
+
+def iter_json_array(stream):
+    """Yield the elements of a top level JSON array one at a time"""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    started = finished = False
+    for text in _iter_text(stream):
+        buffer += text
+        pos = 0
+        while not finished:
+            # skip whitespace and the separators between elements
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                pos += 1
+            if pos == len(buffer):
+                break
+            if not started:
+                if buffer[pos] != '[':
+                    raise ParseError(_('Expected a JSON array of recipes.'))
+                started = True
+                pos += 1
+                continue
+            if buffer[pos] == ']':
+                finished = True
+                break
+            try:
+                row, pos = decoder.raw_decode(buffer, pos)
+            except ValueError:
+                # element is split across reads, wait for more data
+                break
+            yield row
+        buffer = buffer[pos:]
+        if len(buffer) > MAX_ROW_SIZE:
+            raise ParseError(_('Row exceeds the maximum row size.'))
+    if not finished:
+        raise ParseError(_('Malformed or truncated JSON array.'))
+
+
+# content type -> function reading rows from a body of that type
+READERS = {
+    **{content_type: iter_ndjson for content_type in NDJSON_CONTENT_TYPES},
+    **{content_type: iter_json_array for content_type in JSON_CONTENT_TYPES},
+}
+
+
+def _save_chunk(user, rows):
+    """Write validated rows with bulk inserts and return the
+    created recipes in the same order"""
+    with transaction.atomic():
+        recipes = Recipe.objects.bulk_create([
+            Recipe(user=user, **{
+                key: val for key, val in data.items()
+                if key not in ('tags', 'ingredients')
+            })
+            for data in rows
+        ])
+        related = (('tags', Tag), ('ingredients', Ingredient))
+        for relation, model in related:
+            resolved = resolve_names(model, user, [
+                item['name']
+                for data in rows for item in data.get(relation, [])
+            ])
+            link_related(relation, [
+                (recipe.id, resolved[item['name']].id)
+                for recipe, data in zip(recipes, rows)
+                for item in data.get(relation, [])
+            ])
+        Recipe.objects.filter(
+            pk__in=[recipe.pk for recipe in recipes],
+        ).update_search_vector()
+    if recipes:
+        # invalidates cached/conditional responses as each chunk lands
+        user.mark_data_changed()
+
+    return recipes
+
+
+def _next_chunk(numbered, chunk_size):
+    """Read up to chunk_size rows, returning (rows, parse error)"""
+    chunk = []
+    try:
+        for item in numbered:
+            chunk.append(item)
+            if len(chunk) == chunk_size:
+                break
+    except ParseError as exc:
+        # keep the rows decoded before the body turned out malformed
+        return chunk, exc.detail
+    return chunk, None
+
+
+def import_recipes(serializer, user, rows, chunk_size):
+    """Validate rows with serializer and save them for user chunk
+    by chunk. Yields a result dict per row, followed by a summary."""
+    created = failed = 0
+    numbered = enumerate(rows, start=1)
+    error = None
+    while error is None:
+        chunk, error = _next_chunk(numbered, chunk_size)
+        if not chunk:
+            break
+
+        results = []
+        valid = []
+        for number, row in chunk:
+            if isinstance(row, InvalidRow):
+                results.append({'row': number, 'errors': [row.message]})
+                continue
+            try:
+                valid.append((number, serializer.run_validation(row)))
+            except ValidationError as exc:
+                results.append(
+                    {'row': number, 'errors': as_serializer_error(exc)})
+
+        recipes = _save_chunk(user, [data for number, data in valid])
+        results.extend(
+            {'row': number, 'id': recipe.id}
+            for (number, data), recipe in zip(valid, recipes)
+        )
+        created += len(valid)
+        failed += len(chunk) - len(valid)
+
+        yield from sorted(results, key=lambda result: result['row'])
+
+    summary = {'created': created, 'failed': failed}
+    if error is not None:
+        # the body could not be read past this point
+        summary['errors'] = [error]
+    yield {'summary': summary}
@@ -0,0 +1,45 @@
+"""Background jobs for the recipe APIs, run by manage.py run_worker"""
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+
+from core import jobs
+from recipe import images, importer, serializers
+
+# rows reported individually in the result of an import job
+MAX_REPORTED_ERRORS = 100
+
+
+@jobs.register('recipe.image_variants')
+def image_variants(job):
+    """Generate the resized copies of an uploaded recipe image"""
+    return images.process_image(
+        job.payload['recipe_id'], job.payload['name'])
+
+
+# an import that fails part way has already saved some chunks,
+# running it again would duplicate them
+@jobs.register('recipe.import', max_attempts=1)
+def import_recipes(job):
+    """Import a recipe upload saved by the import API"""
+    path = job.payload['path']
+    user = get_user_model().objects.get(pk=job.user_id)
+    try:
+        with default_storage.open(path, 'rb') as upload:
+            read_rows = importer.READERS[job.payload['content_type']]
+            report = importer.import_recipes(
+                serializers.RecipeImportSerializer(),
+                user,
+                read_rows(upload),
+                job.payload['chunk_size'],
+            )
+            errors = []
+            for result in report:
+                if 'summary' in result:
+                    summary = result['summary']
+                elif 'errors' in result and \
+                        len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append(result)
+    finally:
+        default_storage.delete(path)
+
+    return {**summary, 'rows': errors}
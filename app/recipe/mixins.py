@@ -0,0 +1,105 @@
+"""Mixins shared by the recipe viewsets"""
+import functools
+import hashlib
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from rest_framework import status
+from rest_framework.response import Response
+
+from recipe import cache
+
+
+class UserDataVersionMixin:
+    """Use the version of the user's recipe data to answer
+    conditional GETs (If-None-Match / If-Modified-Since) and to
+    cache responses, both before any queryset runs"""
+    # comma separated id params whose order doesn't change the result
+    cache_list_params = ()
+
+    def dispatch(self, request, *args, **kwargs):
+        # one data version bump per request, however many rows
+        # it writes
+        with get_user_model().objects.batch_data_changes():
+            return super().dispatch(request, *args, **kwargs)
+
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+        get_user_model().objects.mark_data_changed(instance.user_id)
+
+    def get_data_version(self):
+        """Return (version, modified_at) of the user's data.
+        Read fresh from the db since request.user may be cached."""
+        if not hasattr(self, '_data_version'):
+            self._data_version = get_user_model().objects.filter(
+                pk=self.request.user.pk,
+            ).values_list('data_version', 'data_modified_at').get()
+        return self._data_version
+
+    def get_etag(self, request):
+        """ETag for this response, it changes with the data version,
+        the url (filters, cursor) and the requested media type"""
+        version, modified_at = self.get_data_version()
+        key = ':'.join([
+            str(request.user.pk),
+            str(version),
+            request.get_full_path(),
+            request.META.get('HTTP_ACCEPT', ''),
+        ])
+        return '"%s"' % hashlib.md5(key.encode()).hexdigest()
+
+    def cache_response(self, handler):
+        """Wrap handler so its response data is cached per user,
+        data version, action and query params"""
+        @functools.wraps(handler)
+        def cached(request, *args, **kwargs):
+            backend = cache.get_cache()
+            if backend is None:
+                return handler(request, *args, **kwargs)
+
+            version, modified_at = self.get_data_version()
+            params = cache.normalize_params(
+                request.query_params, self.cache_list_params)
+            key = cache.make_key(
+                request.user.pk, version,
+                f'{self.basename}-{self.action}',
+                # host is part of the pagination links
+                f'{request.get_host()}?{params}',
+            )
+            data = backend.get(key)
+            cache.stats.record(hit=data is not None)
+            if data is not None:
+                response = Response(data)
+                response['X-Cache'] = 'HIT'
+                return response
+
+            response = handler(request, *args, **kwargs)
+            if response.status_code == status.HTTP_200_OK:
+                backend.set(
+                    key, response.data, settings.RESPONSE_CACHE['TTL'])
+            response['X-Cache'] = 'MISS'
+            return response
+        return cached
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        """Return 304 if the client's copy is current,
+        otherwise call handler to build the response"""
+        etag = self.get_etag(request)
+        version, modified_at = self.get_data_version()
+        last_modified = int(modified_at.timestamp())
+
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+
+        if response.status_code in (
+                status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+            # each user sees different data, and clients should
+            # revalidate rather than reuse a copy blindly
+            patch_cache_control(response, private=True, no_cache=True)
+        return response
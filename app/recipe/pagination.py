@@ -0,0 +1,32 @@
+"""Pagination for the recipe APIs"""
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class KeysetPagination(CursorPagination):
+    """Keyset (cursor) pagination.
+    The opaque cursor encodes the position of the last row returned,
+    so each page seeks straight to it through the (user, ordering)
+    index instead of counting past an offset. Deep pages cost the
+    same as page one."""
+    page_size = settings.API_PAGE_SIZE
+    # clients can ask for smaller/bigger pages up to the configured cap
+    page_size_query_param = 'page_size'
+    max_page_size = settings.API_MAX_PAGE_SIZE
+
+
+class RecipePagination(KeysetPagination):
+    """Paginate recipes newest first, or best match
+    first when searching"""
+    ordering = '-id'
+
+    def get_ordering(self, request, queryset, view):
+        if 'search_rank' in queryset.query.annotations:
+            # equal ranks are told apart by the cursor's offset
+            return ('-search_rank', '-id')
+        return super().get_ordering(request, queryset, view)
+
+
+class RecipeAttrPagination(KeysetPagination):
+    """Paginate tags and ingredients by name"""
+    ordering = '-name'
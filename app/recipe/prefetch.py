@@ -0,0 +1,46 @@
+"""
+Query planning for the recipe APIs.
+Works out which related objects a serializer renders so views can
+prefetch them up front instead of running a query per row.
+"""
+from functools import lru_cache
+
+from django.db.models import Prefetch
+from rest_framework import serializers
+
+
+@lru_cache(maxsize=None)
+def _nested_plan(serializer_class):
+    """Return (source, model, columns) for each nested many=True
+    model serializer declared on serializer_class"""
+    plan = []
+    for field in serializer_class().fields.values():
+        # nested TagSerializer(many=True) etc. are wrapped in a
+        # ListSerializer, the serializer that renders a row is the child
+        if not isinstance(field, serializers.ListSerializer):
+            continue
+        child = field.child
+        if not isinstance(child, serializers.ModelSerializer):
+            continue
+        model = child.Meta.model
+        concrete = {f.attname for f in model._meta.concrete_fields}
+        # only load the columns the nested serializer actually renders
+        columns = [name for name in child.fields if name in concrete]
+        plan.append((field.source, model, tuple(columns)))
+    return tuple(plan)
+
+
+def prefetch_for_serializer(queryset, serializer_class):
+    """Apply prefetch_related for every nested relation that
+    serializer_class renders, so listing N rows costs a fixed
+    number of queries instead of 1 + N per relation"""
+    prefetches = [
+        # in id order, the same as recipe.rows renders lists in
+        Prefetch(
+            source, queryset=model.objects.only(*columns).order_by('pk'))
+        for source, model, columns in _nested_plan(serializer_class)
+    ]
+    if not prefetches:
+        return queryset
+
+    return queryset.prefetch_related(*prefetches)
@@ -0,0 +1,55 @@
+"""
+Set based helpers for attaching tags and ingredients to recipes.
+Each helper costs a fixed number of queries however many names or
+links it is given.
+"""
+from core.models import Recipe
+
+
+def resolve_names(model, user, names):
+    """Return {name: object} for the user's tags/ingredients
+    with the given names, creating the ones that don't exist yet"""
+    # keep first occurrence order and drop duplicates
+    names = list(dict.fromkeys(names))
+    if not names:
+        return {}
+
+    resolved = {
+        obj.name: obj
+        for obj in model.objects.filter(user=user, name__in=names)
+    }
+    missing = [name for name in names if name not in resolved]
+    if missing:
+        # ignore_conflicts turns this into INSERT ... ON CONFLICT DO
+        # NOTHING, so if a concurrent request creates the same name
+        # first we simply pick up its row below instead of failing
+        model.objects.bulk_create(
+            [model(user=user, name=name) for name in missing],
+            ignore_conflicts=True,
+        )
+        # postgres doesn't return ids for rows skipped on conflict,
+        # so read back everything we just tried to create
+        resolved.update(
+            (obj.name, obj)
+            for obj in model.objects.filter(user=user, name__in=missing)
+        )
+
+    return resolved
+
+
+def link_related(relation, pairs):
+    """Insert (recipe_id, related_id) rows for the recipe M2M
+    relation ('tags' or 'ingredients') in a single query"""
+    field = Recipe._meta.get_field(relation)
+    through = field.remote_field.through
+    # column names on the auto created through table,
+    # eg. recipe_id and tag_id
+    source = f'{field.m2m_field_name()}_id'
+    target = f'{field.m2m_reverse_field_name()}_id'
+    through.objects.bulk_create(
+        [
+            through(**{source: recipe_id, target: related_id})
+            for recipe_id, related_id in pairs
+        ],
+        ignore_conflicts=True,
+    )
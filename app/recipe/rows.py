@@ -0,0 +1,114 @@
+"""
+Read only rendering of serializer output from values() rows.
+Lists don't need model instances or a serializer per nested row,
+so the columns a serializer renders are read with values() and
+each value is run through the serializer's own field instead. The
+output is the same as the serializer's, nested items in id order.
+"""
+from functools import lru_cache
+from itertools import groupby
+
+from rest_framework import serializers
+
+# fields whose to_representation returns a db value unchanged
+IDENTITY = (
+    serializers.CharField.to_representation,
+    serializers.IntegerField.to_representation,
+)
+
+
+def _converter(field):
+    """Return the function rendering a value for field,
+    None when the value from the db can be used as is"""
+    if type(field).to_representation in IDENTITY:
+        return None
+    return field.to_representation
+
+
+@lru_cache(maxsize=None)
+def _row_plan(serializer_class):
+    """Return (name, column, converter, nested) for each field of
+    serializer_class. nested is (relation, serializer class) for
+    nested many=True model serializers, whose rows are looked up by
+    primary key. Raises ValueError for any other computed field."""
+    serializer = serializer_class()
+    model = serializer.Meta.model
+    concrete = {field.attname for field in model._meta.concrete_fields}
+    plan = []
+    for name, field in serializer.fields.items():
+        if isinstance(field, serializers.ListSerializer):
+            relation = model._meta.get_field(field.source)
+            if not relation.many_to_many:
+                raise ValueError(f'{serializer_class.__name__}.{name} '
+                                 'is not a many to many relation')
+            plan.append((name, model._meta.pk.attname, None,
+                         (relation, type(field.child))))
+        elif field.source in concrete:
+            plan.append((name, field.source, _converter(field), None))
+        else:
+            raise ValueError(
+                f'{serializer_class.__name__}.{name} is not a column')
+    return tuple(plan)
+
+
+def values(queryset, serializer_class):
+    """Return queryset as values() rows with the columns
+    serializer_class renders, plus its annotations for ordering"""
+    columns = dict.fromkeys(
+        column for name, column, converter, nested
+        in _row_plan(serializer_class))
+    # nested rows are read per page by to_representation
+    return queryset.prefetch_related(None).values(
+        *columns, *queryset.query.annotations)
+
+
+def _render(plan, values):
+    """Render one row given its values in plan order"""
+    return {
+        name: value if converter is None or value is None
+        else converter(value)
+        for (name, column, converter), value in zip(plan, values)
+    }
+
+
+def _nested_rows(relation, serializer_class, pks):
+    """Return {pk: [item, ...]} rendering the rows related to each
+    of pks through the many to many relation with serializer_class"""
+    through = relation.remote_field.through
+    source = f'{relation.m2m_field_name()}_id'
+    target = relation.m2m_reverse_field_name()
+    plan = [
+        (name, column, converter)
+        for name, column, converter, nested in _row_plan(serializer_class)
+    ]
+    links = (
+        through.objects.filter(**{f'{source}__in': pks})
+        .order_by(source, f'{target}_id')
+        .values_list(source, *[
+            f'{target}__{column}' for name, column, converter in plan
+        ])
+    )
+    return {
+        pk: [_render(plan, link[1:]) for link in group]
+        for pk, group in groupby(links, key=lambda link: link[0])
+    }
+
+
+def to_representation(serializer_class, rows):
+    """Render values() rows the way serializer_class(many=True)
+    renders instances, with one query per nested relation"""
+    rows = list(rows)
+    plan = []
+    for name, column, converter, nested in _row_plan(serializer_class):
+        if nested is not None:
+            related = _nested_rows(
+                *nested, [row[column] for row in rows]) if rows else {}
+            # looks up the rendered rows by the row's primary key
+            converter = (
+                lambda pk, related=related: related.get(pk, []))
+        plan.append((name, column, converter))
+
+    return [
+        _render(plan, [row[column] for name, column, converter in plan])
+        for row in rows
+    ]
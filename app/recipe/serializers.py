@@ -1,9 +1,13 @@
 """Serializers for recipe API"""
+from django.db import transaction
 from rest_framework import serializers
+from core.instrumentation import TimedSerializerMixin
 from core.models import Recipe, Tag, Ingredient
+from recipe.resolvers import resolve_names, link_related
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(TimedSerializerMixin,
+                           serializers.ModelSerializer):
     """Serializer for ingedients"""
 
     class Meta:
@@ -12,7 +16,7 @@ class IngredientSerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer for tags"""
 
     class Meta:
@@ -21,7 +25,7 @@ class TagSerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer for recipes"""
     tags = TagSerializer(many=True, required=False)
     ingredients = IngredientSerializer(many=True, required=False)
@@ -38,30 +42,24 @@ class RecipeSerializer(serializers.ModelSerializer):
         """Handle getting or creating tags as needed"""
         # get user who made call
         auth_user = self.context['request'].user
-        for tag in tags:
-            # create or retrieve tag if already exists
-            tags_obj, created = Tag.objects.get_or_create(
-                user=auth_user,
-                # **tag future proofs it incase we add new things to tags
-                **tag
-            )
-            # add tag to recipe
-            recipe.tags.add(tags_obj)
+        # look up/create every tag in one go instead of one at a time
+        tags_obj = resolve_names(
+            Tag, auth_user, [tag['name'] for tag in tags])
+        # add all tags to recipe with a single insert
+        link_related(
+            'tags', [(recipe.id, tag.id) for tag in tags_obj.values()])
 
     def _get_or_create_ingredients(self, ingredients, recipe):
         """Handle getting or creating ingredients as needed"""
         auth_user = self.context['request'].user
-        for ingredient in ingredients:
-            # created var is boolean saying if it had to created
-            # it or not. True = it had to create a new ingredient since
-            # one didnt exists already
-            ingred_obj, created = Ingredient.objects.get_or_create(
-                user=auth_user,
-                **ingredient
-            )
-            # add ingredient to recipe
-            recipe.ingredients.add(ingred_obj)
-
+        ingred_obj = resolve_names(
+            Ingredient, auth_user,
+            [ingredient['name'] for ingredient in ingredients])
+        link_related(
+            'ingredients',
+            [(recipe.id, ingred.id) for ingred in ingred_obj.values()])
+
+    @transaction.atomic
     def create(self, validated_data):
         """Create a recipe"""
         # remove tags from data
@@ -74,9 +72,12 @@ class RecipeSerializer(serializers.ModelSerializer):
 
         self._get_or_create_tags(tags, recipe)
         self._get_or_create_ingredients(ingredients, recipe)
+        # index title/description and the tag/ingredient names
+        Recipe.objects.filter(pk=recipe.pk).update_search_vector()
 
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         """Update recipe"""
         # instance=existing instance we are updating
@@ -98,6 +99,7 @@ class RecipeSerializer(serializers.ModelSerializer):
             setattr(instance, attr, val)
 
         instance.save()
+        Recipe.objects.filter(pk=instance.pk).update_search_vector()
         return instance
 
 
@@ -107,11 +109,43 @@ class RecipeDetailSerializer(RecipeSerializer):
     from ModelSerializer.
     DIfference is this serializer will include descriptions"""
 
+    # urls of the resized copies of image, empty until generated
+    image_variants = serializers.SerializerMethodField()
+
     # inherit from RecipeSerializer.Meta to pull in all the fields
     # listed there
     class Meta(RecipeSerializer.Meta):
         # we want fields inherited plus add description
-        fields = RecipeSerializer.Meta.fields + ['description', 'image']
+        fields = RecipeSerializer.Meta.fields + [
+            'description', 'image', 'image_variants',
+        ]
+
+    def get_image_variants(self, obj) -> dict:
+        """Return {variant: {format: url}} for the recipe image"""
+        storage = obj.image.storage
+        request = self.context.get('request')
+        variants = {}
+        for variant, files in obj.image_variants.items():
+            variants[variant] = {}
+            for extension, name in files.items():
+                url = storage.url(name)
+                # absolute like the image url itself
+                if request is not None:
+                    url = request.build_absolute_uri(url)
+                variants[variant][extension] = url
+        return variants
+
+
+class RecipeImportSerializer(RecipeSerializer):
+    """Serializer for validating rows of a bulk recipe import"""
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + ['description']
+
+
+class RecipeImportOptionsSerializer(serializers.Serializer):
+    """Serializer for the query params of a bulk recipe import"""
+    background = serializers.BooleanField(default=False)
 
 
 class RecipeImageSerializer(serializers.ModelSerializer):
@@ -122,3 +156,17 @@ class RecipeImageSerializer(serializers.ModelSerializer):
         fields = ['id', 'image']
         read_only_fields = ['id']
         extra_kwargs = {'image': {'required': 'True'}}
+
+
+class FacetSerializer(serializers.Serializer):
+    """Serializer for a tag/ingredient and its recipe count"""
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+    recipe_count = serializers.IntegerField()
+
+
+class RecipeFacetsSerializer(TimedSerializerMixin,
+                             serializers.Serializer):
+    """Serializer for the tag and ingredient facets of a recipe list"""
+    tags = FacetSerializer(many=True)
+    ingredients = FacetSerializer(many=True)
@@ -1,18 +1,29 @@
 """Tests for recipe API"""
 from decimal import Decimal
+import json
 import tempfile
 import os
+from unittest.mock import patch
 from PIL import Image
 from django.contrib.auth import get_user_model
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APIClient
-from core.models import Recipe, Tag, Ingredient
+from core import jobs
+from core.models import Job, Recipe, Tag, Ingredient
+from core.renderers import FastJSONRenderer
+from recipe import cache, images, rows
+from recipe.prefetch import prefetch_for_serializer
 from recipe.serializers import (
     RecipeSerializer, RecipeDetailSerializer,)
 
 RECIPES_URL = reverse('recipe:recipe-list')
+IMPORT_URL = reverse('recipe:recipe-import')
+EXPORT_URL = reverse('recipe:recipe-export')
+FACETS_URL = reverse('recipe:recipe-facets')
 
 
 def detail_url(recipe_id):
@@ -68,6 +79,22 @@ class PrivateRecipeApiTests(TestCase):
         # )
         self.client.force_authenticate(self.user)
 
+    def assertConstantQueryCount(self, url, add_row, sizes=(1, 5, 20)):
+        """Assert GET url runs the same number of queries
+        no matter how many rows add_row has created"""
+        counts = []
+        created = 0
+        for size in sizes:
+            while created < size:
+                add_row(created)
+                created += 1
+            with CaptureQueriesContext(connection) as ctx:
+                res = self.client.get(url)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            counts.append(len(ctx.captured_queries))
+
+        self.assertEqual(len(set(counts)), 1, counts)
+
     def test_retrieve_recipes(self):
         """Test retrieving a list of recipes"""
         create_recipe(user=self.user)
@@ -78,7 +105,7 @@ class PrivateRecipeApiTests(TestCase):
         recipes = Recipe.objects.all().order_by('-id')
         serializer = RecipeSerializer(recipes, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_recipe_list_limited_to_user(self):
         """Test list of recipes is limited to authenticated user"""
@@ -95,7 +122,45 @@ class PrivateRecipeApiTests(TestCase):
         recipes = Recipe.objects.filter(user=self.user)
         serializer = RecipeSerializer(recipes, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
+
+    def test_list_recipes_constant_queries(self):
+        """Test listing recipes does not run queries per recipe"""
+        def add_recipe(i):
+            recipe = create_recipe(user=self.user)
+            recipe.tags.add(
+                Tag.objects.create(user=self.user, name=f'Tag {i}'))
+            recipe.ingredients.add(
+                Ingredient.objects.create(user=self.user, name=f'Ing {i}'))
+
+        self.assertConstantQueryCount(RECIPES_URL, add_recipe)
+
+    def test_list_recipes_paginated(self):
+        """Test recipes are returned a page at a time, newest first"""
+        recipes = [create_recipe(user=self.user) for _ in range(3)]
+
+        res = self.client.get(RECIPES_URL, {'page_size': 2})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        ids = [r['id'] for r in res.data['results']]
+        self.assertEqual(ids, [recipes[2].id, recipes[1].id])
+        self.assertIsNotNone(res.data['next'])
+
+        res = self.client.get(res.data['next'])
+
+        ids = [r['id'] for r in res.data['results']]
+        self.assertEqual(ids, [recipes[0].id])
+        self.assertIsNone(res.data['next'])
+
+    @patch('recipe.pagination.RecipePagination.max_page_size', 2)
+    def test_list_recipes_page_size_capped(self):
+        """Test clients cannot ask for pages above the max size"""
+        for _ in range(3):
+            create_recipe(user=self.user)
+
+        res = self.client.get(RECIPES_URL, {'page_size': 50})
+
+        self.assertEqual(len(res.data['results']), 2)
 
     def test_get_recipe_detail(self):
         """Test get recipe detail"""
@@ -248,6 +313,44 @@ class PrivateRecipeApiTests(TestCase):
             ).exists()
             self.assertTrue(exists)
 
+    def test_create_recipe_tag_queries_constant(self):
+        """Test creating a recipe runs the same number of queries
+        however many tags and ingredients it has"""
+        Tag.objects.create(user=self.user, name='Existing')
+
+        def post_recipe(count):
+            payload = {
+                'title': 'Big recipe',
+                'time_minutes': 30,
+                'price': Decimal('2.50'),
+                'tags': [{'name': 'Existing'}] + [
+                    {'name': f'Tag {count} {i}'} for i in range(count)],
+                'ingredients': [
+                    {'name': f'Ing {count} {i}'} for i in range(count)],
+            }
+            with CaptureQueriesContext(connection) as ctx:
+                res = self.client.post(RECIPES_URL, payload, format='json')
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+            return len(ctx.captured_queries)
+
+        self.assertEqual(post_recipe(1), post_recipe(30))
+
+    def test_create_recipe_duplicate_tag_names(self):
+        """Test repeating a tag name in the payload links it once"""
+        payload = {
+            'title': 'Pad Thai',
+            'time_minutes': 30,
+            'price': Decimal('2.50'),
+            'tags': [{'name': 'Thai'}, {'name': 'Thai'}],
+        }
+        res = self.client.post(RECIPES_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        recipe = Recipe.objects.get(id=res.data['id'])
+        self.assertEqual(recipe.tags.count(), 1)
+        self.assertEqual(
+            Tag.objects.filter(user=self.user, name='Thai').count(), 1)
+
     def test_create_tag_on_update(self):
         """Test creating tag when updating a recipe"""
         recipe = create_recipe(user=self.user)
@@ -392,9 +495,9 @@ class PrivateRecipeApiTests(TestCase):
         s2 = RecipeSerializer(r2)
         s3 = RecipeSerializer(r3)
 
-        self.assertIn(s1.data, res.data)
-        self.assertIn(s2.data, res.data)
-        self.assertNotIn(s3.data, res.data)
+        self.assertIn(s1.data, res.data['results'])
+        self.assertIn(s2.data, res.data['results'])
+        self.assertNotIn(s3.data, res.data['results'])
 
     def test_filter_by_ingredients(self):
         """Test filtering recipes by ingredient"""
@@ -413,9 +516,645 @@ class PrivateRecipeApiTests(TestCase):
         s2 = RecipeSerializer(r2)
         s3 = RecipeSerializer(r3)
 
-        self.assertIn(s1.data, res.data)
-        self.assertIn(s2.data, res.data)
-        self.assertNotIn(s3.data, res.data)
+        self.assertIn(s1.data, res.data['results'])
+        self.assertIn(s2.data, res.data['results'])
+        self.assertNotIn(s3.data, res.data['results'])
+
+
+class RecipeSearchApiTests(TestCase):
+    """Test full text search of recipes"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='test123')
+        self.client.force_authenticate(self.user)
+
+    def create(self, **payload):
+        """Create a recipe through the api so it gets indexed"""
+        payload = {'time_minutes': 10, 'price': '2.00', **payload}
+        res = self.client.post(RECIPES_URL, payload, format='json')
+        return res.data['id']
+
+    def search(self, text, **params):
+        """Search recipes and return the ids found in order"""
+        res = self.client.get(RECIPES_URL, {'search': text, **params})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [recipe['id'] for recipe in res.data['results']]
+
+    def test_search_title_and_tags(self):
+        """Test searching matches titles and tag names"""
+        curry = self.create(title='Green curry')
+        noodles = self.create(title='Noodles', tags=[{'name': 'Curry'}])
+        self.create(title='Pancakes')
+
+        self.assertCountEqual(self.search('curry'), [curry, noodles])
+
+    def test_search_ranks_title_first(self):
+        """Test a title match ranks above an ingredient match"""
+        by_ingredient = self.create(
+            title='Stew', ingredients=[{'name': 'Lentils'}])
+        by_title = self.create(title='Lentils on toast')
+
+        self.assertEqual(self.search('lentils'), [by_title, by_ingredient])
+
+    def test_search_with_tag_filter(self):
+        """Test search combines with the tags filter"""
+        tagged = self.create(title='Pasta bake', tags=[{'name': 'Dinner'}])
+        self.create(title='Pasta salad')
+        tag = Tag.objects.get(user=self.user, name='Dinner')
+
+        self.assertEqual(self.search('pasta', tags=tag.id), [tagged])
+
+    def test_search_after_tag_rename(self):
+        """Test renaming a tag updates search results"""
+        recipe = self.create(title='Soup', tags=[{'name': 'Winter'}])
+        tag = Tag.objects.get(user=self.user, name='Winter')
+
+        self.client.patch(
+            reverse('recipe:tag-detail', args=[tag.id]), {'name': 'Cosy'})
+
+        self.assertEqual(self.search('winter'), [])
+        self.assertEqual(self.search('cosy'), [recipe])
+
+    def test_search_limited_to_user(self):
+        """Test search only returns the user's recipes"""
+        other = create_user(email='other@example.com', password='test123')
+        recipe = create_recipe(user=other, title='Secret curry')
+        Recipe.objects.filter(pk=recipe.pk).update_search_vector()
+
+        self.assertEqual(self.search('curry'), [])
+
+
+class ConditionalRecipeApiTests(TestCase):
+    """Test conditional GETs against the recipe APIs"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='test123')
+        self.client.force_authenticate(self.user)
+
+    def test_list_not_modified(self):
+        """Test a matching If-None-Match returns 304 with one query"""
+        create_recipe(user=self.user)
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        etag = res['ETag']
+
+        with self.assertNumQueries(1):
+            res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res['ETag'], etag)
+
+    def test_list_if_modified_since(self):
+        """Test If-Modified-Since with the returned date gives 304"""
+        res = self.client.get(RECIPES_URL)
+
+        res = self.client.get(
+            RECIPES_URL, HTTP_IF_MODIFIED_SINCE=res['Last-Modified'])
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_write_changes_etag(self):
+        """Test creating a recipe makes old ETags stale"""
+        res = self.client.get(RECIPES_URL)
+        etag = res['ETag']
+
+        payload = {'title': 'New', 'time_minutes': 5, 'price': '1.00'}
+        self.client.post(RECIPES_URL, payload)
+        res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
+        self.assertEqual(len(res.data['results']), 1)
+
+    def test_tag_update_changes_detail_etag(self):
+        """Test renaming a tag makes recipe ETags stale"""
+        recipe = create_recipe(user=self.user)
+        tag = Tag.objects.create(user=self.user, name='Lunch')
+        recipe.tags.add(tag)
+        url = detail_url(recipe.id)
+        etag = self.client.get(url)['ETag']
+
+        self.client.patch(
+            reverse('recipe:tag-detail', args=[tag.id]), {'name': 'Brunch'})
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['tags'][0]['name'], 'Brunch')
+
+    def test_delete_changes_etag(self):
+        """Test deleting a tag makes recipe list ETags stale"""
+        tag = Tag.objects.create(user=self.user, name='Lunch')
+        etag = self.client.get(RECIPES_URL)['ETag']
+
+        self.client.delete(reverse('recipe:tag-detail', args=[tag.id]))
+        res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_write_bumps_version_once(self):
+        """Test a create writing several rows bumps the version once"""
+        payload = {
+            'title': 'New', 'time_minutes': 5, 'price': '1.00',
+            'tags': [{'name': 'Thai'}, {'name': 'Dinner'}],
+            'ingredients': [{'name': 'Rice'}],
+        }
+
+        self.client.post(RECIPES_URL, payload, format='json')
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.data_version, 1)
+
+    def test_deleting_user_cascades_in_bulk(self):
+        """Test deleting a user doesn't load or bump per row"""
+        for i in range(5):
+            create_recipe(user=self.user, title=f'Recipe {i}')
+
+        with CaptureQueriesContext(connection) as queries:
+            self.user.delete()
+
+        self.assertFalse(any(
+            query['sql'].startswith('UPDATE "core_user"')
+            for query in queries))
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_etag_differs_per_filter(self):
+        """Test different query params get different ETags"""
+        res1 = self.client.get(RECIPES_URL)
+        res2 = self.client.get(RECIPES_URL, {'tags': '1'})
+
+        self.assertNotEqual(res1['ETag'], res2['ETag'])
+
+
+class RecipeResponseCacheTests(TestCase):
+    """Test caching of recipe list responses"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='test123')
+        self.client.force_authenticate(self.user)
+        cache.stats.reset()
+
+    def test_list_served_from_cache(self):
+        """Test repeating a list request is a cache hit"""
+        create_recipe(user=self.user)
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(res['X-Cache'], 'MISS')
+
+        with self.assertNumQueries(1):
+            cached = self.client.get(RECIPES_URL)
+
+        self.assertEqual(cached['X-Cache'], 'HIT')
+        self.assertEqual(cached.data, res.data)
+        self.assertEqual(
+            cache.stats.snapshot(),
+            {'hits': 1, 'misses': 1, 'hit_ratio': 0.5})
+
+    def test_write_invalidates_cache(self):
+        """Test creating a recipe invalidates the user's cached lists"""
+        self.client.get(RECIPES_URL)
+
+        payload = {'title': 'New', 'time_minutes': 5, 'price': '1.00'}
+        self.client.post(RECIPES_URL, payload)
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(len(res.data['results']), 1)
+
+    def test_cache_is_per_user(self):
+        """Test users never see each other's cached responses"""
+        create_recipe(user=self.user)
+        self.client.get(RECIPES_URL)
+
+        other = create_user(email='other@example.com', password='test123')
+        self.client.force_authenticate(other)
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(res.data['results'], [])
+
+    def test_filter_id_order_shares_entry(self):
+        """Test the order of filter ids doesn't split the cache"""
+        self.client.get(RECIPES_URL, {'tags': '1,2'})
+
+        res = self.client.get(RECIPES_URL, {'tags': '2,1'})
+
+        self.assertEqual(res['X-Cache'], 'HIT')
+
+    def test_cache_disabled(self):
+        """Test responses aren't cached when disabled"""
+        config = {'ENABLED': False, 'CACHE_ALIAS': 'default', 'TTL': 60}
+        with self.settings(RESPONSE_CACHE=config):
+            self.client.get(RECIPES_URL)
+            res = self.client.get(RECIPES_URL)
+
+        self.assertNotIn('X-Cache', res)
+
+
+class RecipeImportTests(TestCase):
+    """Tests for the bulk recipe import api"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='test123')
+        self.client.force_authenticate(self.user)
+
+    def post_import(self, body, content_type='application/x-ndjson'):
+        """Post body to the import endpoint, return the report lines"""
+        res = self.client.post(IMPORT_URL, body, content_type=content_type)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        content = b''.join(res.streaming_content).decode()
+        return [json.loads(line) for line in content.splitlines()]
+
+    def test_import_ndjson(self):
+        """Test importing recipes with tags and ingredients from NDJSON"""
+        Tag.objects.create(user=self.user, name='Dinner')
+        rows = [
+            {'title': 'Curry', 'time_minutes': 30, 'price': '5.50',
+             'tags': [{'name': 'Dinner'}, {'name': 'Thai'}],
+             'ingredients': [{'name': 'Rice'}]},
+            {'title': 'Toast', 'time_minutes': 5, 'price': '1.00',
+             'description': 'Crispy', 'tags': [{'name': 'Thai'}]},
+        ]
+        body = '\n'.join(json.dumps(row) for row in rows)
+
+        report = self.post_import(body)
+
+        self.assertEqual(report[-1], {'summary': {'created': 2, 'failed': 0}})
+        curry = Recipe.objects.get(id=report[0]['id'])
+        self.assertEqual(curry.user, self.user)
+        self.assertEqual(curry.price, Decimal('5.50'))
+        self.assertEqual(
+            set(curry.tags.values_list('name', flat=True)),
+            {'Dinner', 'Thai'})
+        self.assertEqual(curry.ingredients.get().name, 'Rice')
+        toast = Recipe.objects.get(id=report[1]['id'])
+        self.assertEqual(toast.description, 'Crispy')
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+
+    def test_import_reports_invalid_rows(self):
+        """Test invalid rows are reported and valid rows still saved"""
+        body = '\n'.join([
+            json.dumps({'title': 'Ok', 'time_minutes': 5, 'price': '1'}),
+            json.dumps({'title': 'No time', 'price': '1'}),
+            '{not json',
+        ])
+
+        report = self.post_import(body)
+
+        self.assertIn('id', report[0])
+        self.assertIn('time_minutes', report[1]['errors'])
+        self.assertEqual(report[2]['row'], 3)
+        self.assertIn('errors', report[2])
+        self.assertEqual(report[-1], {'summary': {'created': 1, 'failed': 2}})
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 1)
+
+    def test_import_in_background(self):
+        """Test ?background=1 queues the import and returns its job"""
+        body = '\n'.join([
+            json.dumps({'title': 'Ok', 'time_minutes': 5, 'price': '1'}),
+            json.dumps({'title': 'No time', 'price': '1'}),
+        ])
+
+        res = self.client.post(
+            f'{IMPORT_URL}?background=1', body,
+            content_type='application/x-ndjson')
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(res.data['status'], Job.QUEUED)
+        self.assertEqual(res['Location'], res.data['url'])
+        self.assertFalse(Recipe.objects.exists())
+
+        jobs.run_pending()
+        job = self.client.get(res.data['url'])
+
+        self.assertEqual(job.data['status'], Job.SUCCEEDED)
+        self.assertEqual(job.data['result']['created'], 1)
+        self.assertEqual(job.data['result']['failed'], 1)
+        self.assertEqual(job.data['result']['rows'][0]['row'], 2)
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 1)
+
+    def test_import_invalid_background(self):
+        """Test a background value that isn't a boolean is a 400"""
+        body = json.dumps({'title': 'Ok', 'time_minutes': 5, 'price': '1'})
+
+        res = self.client.post(
+            f'{IMPORT_URL}?background=maybe', body,
+            content_type='application/x-ndjson')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('background', res.data)
+        self.assertFalse(Job.objects.exists())
+
+    @patch('recipe.importer.READ_SIZE', 7)
+    def test_import_json_array_in_chunks(self):
+        """Test a JSON array body is decoded and saved in chunks"""
+        rows = [
+            {'title': f'Recipe {i}', 'time_minutes': i, 'price': '2.00'}
+            for i in range(5)
+        ]
+
+        with self.settings(RECIPE_IMPORT_CHUNK_SIZE=2):
+            report = self.post_import(
+                json.dumps(rows), content_type='application/json')
+
+        self.assertEqual(report[-1], {'summary': {'created': 5, 'failed': 0}})
+        titles = Recipe.objects.filter(
+            user=self.user).order_by('id').values_list('title', flat=True)
+        self.assertEqual(list(titles), [row['title'] for row in rows])
+
+    def test_import_truncated_json_array(self):
+        """Test a truncated JSON array reports the parse error"""
+        body = '[{"title": "Ok", "time_minutes": 5, "price": "1"}, {"ti'
+
+        report = self.post_import(body, content_type='application/json')
+
+        self.assertEqual(report[-1]['summary']['created'], 1)
+        self.assertIn('errors', report[-1]['summary'])
+
+    def test_import_unsupported_content_type(self):
+        """Test importing with an unknown content type is rejected"""
+        res = self.client.post(
+            IMPORT_URL, 'title,price', content_type='text/csv')
+
+        self.assertEqual(
+            res.status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+
+
+class RecipeExportTests(TestCase):
+    """Tests for the streaming recipe export api"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='test123')
+        self.client.force_authenticate(self.user)
+
+    def get_export(self, params=None):
+        """Fetch the export and return its decoded content"""
+        res = self.client.get(EXPORT_URL, params or {})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return b''.join(res.streaming_content).decode()
+
+    def test_export_ndjson(self):
+        """Test exporting recipes with their tags and ingredients"""
+        recipe = create_recipe(user=self.user, title='Curry')
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Thai'))
+        recipe.ingredients.add(
+            Ingredient.objects.create(user=self.user, name='Rice'))
+        other = create_user(email='other@example.com', password='test123')
+        create_recipe(user=other)
+
+        with self.settings(RECIPE_EXPORT_CHUNK_SIZE=1):
+            lines = self.get_export().splitlines()
+
+        self.assertEqual(len(lines), 1)
+        row = json.loads(lines[0])
+        self.assertEqual(row['id'], recipe.id)
+        self.assertEqual(row['title'], 'Curry')
+        self.assertEqual(row['price'], '5.25')
+        self.assertEqual(row['tags'], [{'name': 'Thai'}])
+        self.assertEqual(row['ingredients'], [{'name': 'Rice'}])
+
+    def test_export_related_queries_per_chunk(self):
+        """Test tags/ingredients are fetched per chunk, not per row"""
+        for i in range(6):
+            recipe = create_recipe(user=self.user)
+            recipe.tags.add(
+                Tag.objects.create(user=self.user, name=f'Tag {i}'))
+
+        with self.settings(RECIPE_EXPORT_CHUNK_SIZE=3):
+            with CaptureQueriesContext(connection) as ctx:
+                lines = self.get_export().splitlines()
+
+        self.assertEqual(len(lines), 6)
+        related = [
+            q for q in ctx.captured_queries if 'core_recipe_tags' in q['sql']
+        ]
+        self.assertEqual(len(related), 2)
+
+    def test_export_csv_filtered(self):
+        """Test exporting filtered recipes as CSV"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        r1 = create_recipe(user=self.user, title='Salad')
+        r1.tags.add(tag)
+        create_recipe(user=self.user, title='Steak')
+
+        content = self.get_export({'type': 'csv', 'tags': tag.id})
+
+        lines = content.splitlines()
+        self.assertEqual(
+            lines[0],
+            'id,title,description,time_minutes,price,link,tags,ingredients')
+        self.assertEqual(len(lines), 2)
+        self.assertIn('Salad', lines[1])
+
+    def test_export_unsupported_type(self):
+        """Test asking for an unknown export type is an error"""
+        res = self.client.get(EXPORT_URL, {'type': 'xml'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class RecipeFilterMatchTests(TestCase):
+    """Test any/all matching of the recipe filters"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='test123')
+        self.client.force_authenticate(self.user)
+        self.vegan = Tag.objects.create(user=self.user, name='Vegan')
+        self.quick = Tag.objects.create(user=self.user, name='Quick')
+        self.both = create_recipe(user=self.user, title='Both')
+        self.both.tags.add(self.vegan, self.quick)
+        self.vegan_only = create_recipe(user=self.user, title='Vegan')
+        self.vegan_only.tags.add(self.vegan)
+
+    def get_ids(self, **params):
+        res = self.client.get(RECIPES_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [recipe['id'] for recipe in res.data['results']]
+
+    def test_match_any_no_duplicates(self):
+        """Test recipes with several matching tags are listed once"""
+        ids = self.get_ids(tags=f'{self.vegan.id},{self.quick.id}')
+
+        self.assertEqual(ids, [self.vegan_only.id, self.both.id])
+
+    def test_match_all(self):
+        """Test match=all requires every tag"""
+        ids = self.get_ids(
+            tags=f'{self.vegan.id},{self.quick.id}', match='all')
+
+        self.assertEqual(ids, [self.both.id])
+
+    def test_match_all_tags_and_ingredients(self):
+        """Test match=all applies to tags and ingredients together"""
+        tofu = Ingredient.objects.create(user=self.user, name='Tofu')
+        self.vegan_only.ingredients.add(tofu)
+
+        ids = self.get_ids(
+            tags=f'{self.vegan.id}', ingredients=f'{tofu.id}', match='all')
+
+        self.assertEqual(ids, [self.vegan_only.id])
+
+    def test_invalid_match(self):
+        """Test an unknown match mode is a bad request"""
+        res = self.client.get(RECIPES_URL, {'match': 'some'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_invalid_ids(self):
+        """Test non numeric ids are a bad request"""
+        res = self.client.get(RECIPES_URL, {'tags': '1,abc'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class RecipeFacetsTests(TestCase):
+    """Test the tag and ingredient facet counts"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='test123')
+        self.client.force_authenticate(self.user)
+        self.vegan = Tag.objects.create(user=self.user, name='Vegan')
+        self.quick = Tag.objects.create(user=self.user, name='Quick')
+        self.unused = Tag.objects.create(user=self.user, name='Unused')
+        self.tofu = Ingredient.objects.create(user=self.user, name='Tofu')
+        r1 = create_recipe(user=self.user, title='Tofu stir fry')
+        r1.tags.add(self.vegan, self.quick)
+        r1.ingredients.add(self.tofu)
+        r2 = create_recipe(user=self.user, title='Salad')
+        r2.tags.add(self.vegan)
+
+    def test_facet_counts(self):
+        """Test every tag and ingredient is listed with its count"""
+        res = self.client.get(FACETS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['tags'], [
+            {'id': self.vegan.id, 'name': 'Vegan', 'recipe_count': 2},
+            {'id': self.quick.id, 'name': 'Quick', 'recipe_count': 1},
+            {'id': self.unused.id, 'name': 'Unused', 'recipe_count': 0},
+        ])
+        self.assertEqual(res.data['ingredients'], [
+            {'id': self.tofu.id, 'name': 'Tofu', 'recipe_count': 1},
+        ])
+
+    def test_facet_counts_follow_filters(self):
+        """Test counts only include recipes matching the filters"""
+        res = self.client.get(FACETS_URL, {'tags': f'{self.quick.id}'})
+
+        counts = {
+            tag['name']: tag['recipe_count'] for tag in res.data['tags']
+        }
+        self.assertEqual(counts, {'Vegan': 1, 'Quick': 1, 'Unused': 0})
+
+    def test_facets_limited_to_user(self):
+        """Test other users' tags and recipes are not counted"""
+        other = create_user(email='other@example.com', password='test123')
+        tag = Tag.objects.create(user=other, name='Other')
+        create_recipe(user=other).tags.add(tag)
+
+        res = self.client.get(FACETS_URL)
+
+        names = [tag['name'] for tag in res.data['tags']]
+        self.assertNotIn('Other', names)
+
+    def test_facets_fixed_query_count(self):
+        """Test facets cost the same queries however many tags exist"""
+        counts = []
+        for number in range(3):
+            Tag.objects.create(user=self.user, name=f'Extra {number}')
+            with CaptureQueriesContext(connection) as ctx:
+                self.client.get(FACETS_URL)
+            counts.append(len(ctx.captured_queries))
+
+        self.assertEqual(len(set(counts)), 1, counts)
+
+    def test_facets_cached(self):
+        """Test repeated facet requests are served from the cache"""
+        self.client.get(FACETS_URL)
+
+        res = self.client.get(FACETS_URL)
+
+        self.assertEqual(res['X-Cache'], 'HIT')
+
+
+class RecipeListRowsTests(TestCase):
+    """Test the values() list fast path renders like RecipeSerializer"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='test123')
+        self.client.force_authenticate(self.user)
+        tags = [
+            Tag.objects.create(user=self.user, name=name)
+            for name in ('Vegan', 'Dinner', 'Crème')
+        ]
+        ingredients = [
+            Ingredient.objects.create(user=self.user, name=name)
+            for name in ('Rice', 'Lime')
+        ]
+        for i in range(4):
+            recipe = create_recipe(
+                user=self.user, title=f'Recipe {i}',
+                price=Decimal('1.5') * i, link='' if i % 2 else 'http://x')
+            # added in reverse id order, rendered in id order
+            recipe.tags.set(tags[::-1][:i])
+            recipe.ingredients.set(ingredients[i % 2:])
+
+    def assertSameJSON(self, queryset):
+        """Assert both paths render queryset to identical JSON"""
+        expected = RecipeSerializer(
+            prefetch_for_serializer(queryset, RecipeSerializer), many=True)
+        data = rows.to_representation(
+            RecipeSerializer, rows.values(queryset, RecipeSerializer))
+
+        self.assertEqual(
+            FastJSONRenderer().render(data),
+            FastJSONRenderer().render(expected.data),
+        )
+
+    def test_rows_match_serializer(self):
+        """Test every field, decimals and nested items match"""
+        self.assertSameJSON(Recipe.objects.order_by('-id'))
+
+    def test_rows_match_serializer_search(self):
+        """Test annotated querysets render without the annotation"""
+        Recipe.objects.update_search_vector()
+
+        self.assertSameJSON(
+            Recipe.objects.search('recipe').order_by('-search_rank', '-id'))
+
+    def test_list_matches_serializer(self):
+        """Test the list endpoint renders what the serializer would"""
+        res = self.client.get(RECIPES_URL)
+
+        recipes = prefetch_for_serializer(
+            Recipe.objects.order_by('-id'), RecipeSerializer)
+        serializer = RecipeSerializer(recipes, many=True)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            json.loads(res.content)['results'],
+            json.loads(FastJSONRenderer().render(serializer.data)),
+        )
+
+    def test_list_pages_with_rows(self):
+        """Test cursor pagination walks the rows page by page"""
+        res = self.client.get(RECIPES_URL, {'page_size': 3})
+        first = [recipe['id'] for recipe in res.data['results']]
+        res = self.client.get(res.data['next'])
+        second = [recipe['id'] for recipe in res.data['results']]
+
+        ids = list(Recipe.objects.order_by('-id').values_list('id', flat=True))
+        self.assertEqual(first + second, ids)
+
+    def test_rows_reject_computed_fields(self):
+        """Test serializers with non column fields are refused"""
+        with self.assertRaises(ValueError):
+            rows.values(Recipe.objects.all(), RecipeDetailSerializer)
 
 
 class ImageUploadTests(TestCase):
@@ -430,8 +1169,23 @@ class ImageUploadTests(TestCase):
         self.recipe = create_recipe(user=self.user)
 
     def tearDown(self):
+        self.recipe.refresh_from_db()
+        images.delete_variants(
+            self.recipe.image.storage, self.recipe.image_variants)
         self.recipe.image.delete()
 
+    def upload(self, image, **save_kwargs):
+        """Upload image to the recipe and run the resulting jobs"""
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+            image.save(image_file, format='JPEG', **save_kwargs)
+            image_file.seek(0)
+            res = self.client.post(
+                url, {'image': image_file}, format='multipart')
+        jobs.run_pending()
+        self.recipe.refresh_from_db()
+        return res
+
     def test_upload_image(self):
         """Test uploading an image to a recipe"""
         url = image_upload_url(self.recipe.id)
@@ -451,6 +1205,53 @@ class ImageUploadTests(TestCase):
         self.assertIn('image', res.data)
         self.assertTrue(os.path.exists(self.recipe.image.path))
 
+    def test_upload_image_generates_variants(self):
+        """Test resized, upright, metadata free copies are made"""
+        exif = Image.Exif()
+        # orientation: rotate 90 degrees clockwise to display
+        exif[0x0112] = 6
+        self.upload(Image.new('RGB', (400, 200)), exif=exif)
+
+        storage = self.recipe.image.storage
+        self.assertEqual(
+            set(self.recipe.image_variants), {'thumb', 'medium'})
+        thumb = self.recipe.image_variants['thumb']
+        self.assertEqual(set(thumb), {'webp', 'jpeg'})
+        with storage.open(thumb['jpeg']) as thumb_file:
+            with Image.open(thumb_file) as img:
+                # rotated upright, then scaled to fit 200x200
+                self.assertEqual(img.size, (100, 200))
+                self.assertFalse(img.getexif())
+        with storage.open(self.recipe.image_variants['medium']['webp']) \
+                as medium_file:
+            with Image.open(medium_file) as img:
+                # never scaled up
+                self.assertEqual(img.size, (200, 400))
+                self.assertEqual(img.format, 'WEBP')
+
+    def test_variant_urls_in_detail(self):
+        """Test the recipe detail links to each variant"""
+        self.upload(Image.new('RGB', (10, 10)))
+
+        res = self.client.get(detail_url(self.recipe.id))
+
+        url = res.data['image_variants']['thumb']['webp']
+        self.assertTrue(url.startswith('http'))
+        self.assertTrue(url.endswith('_thumb.webp'))
+
+    def test_reupload_replaces_variants(self):
+        """Test uploading a new image removes the old variants"""
+        self.upload(Image.new('RGB', (10, 10)))
+        old = self.recipe.image_variants['thumb']['jpeg']
+        old_image = self.recipe.image.name
+
+        self.upload(Image.new('RGB', (20, 20)))
+
+        storage = self.recipe.image.storage
+        self.assertFalse(storage.exists(old))
+        self.assertNotEqual(self.recipe.image_variants['thumb']['jpeg'], old)
+        storage.delete(old_image)
+
     def test_upload_image_bad_request(self):
         """Test uploading invalid image"""
         url = image_upload_url(self.recipe.id)
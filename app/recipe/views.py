@@ -1,64 +1,133 @@
 """Views for the recipe APIs"""
+import uuid
+
 from drf_spectacular.utils import (
     extend_schema_view, extend_schema,
     OpenApiParameter, OpenApiTypes,
 )
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.http import StreamingHttpResponse
+from django.utils.translation import gettext as _
 from rest_framework import viewsets, mixins, status
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.decorators import action
+from rest_framework.exceptions import (
+    ValidationError, ParseError, UnsupportedMediaType,
+)
 from rest_framework.response import Response
+from core import jobs, metrics
+from core.authentication import CachedTokenAuthentication
+from core.instrumentation import InstrumentedViewMixin, timed
+from core.renderers import dumps
+from core.views import job_accepted
 from core.models import Recipe, Tag, Ingredient
-from recipe import serializers
+from recipe import (
+    serializers, importer, exporter, filters, images, rows,
+)
+from recipe.pagination import RecipePagination, RecipeAttrPagination
+from recipe.mixins import UserDataVersionMixin
+from recipe.prefetch import prefetch_for_serializer
+
+
+# query params shared by the recipe list and the views computed from it
+RECIPE_FILTER_PARAMETERS = [
+    OpenApiParameter(
+        'tags',
+        OpenApiTypes.STR,
+        description='Comma separated list of IDs to filter',
+    ),
+    OpenApiParameter(
+        'ingredients',
+        OpenApiTypes.STR,
+        description='Comma separated list of ingredient IDs to filter',
+    ),
+    OpenApiParameter(
+        'match',
+        OpenApiTypes.STR, enum=list(filters.MATCH_MODES),
+        description='Whether recipes need any (default) or all '
+                    'of the given tags and ingredients',
+    ),
+    OpenApiParameter(
+        'search',
+        OpenApiTypes.STR,
+        description='Full text search of title, description, '
+                    'tags and ingredients, best matches first',
+    ),
+]
 
 
 @extend_schema_view(
-    list=extend_schema(
-        parameters=[
-            OpenApiParameter(
-                'tags',
-                OpenApiTypes.STR,
-                description='Comma separated list of IDs to filter',
-            ),
-            OpenApiParameter(
-                'ingredients',
-                OpenApiTypes.STR,
-                description='Comma separated list of ingredient IDs to filter',
-            )
-        ]
-    )
+    list=extend_schema(parameters=RECIPE_FILTER_PARAMETERS)
 )
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(InstrumentedViewMixin, UserDataVersionMixin,
+                    viewsets.ModelViewSet):
     """View for manage recipe APIs"""
     # default serializer to use for all api calls
     serializer_class = serializers.RecipeDetailSerializer
     # this specifies what model (objects) to use for the viewset
     queryset = Recipe.objects.all()
     # need to use token auth to access these apis
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     # permission to check for is that they are authenticated
     permission_classes = [IsAuthenticated]
-
-    def _params_to_ints(self, qs):
-        """Convert a list of strings to integers"""
-        return [int(str_id) for str_id in qs.split(',')]
+    # return results a page at a time, newest first
+    pagination_class = RecipePagination
+    cache_list_params = ('tags', 'ingredients')
 
     def get_queryset(self):
         """Override queryset to only pull recipes
         of current user and filter results if passed in"""
         # return self.queryset.filter(user=self.request.user).order_by('-id')
-        tags = self.request.query_params.get('tags')
-        ingredients = self.request.query_params.get('ingredients')
-        queryset = self.queryset
-        if tags:
-            tags_id = self._params_to_ints(tags)
-            queryset = queryset.filter(tags__id__in=tags_id)
-        if ingredients:
-            ingredients_id = self._params_to_ints(ingredients)
-            queryset = queryset.filter(ingredients__id__in=ingredients_id)
+        params = self.request.query_params
+        tags = params.get('tags')
+        ingredients = params.get('ingredients')
+        search = params.get('search')
+        queryset = self.queryset.filter(user=self.request.user)
+        if search:
+            # annotates search_rank, pagination orders by it
+            queryset = queryset.search(search)
+        # EXISTS subqueries, so no join duplicates to remove with distinct
+        queryset = filters.filter_recipes(
+            queryset,
+            tags=filters.parse_ids(tags, 'tags') if tags else None,
+            ingredients=(
+                filters.parse_ids(ingredients, 'ingredients')
+                if ingredients else None),
+            match=filters.parse_match(params.get('match')),
+        )
 
-        return queryset.filter(user=self.request.user
-                               ).order_by('-id').distinct()
+        queryset = queryset.order_by('-id')
+        # load nested tags/ingredients in one query each instead
+        # of one query per recipe
+        return prefetch_for_serializer(
+            queryset, self.get_serializer_class())
+
+    def list(self, request, *args, **kwargs):
+        """List recipes, or 304 if the client's copy is current"""
+        return self.conditional_response(
+            self.cache_response(self._list), request, *args, **kwargs)
+
+    def _list(self, request, *args, **kwargs):
+        """Build the list response from values() rows, the list is
+        read only so model instances would just be thrown away"""
+        serializer_class = self.get_serializer_class()
+        queryset = rows.values(
+            self.filter_queryset(self.get_queryset()), serializer_class)
+        page = self.paginate_queryset(queryset)
+        with timed('serialize'):
+            data = rows.to_representation(
+                serializer_class, queryset if page is None else page)
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+
+    def retrieve(self, request, *args, **kwargs):
+        """Get a recipe, or 304 if the client's copy is current"""
+        return self.conditional_response(
+            super().retrieve, request, *args, **kwargs)
 
     def get_serializer_class(self):
         """Return the serializer class for request.
@@ -69,6 +138,10 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return serializers.RecipeSerializer
         elif self.action == 'upload_image':
             return serializers.RecipeImageSerializer
+        elif self.action == 'import_recipes':
+            return serializers.RecipeImportSerializer
+        elif self.action == 'facets':
+            return serializers.RecipeFacetsSerializer
         # everything else use default
         return self.serializer_class
 
@@ -93,11 +166,116 @@ class RecipeViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(recipe, data=request.data)
 
         if serializer.is_valid():
-            serializer.save()
+            metrics.IMAGE_UPLOAD_BYTES.observe(
+                serializer.validated_data['image'].size)
+            # variants of the old image no longer apply
+            images.delete_variants(recipe.image.storage, recipe.image_variants)
+            recipe = serializer.save(image_variants={})
+            # resizing runs in the background after the response
+            images.schedule_variants(recipe)
             return Response(serializer.data, status=status.HTTP_200_OK)
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'background',
+                OpenApiTypes.BOOL,
+                description='Import in a background job and return '
+                            '202 with the job instead of the report',
+            )
+        ]
+    )
+    @action(methods=['POST'], detail=False, url_path='import',
+            url_name='import')
+    def import_recipes(self, request):
+        """Bulk import recipes from a JSON array or NDJSON body.
+        Rows are saved in chunks and a result line per row is
+        streamed back as NDJSON, followed by a summary line."""
+        options = serializers.RecipeImportOptionsSerializer(
+            data=request.query_params)
+        options.is_valid(raise_exception=True)
+        # content type may include params eg. charset
+        content_type = request.content_type.split(';')[0].strip()
+        if content_type not in importer.READERS:
+            raise UnsupportedMediaType(content_type)
+        # read the raw stream instead of request.data so the
+        # body never has to be held in memory
+        if request.stream is None:
+            raise ParseError(_('Request body is empty.'))
+
+        if options.validated_data['background']:
+            # spool the body to storage for a worker to import
+            path = default_storage.save(
+                f'imports/{uuid.uuid4().hex}', File(request.stream))
+            job = jobs.enqueue('recipe.import', {
+                'path': path,
+                'content_type': content_type,
+                'chunk_size': settings.RECIPE_IMPORT_CHUNK_SIZE,
+            }, user=request.user)
+            return job_accepted(job, request)
+
+        report = importer.import_recipes(
+            self.get_serializer(),
+            request.user,
+            importer.READERS[content_type](request.stream),
+            settings.RECIPE_IMPORT_CHUNK_SIZE,
+        )
+        return StreamingHttpResponse(
+            (dumps(result) + b'\n' for result in report),
+            content_type='application/x-ndjson',
+        )
+
+    @extend_schema(
+        parameters=RECIPE_FILTER_PARAMETERS,
+        responses=serializers.RecipeFacetsSerializer,
+    )
+    @action(methods=['GET'], detail=False, url_path='facets',
+            url_name='facets')
+    def facets(self, request):
+        """Tags and ingredients with how many recipes matching the
+        current filters use each one, for rendering filter chips"""
+        return self.conditional_response(
+            self.cache_response(self._facets), request)
+
+    def _facets(self, request):
+        """Build the facets response"""
+        counts = filters.facet_counts(request.user, self.get_queryset())
+        serializer = self.get_serializer(counts)
+        return Response(serializer.data)
+
+    @extend_schema(
+        parameters=RECIPE_FILTER_PARAMETERS + [
+            OpenApiParameter(
+                'type',
+                OpenApiTypes.STR, enum=[*exporter.FORMATS],
+                description='Export format, defaults to ndjson',
+            )
+        ]
+    )
+    @action(methods=['GET'], detail=False, url_path='export',
+            url_name='export')
+    def export_recipes(self, request):
+        """Stream the user's recipes as NDJSON or CSV.
+        Accepts the same tags/ingredients filters as the list."""
+        export_type = request.query_params.get('type', 'ndjson')
+        if export_type not in exporter.FORMATS:
+            msg = _('Unsupported export type.')
+            raise ValidationError({'type': [msg]})
+        render, content_type = exporter.FORMATS[export_type]
+        # exporter loads tags/ingredients per chunk itself,
+        # so drop the per request prefetch
+        queryset = self.get_queryset().prefetch_related(None)
+        recipes = exporter.iter_recipes(
+            queryset, settings.RECIPE_EXPORT_CHUNK_SIZE)
+
+        response = StreamingHttpResponse(
+            render(recipes), content_type=content_type)
+        response['Content-Disposition'] = (
+            f'attachment; filename="recipes.{export_type}"')
+        return response
+
 
 @extend_schema_view(
     list=extend_schema(
@@ -110,7 +288,9 @@ class RecipeViewSet(viewsets.ModelViewSet):
         ]
     )
 )
-class BaseRecipeAttrViewset(mixins.UpdateModelMixin,
+class BaseRecipeAttrViewset(InstrumentedViewMixin,
+                            UserDataVersionMixin,
+                            mixins.UpdateModelMixin,
                             mixins.ListModelMixin,
                             mixins.DestroyModelMixin,
                             viewsets.GenericViewSet):
@@ -120,8 +300,9 @@ class BaseRecipeAttrViewset(mixins.UpdateModelMixin,
     # In order to be able to be able to update a tag, we just add the
     # updatemodelmixin and it creates everything needed.
     # Same for listing and deleting tags.
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
+    pagination_class = RecipeAttrPagination
 
     def get_queryset(self):
         """Filter queryset for authenticated user"""
@@ -132,16 +313,41 @@ class BaseRecipeAttrViewset(mixins.UpdateModelMixin,
         )
         queryset = self.queryset
         if assigned_only:
-            queryset = queryset.filter(recipe__isnull=False)
+            queryset = queryset.filter(
+                filters.assigned(self.recipe_relation))
+
+        return queryset.filter(user=self.request.user).order_by('-name')
+
+    def list(self, request, *args, **kwargs):
+        """List items, or 304 if the client's copy is current"""
+        return self.conditional_response(
+            self.cache_response(super().list), request, *args, **kwargs)
+
+    def perform_update(self, serializer):
+        """Update item, names are unique per user so renaming
+        onto an existing name is a validation error"""
+        try:
+            with transaction.atomic():
+                serializer.save()
+        except IntegrityError:
+            msg = _('An item with this name already exists.')
+            raise ValidationError({'name': [msg]})
+        # the name is part of its recipes' search vectors
+        serializer.instance.recipe_set.update_search_vector()
 
-        return queryset.filter(user=self.request.user
-                               ).order_by('-name').distinct()
+    def perform_destroy(self, instance):
+        """Delete item and drop its name from its recipes' search"""
+        recipe_ids = list(instance.recipe_set.values_list('id', flat=True))
+        super().perform_destroy(instance)
+        Recipe.objects.filter(pk__in=recipe_ids).update_search_vector()
 
 
 class TagViewSet(BaseRecipeAttrViewset):
     """Manage tags in the database."""
     serializer_class = serializers.TagSerializer
     queryset = Tag.objects.all()
+    # Recipe field linking recipes to tags
+    recipe_relation = 'tags'
 
     # Code below is added to base class since its shared with ingredients
 
@@ -156,6 +362,7 @@ class IngredientViewSet(BaseRecipeAttrViewset):
     """Manage ingredients in the database"""
     serializer_class = serializers.IngredientSerializer
     queryset = Ingredient.objects.all()
+    recipe_relation = 'ingredients'
     # authentication_classes = [TokenAuthentication]
     # permission_classes = [IsAuthenticated]
     # def get_queryset(self):
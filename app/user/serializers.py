@@ -2,9 +2,10 @@
 from django.contrib.auth import (get_user_model, authenticate)
 from rest_framework import serializers
 from django.utils.translation import gettext as _
+from core.instrumentation import TimedSerializerMixin, timed
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """
         Serialzier for the user object.
         Converts to and from python objects.
@@ -57,12 +58,14 @@ class AuthTokenSerializer(serializers.Serializer):
         """Validate and authenicate the user"""
         email = attrs.get('email')
         password = attrs.get('password')
-        # authenticate() comes built in and requires 3 params
-        user = authenticate(
-            request=self.context.get('request'),
-            username=email,
-            password=password,
-        )
+        # authenticate() comes built in and requires 3 params,
+        # checking the password is most of this endpoint's time
+        with timed('auth'):
+            user = authenticate(
+                request=self.context.get('request'),
+                username=email,
+                password=password,
+            )
         if not user:
             msg = _('Unable to authenticate with provided credentials.')
             # this error will be translated into a 400 error
@@ -1,13 +1,16 @@
 """
 Views for the user API.
 """
-from rest_framework import generics, authentication, permissions
+from django.contrib.auth import get_user_model
+from rest_framework import generics, permissions
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.settings import api_settings
+from core.authentication import CachedTokenAuthentication
+from core.instrumentation import InstrumentedViewMixin
 from user.serializers import UserSerializer, AuthTokenSerializer
 
 
-class CreateUserView(generics.CreateAPIView):
+class CreateUserView(InstrumentedViewMixin, generics.CreateAPIView):
     """Create a new user in the system.
         CreateAPIView class handles creating POST request for you,
         it just needs to know what serializer to use
@@ -15,7 +18,7 @@ class CreateUserView(generics.CreateAPIView):
     serializer_class = UserSerializer
 
 
-class CreateTokenView(ObtainAuthToken):
+class CreateTokenView(InstrumentedViewMixin, ObtainAuthToken):
     """Create a new auth token for user"""
     # we use our own custom serializer instead of ObtainAuthToken one
     # since we customized it to use email instead of username
@@ -24,14 +27,16 @@ class CreateTokenView(ObtainAuthToken):
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
 
 
-class ManageUserView(generics.RetrieveUpdateAPIView):
+class ManageUserView(InstrumentedViewMixin,
+                     generics.RetrieveUpdateAPIView):
     """Manage the authenticated user"""
     serializer_class = UserSerializer
     # set what kind of authentication we will use
-    authentication_classes = [authentication.TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     # only permission we need to check is that they are authenticated
     permission_classes = [permissions.IsAuthenticated]
 
     def get_object(self):
         """Retrieve and return the authenticated user"""
-        return self.request.user
+        # the authentication cache only knows the user's id
+        return get_user_model().objects.get(pk=self.request.user.pk)
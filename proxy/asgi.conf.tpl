@@ -0,0 +1,22 @@
+server {
+    listen ${LISTEN_PORT};
+
+    location /static {
+        alias /vol/static;
+    }
+
+    location /api/recipe/recipes/import/ {
+        proxy_pass http://${APP_HOST}:${APP_PORT};
+        include /etc/nginx/proxy_params;
+        # imports are streamed through to the app instead of buffered
+        client_max_body_size 500M;
+        proxy_request_buffering off;
+        proxy_buffering off;
+    }
+
+    location / {
+        proxy_pass http://${APP_HOST}:${APP_PORT};
+        include /etc/nginx/proxy_params;
+        client_max_body_size 10M;
+    }
+}
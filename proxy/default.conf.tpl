@@ -5,6 +5,15 @@ server {
         alias /vol/static;
     }
 
+    location /api/recipe/recipes/import/ {
+        uwsgi_pass ${APP_HOST}:${APP_PORT};
+        include /etc/nginx/uwsgi_params;
+        # imports are streamed through to the app instead of buffered
+        client_max_body_size 500M;
+        uwsgi_request_buffering off;
+        uwsgi_buffering off;
+    }
+
     location / {
         uwsgi_pass ${APP_HOST}:${APP_PORT};
         include /etc/nginx/uwsgi_params;
@@ -2,5 +2,12 @@
 
 set -e
 
-envsubst < /etc/nginx/default.conf.tpl > /etc/nginx/conf.d/default.conf
-nginx -g 'daemon off;'
\ No newline at end of file
+# the app speaks uwsgi by default, or plain http when run as ASGI
+if [ "$SERVER_MODE" = "asgi" ]; then
+    template=/etc/nginx/asgi.conf.tpl
+else
+    template=/etc/nginx/default.conf.tpl
+fi
+
+envsubst < "$template" > /etc/nginx/conf.d/default.conf
+nginx -g 'daemon off;'
@@ -2,8 +2,23 @@
 
 set -e
 
-python manage.py wait_for_db
-python manage.py collectstatic --noinput
-python manage.py migrate
+# waits for the database, collects static files and migrates,
+# skipping what's already done, see core/management/commands/startup.py
+python manage.py startup
 
-uwsgi --socket :9000 --workers 4 --master --enable-threads --module app.wsgi
\ No newline at end of file
+# each worker process writes its metrics here for /api/metrics/ to
+# add up, start every run from zero
+export METRICS_MULTIPROCESS_DIR="${METRICS_MULTIPROCESS_DIR:-/tmp/metrics}"
+rm -rf "$METRICS_MULTIPROCESS_DIR"
+mkdir -p "$METRICS_MULTIPROCESS_DIR"
+
+if [ "$SERVER_MODE" = "asgi" ]; then
+    # async views on a thread pool per process, see core.asgi
+    export ASYNC_API=1
+    exec gunicorn app.asgi:application \
+        --bind :9000 \
+        --workers "${WEB_WORKERS:-4}" \
+        --worker-class uvicorn.workers.UvicornWorker
+else
+    uwsgi --socket :9000 --workers 4 --master --enable-threads --module app.wsgi
+fi